@@ -1,31 +1,54 @@
+import os
+import argparse
+import tempfile
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import re
 import holidays
-from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from indices_rodovia import IndiceIntervalosBR, IndicePontosBR, posicoes_por_br
+from indice_geografico import IndiceGeografico
+from cubo_trechos import construir_cubo, cubo_do_dataset
+import matriz_ml
+import esquema
+import instrumentacao
 
 # ==============================================================================
 # PARÂMETROS DE CONFIGURAÇÃO
 # ==============================================================================
 GAP_THRESHOLD_KM = 0.2
-ARQUIVO_ACIDENTES = 'acidentes_MG_preprocessado.csv'
+# Radares em vãos entre trechos são atribuídos ao trecho mais próximo até esta distância (0 desativa)
+TOLERANCIA_SNAP_RADAR_KM = 0.0
+# Vizinhança de radares em torno do ponto crítico de cada trecho
+K_RADARES_PROXIMOS = 3
+RAIO_RADARES_KM = 5.0
+# Junção geoespacial (haversine): raio de contagem e distância máxima de busca do radar mais próximo
+RAIO_RADARES_GEO_KM = 1.0
+DIST_MAX_RADAR_GEO_KM = 50.0
+# Processos para o trabalho por BR (segmentação, radares, pontos críticos e agregação); 1 roda tudo no processo atual
+PROCESSOS = 1
+ARQUIVO_ACIDENTES = 'acidentes_MG_preprocessado.parquet'
+ARQUIVO_ACIDENTES_CSV = 'acidentes_MG_preprocessado.csv'  # usado se o Parquet não existir
 ARQUIVO_RADARES = 'dados_dos_radares.csv'
 ARQUIVO_SAIDA = 'dataset_final_para_ml.csv'
+# Acrescenta ao dataset final as features das janelas de 12 meses do cubo (trecho x mês)
+FEATURES_JANELA_12M = False
+# Limiares de gap comparados pela varredura (--varrer sem valores)
+LIMIARES_VARREDURA_KM = [0.05, 0.1, 0.2, 0.5, 1.0, 2.0]
+ARQUIVO_VARREDURA = 'varredura_limiares.csv'
+
 
 # ==============================================================================
 # ETAPA 1: Carregar e Preparar a Base de Acidentes
 # ==============================================================================
-print("ETAPA 1: Carregando e preparando a base de acidentes...")
-dtype_spec = {'sentido_via': str, 'tipo_acidente': str}
-df_acidentes = pd.read_csv(ARQUIVO_ACIDENTES, sep=',', encoding='utf-8', dtype=dtype_spec, low_memory=False)
-df_proc = df_acidentes.copy()
-
-# Conversão de tipos
-cols_to_convert_to_float = ['km', 'latitude', 'longitude']
-for col in cols_to_convert_to_float:
-    if col in df_proc.columns:
-        df_proc[col] = df_proc[col].astype(str).str.replace(',', '.', regex=False)
-        df_proc[col] = pd.to_numeric(df_proc[col], errors='coerce')
+def carregar_acidentes():
+    if os.path.exists(ARQUIVO_ACIDENTES):
+        # Parquet já vem tipado: dummies uint8, categóricas, coordenadas float32 e datas
+        return pd.read_parquet(ARQUIVO_ACIDENTES)
+    # O CSV pré-processado foi gravado pelo pandas, com ponto decimal
+    return esquema.ler_tipado(ARQUIVO_ACIDENTES_CSV, decimal='.')
+
 
 # Feature Engineering (Severidade, Risco, Tempo)
 def map_causa(causa):
@@ -36,102 +59,226 @@ def map_causa(causa):
     if 'velocidade' in causa: return 'velocidade_incompativel'
     return 'outras'
 
-df_proc['data_inversa'] = pd.to_datetime(df_proc['data_inversa'], errors='coerce', dayfirst=True)
-vitimas_cols = ['mortos', 'feridos_graves', 'feridos_leves']
-for col in vitimas_cols:
-    df_proc[col] = pd.to_numeric(df_proc[col], errors='coerce').fillna(0)
 
-df_proc['indice_severidade'] = (df_proc['mortos'] * 5 + df_proc['feridos_graves'] * 3 + df_proc['feridos_leves'] * 1)
+@instrumentacao.medir()
+def preparar_acidentes(df_acidentes):
+    # Tipos do esquema (sem custo quando a base já vem tipada do Parquet)
+    vitimas_cols = ['mortos', 'feridos_graves', 'feridos_leves']
+    df_proc = esquema.aplicar_esquema(df_acidentes, colunas=['km', 'latitude', 'longitude', 'data_inversa'] + vitimas_cols)
+    for col in vitimas_cols:
+        df_proc[col] = df_proc[col].fillna(0)
+
+    df_proc['indice_severidade'] = (df_proc['mortos'] * 5 + df_proc['feridos_graves'] * 3 + df_proc['feridos_leves'] * 1)
 
-if 'causa_acidente' in df_proc.columns:
-    df_proc['causa_agrupada'] = df_proc['causa_acidente'].apply(map_causa)
-else:
-    df_proc['causa_agrupada'] = 'nao_informada'
+    if 'causa_acidente' in df_proc.columns:
+        df_proc['causa_agrupada'] = df_proc['causa_acidente'].apply(map_causa)
+    else:
+        df_proc['causa_agrupada'] = 'nao_informada'
+
+    df_proc['causa_relevante_radar'] = ((df_proc['causa_agrupada'] == 'velocidade_incompativel') | (df_proc['causa_agrupada'] == 'falta_de_atencao')).astype(int)
+    df_proc['risco_radar'] = df_proc['indice_severidade'] * df_proc['causa_relevante_radar']
+    return df_proc
 
-df_proc['causa_relevante_radar'] = ((df_proc['causa_agrupada'] == 'velocidade_incompativel') | (df_proc['causa_agrupada'] == 'falta_de_atencao')).astype(int)
-df_proc['risco_radar'] = df_proc['indice_severidade'] * df_proc['causa_relevante_radar']
 
 # ==============================================================================
 # ETAPA 2: Segmentação Dinâmica dos Trechos de Acidente
 # ==============================================================================
-print(f"ETAPA 2: Segmentando BRs em trechos (gap > {GAP_THRESHOLD_KM} km)...")
-df_proc.dropna(subset=['br', 'km', 'data_inversa'], inplace=True)
-df_proc['br'] = df_proc['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
-df_proc.sort_values(['br', 'km'], inplace=True)
-km_diff = df_proc.groupby('br')['km'].diff()
-new_trecho_flag = (km_diff > GAP_THRESHOLD_KM) | (km_diff.isnull())
-id_trecho_numerico = new_trecho_flag.cumsum()
-df_proc['id_trecho'] = 'BR' + df_proc['br'] + '_T' + id_trecho_numerico.astype(str)
+@instrumentacao.medir()
+def segmentar_trechos(df_proc, gap_threshold_km=GAP_THRESHOLD_KM):
+    df_proc = df_proc.dropna(subset=['br', 'km', 'data_inversa'])
+    df_proc['br'] = df_proc['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
+    df_proc = df_proc.sort_values(['br', 'km'])
+    km_diff = df_proc.groupby('br')['km'].diff()
+    new_trecho_flag = (km_diff > gap_threshold_km) | (km_diff.isnull())
+    id_trecho_numerico = new_trecho_flag.cumsum()
+    df_proc['id_trecho'] = 'BR' + df_proc['br'] + '_T' + id_trecho_numerico.astype(str)
+    return df_proc
+
 
 # ==============================================================================
 # ETAPA 3: Carregar e Preparar a Base de Radares
 # ==============================================================================
-print("ETAPA 3: Carregando e preparando a base de radares...")
-df_radares = pd.read_csv(ARQUIVO_RADARES, sep=';', encoding='latin-1')
-df_radares.columns = df_radares.columns.str.strip()
-df_radares.rename(columns={'rodovia': 'br', 'km_m': 'km', 'ano_do_pnv_snv': 'ano_instalacao'}, inplace=True)
-print("Filtrando radares para considerar apenas o estado de MG...")
-df_radares = df_radares[df_radares['uf'].str.strip().str.upper() == 'MG'].copy()
-df_radares['br'] = df_radares['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
-df_radares['km'] = pd.to_numeric(df_radares['km'].astype(str).str.replace(',', '.'), errors='coerce')
-df_radares['data_instalacao'] = pd.to_datetime(df_radares['ano_instalacao'].astype(str) + '-01-01', errors='coerce')
-df_radares.dropna(subset=['br', 'km', 'data_instalacao'], inplace=True)
+def carregar_radares():
+    return esquema.ler_radares(ARQUIVO_RADARES)
+
+
+@instrumentacao.medir()
+def preparar_radares(df_radares):
+    # Devolve (radares de MG por br/km, radares de todas as UFs com coordenadas)
+    df_radares = esquema.aplicar_esquema(df_radares, esquema.ESQUEMA_RADARES)
+    df_radares.columns = df_radares.columns.str.strip()
+    df_radares.rename(columns={'rodovia': 'br', 'km_m': 'km', 'ano_do_pnv_snv': 'ano_instalacao'}, inplace=True)
+    # A junção por coordenadas usa os radares de todas as UFs: perto da divisa o radar mais próximo pode estar em outro estado
+    df_radares_geo = df_radares.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+    print("Filtrando radares para considerar apenas o estado de MG...")
+    df_radares = df_radares[df_radares['uf'].str.strip().str.upper() == 'MG'].copy()
+    df_radares['br'] = df_radares['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
+    df_radares['data_instalacao'] = pd.to_datetime(df_radares['ano_instalacao'].astype(str) + '-01-01', errors='coerce')
+    df_radares.dropna(subset=['br', 'km', 'data_instalacao'], inplace=True)
+    return df_radares, df_radares_geo
+
 
 # ==============================================================================
 # ETAPA 4: Calcular Impacto dos Radares Existentes (Antes/Depois)
 # ==============================================================================
-print("ETAPA 4: Calculando o impacto 'Antes x Depois' dos radares existentes...")
-df_trechos_bounds = df_proc.groupby('id_trecho').agg(br=('br', 'first'), trecho_km_inicial=('km', 'min'), trecho_km_final=('km', 'max')).reset_index()
-radares_com_trecho = []
-for _, radar in df_radares.iterrows():
-    trecho_match = df_trechos_bounds[(df_trechos_bounds['br'] == radar['br']) & (df_trechos_bounds['trecho_km_inicial'] <= radar['km']) & (df_trechos_bounds['trecho_km_final'] >= radar['km'])]
-    if not trecho_match.empty:
-        radares_com_trecho.append({'id_trecho': trecho_match.iloc[0]['id_trecho'], 'data_instalacao_radar': radar['data_instalacao']})
-df_trechos_com_radar = pd.DataFrame(radares_com_trecho).drop_duplicates()
-df_acidentes_enriquecido = pd.merge(df_proc, df_trechos_com_radar, on='id_trecho', how='left')
-resultados_impacto = []
-for id_trecho in tqdm(df_trechos_com_radar['id_trecho'].unique(), desc="Calculando Impacto"):
-    resultado = {'id_trecho': id_trecho, 'reducao_pct_taxa_acidente': np.nan}
-    df_analise = df_acidentes_enriquecido[df_acidentes_enriquecido['id_trecho'] == id_trecho]
-    data_radar = df_analise['data_instalacao_radar'].dropna().iloc[0]
-    df_antes = df_analise[df_analise['data_inversa'] < data_radar]
-    df_depois = df_analise[df_analise['data_inversa'] >= data_radar]
-    if not df_antes.empty and not df_depois.empty:
-        anos_antes = max(1, (data_radar - df_antes['data_inversa'].min()).days / 365.25)
-        anos_depois = max(1, (df_depois['data_inversa'].max() - data_radar).days / 365.25)
-        taxa_acidentes_antes = len(df_antes) / anos_antes
-        taxa_acidentes_depois = len(df_depois) / anos_depois
-        if taxa_acidentes_antes > 0:
-            resultado['reducao_pct_taxa_acidente'] = (taxa_acidentes_depois - taxa_acidentes_antes) / taxa_acidentes_antes
-    resultados_impacto.append(resultado)
-df_impacto = pd.DataFrame(resultados_impacto)
+@instrumentacao.medir()
+def localizar_radares_em_trechos(df_proc, df_radares, tolerancia_snap_radar_km=TOLERANCIA_SNAP_RADAR_KM):
+    df_trechos_bounds = df_proc.groupby('id_trecho').agg(br=('br', 'first'), trecho_km_inicial=('km', 'min'), trecho_km_final=('km', 'max')).reset_index()
+    # Índice de intervalos por BR: todos os radares são atribuídos em lote por busca binária
+    indice_trechos = IndiceIntervalosBR(df_trechos_bounds['br'], df_trechos_bounds['trecho_km_inicial'], df_trechos_bounds['trecho_km_final'], df_trechos_bounds['id_trecho'])
+    id_trecho_radar, _ = indice_trechos.localizar(df_radares['br'], df_radares['km'], tolerancia_km=tolerancia_snap_radar_km)
+    df_trechos_com_radar = pd.DataFrame({'id_trecho': id_trecho_radar, 'data_instalacao_radar': df_radares['data_instalacao'].to_numpy()})
+    return df_trechos_com_radar.dropna(subset=['id_trecho']).drop_duplicates()
+
+# Antes x depois de cada instalação pelo cubo (trecho x mês): as contagens saem das
+# somas acumuladas até o mês da instalação. As datas de instalação vêm do ano do
+# PNV/SNV (1º de janeiro), então o corte por mês é o mesmo corte por dia.
+def calcular_impacto_instalacoes(cubo, df_instalacoes):
+    colunas = ['id_trecho', 'data_instalacao_radar', 'acidentes_antes', 'acidentes_depois', 'anos_antes', 'anos_depois', 'reducao_pct_taxa_acidente']
+    if df_instalacoes.empty:
+        # Vazio, mas com os mesmos tipos do caso geral
+        return pd.DataFrame({col: pd.Series(dtype=float) for col in colunas}).astype({'id_trecho': object, 'data_instalacao_radar': 'datetime64[ns]', 'acidentes_antes': np.int64, 'acidentes_depois': np.int64})
+    # Todo trecho vem da segmentação dos acidentes, então está no cubo com ao menos um acidente
+    n_antes, n_depois = cubo.antes_depois(df_instalacoes['id_trecho'], df_instalacoes['data_instalacao_radar'])
+    codigos = cubo.codigos(df_instalacoes['id_trecho'])
+    dia_inst = df_instalacoes['data_instalacao_radar'].to_numpy().astype('datetime64[D]').astype(np.int64)
+
+    com_dados = (n_antes > 0) & (n_depois > 0)
+    anos_antes = np.maximum(1, (dia_inst - cubo.primeiro_dia[codigos]) / 365.25)
+    anos_depois = np.maximum(1, (cubo.ultimo_dia[codigos] - dia_inst) / 365.25)
+    taxa_antes = n_antes / anos_antes
+    taxa_depois = n_depois / anos_depois
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reducao = np.where(com_dados, (taxa_depois - taxa_antes) / taxa_antes, np.nan)
+
+    return pd.DataFrame({
+        'id_trecho': df_instalacoes['id_trecho'].to_numpy(),
+        'data_instalacao_radar': df_instalacoes['data_instalacao_radar'].to_numpy(),
+        'acidentes_antes': n_antes, 'acidentes_depois': n_depois,
+        'anos_antes': np.where(com_dados, anos_antes, np.nan), 'anos_depois': np.where(com_dados, anos_depois, np.nan),
+        'reducao_pct_taxa_acidente': reducao,
+    })
+
+
+@instrumentacao.medir()
+def resumir_impacto(cubo, df_trechos_com_radar):
+    # Trechos com vários radares instalados em anos diferentes: o impacto principal é
+    # medido a partir da primeira instalação, e a última instalação ganha coluna própria
+    df_impacto_instalacoes = calcular_impacto_instalacoes(cubo, df_trechos_com_radar)
+    df_impacto_instalacoes.sort_values(['id_trecho', 'data_instalacao_radar'], inplace=True)
+    primeira = df_impacto_instalacoes.drop_duplicates('id_trecho', keep='first').set_index('id_trecho')
+    ultima = df_impacto_instalacoes.drop_duplicates('id_trecho', keep='last').set_index('id_trecho')
+    return pd.DataFrame({
+        'reducao_pct_taxa_acidente': primeira['reducao_pct_taxa_acidente'],
+        'qtd_instalacoes_radar': df_impacto_instalacoes.groupby('id_trecho').size(),
+        'reducao_pct_taxa_acidente_ultimo_radar': ultima['reducao_pct_taxa_acidente'],
+    }).rename_axis('id_trecho').reset_index()
+
 
 # ==============================================================================
 # ETAPA 5: Análise de Pontos Críticos Internos aos Trechos
 # ==============================================================================
-print("ETAPA 5: Analisando pontos críticos dentro de cada trecho...")
-severidade_por_km = df_proc.groupby(['id_trecho', 'km'])['indice_severidade'].sum().reset_index()
-idx = severidade_por_km.groupby(['id_trecho'])['indice_severidade'].transform(max) == severidade_por_km['indice_severidade']
-pontos_criticos_df = severidade_por_km[idx].drop_duplicates(subset='id_trecho', keep='first').rename(columns={'km': 'ponto_critico_km'})
-pontos_criticos_df = pd.merge(pontos_criticos_df, df_proc[['id_trecho', 'br']].drop_duplicates(), on='id_trecho')
-distancias = []
-for _, trecho in tqdm(pontos_criticos_df.iterrows(), total=pontos_criticos_df.shape[0], desc="Calculando Distância Radar"):
-    br_trecho = trecho['br']
-    km_critico = trecho['ponto_critico_km']
-    radares_na_br = df_radares[df_radares['br'] == br_trecho]
-    distancia_min = np.nan
-    if not radares_na_br.empty:
-        distancia_min = (radares_na_br['km'] - km_critico).abs().min()
-    distancias.append({'id_trecho': trecho['id_trecho'], 'distancia_radar_mais_proximo': distancia_min})
-distancias_df = pd.DataFrame(distancias)
+def nomes_colunas_vizinhanca(k_radares_proximos=K_RADARES_PROXIMOS, raio_radares_km=RAIO_RADARES_KM, raio_radares_geo_km=RAIO_RADARES_GEO_KM):
+    # Colunas cujo nome depende dos parâmetros de vizinhança
+    return {
+        'media_k': f'distancia_media_{k_radares_proximos}_radares_proximos',
+        'qtd_raio': f'qtd_radares_raio_{raio_radares_km:g}km',
+        'qtd_raio_geo': f'qtd_radares_raio_geo_{raio_radares_geo_km:g}km',
+        'prop_raio_geo': f'prop_acidentes_radar_raio_geo_{raio_radares_geo_km:g}km',
+    }
+
+
+@instrumentacao.medir()
+def analisar_pontos_criticos(df_proc, df_radares, k_radares_proximos=K_RADARES_PROXIMOS, raio_radares_km=RAIO_RADARES_KM):
+    # Devolve (pontos críticos por trecho, distâncias aos radares por km)
+    # Além da severidade, soma os acidentes por sentido em cada km para saber o sentido predominante do ponto crítico
+    cols_sentido = [c for c in ['sentido_via_Crescente', 'sentido_via_Decrescente'] if c in df_proc.columns]
+    severidade_por_km = df_proc.groupby(['id_trecho', 'km'])[['indice_severidade'] + cols_sentido].sum().reset_index()
+    idx = severidade_por_km.groupby(['id_trecho'])['indice_severidade'].transform('max') == severidade_por_km['indice_severidade']
+    pontos_criticos_df = severidade_por_km[idx].drop_duplicates(subset='id_trecho', keep='first').rename(columns={'km': 'ponto_critico_km'})
+    pontos_criticos_df = pd.merge(pontos_criticos_df, df_proc[['id_trecho', 'br']].drop_duplicates(), on='id_trecho')
+
+    # Índices de km dos radares por BR e por BR + sentido; radares 'Crescente/Decrescente' valem para os dois sentidos
+    indice_radares = IndicePontosBR(df_radares['br'], df_radares['km'])
+    radares_sentido = df_radares[['br', 'km']].assign(sentido=df_radares['sentido'].astype(str).str.split('/')).explode('sentido')
+    radares_sentido['sentido'] = radares_sentido['sentido'].str.strip()
+    indice_radares_sentido = IndicePontosBR(radares_sentido['br'] + '|' + radares_sentido['sentido'], radares_sentido['km'])
+
+    br_critico = pontos_criticos_df['br'].to_numpy()
+    km_critico = pontos_criticos_df['ponto_critico_km'].to_numpy()
+    dist_k = indice_radares.k_mais_proximos(br_critico, km_critico, k=k_radares_proximos)
+    dist_crescente = indice_radares_sentido.k_mais_proximos(br_critico + '|Crescente', km_critico)[:, 0]
+    dist_decrescente = indice_radares_sentido.k_mais_proximos(br_critico + '|Decrescente', km_critico)[:, 0]
+    acid_crescente = pontos_criticos_df.get('sentido_via_Crescente', pd.Series(0, index=pontos_criticos_df.index)).to_numpy()
+    acid_decrescente = pontos_criticos_df.get('sentido_via_Decrescente', pd.Series(0, index=pontos_criticos_df.index)).to_numpy()
+    # Sentido predominante do ponto crítico; em empate vale o radar mais próximo entre os dois sentidos
+    dist_mesmo_sentido = np.select(
+        [acid_crescente > acid_decrescente, acid_decrescente > acid_crescente, acid_crescente + acid_decrescente > 0],
+        [dist_crescente, dist_decrescente, np.fmin(dist_crescente, dist_decrescente)],
+        default=np.nan,
+    )
+
+    nomes = nomes_colunas_vizinhanca(k_radares_proximos, raio_radares_km)
+    distancias_df = pd.DataFrame({
+        'id_trecho': pontos_criticos_df['id_trecho'].to_numpy(),
+        'distancia_radar_mais_proximo': dist_k[:, 0],
+        # Média só quando a BR tem ao menos K radares
+        nomes['media_k']: dist_k.mean(axis=1),
+        'distancia_radar_mesmo_sentido': dist_mesmo_sentido,
+        nomes['qtd_raio']: indice_radares.contar_no_raio(br_critico, km_critico, raio_radares_km),
+    })
+    return pontos_criticos_df, distancias_df
+
+
+# ------------------------------------------------------------------------------
+# Junção geoespacial: radares por latitude/longitude, independente do km informado
+# ------------------------------------------------------------------------------
+@instrumentacao.medir()
+def juncao_geoespacial(df_proc, pontos_criticos_df, distancias_df, df_radares_geo, raio_radares_geo_km=RAIO_RADARES_GEO_KM, dist_max_radar_geo_km=DIST_MAX_RADAR_GEO_KM):
+    # Um índice com células do tamanho de cada raio de consulta
+    indice_geo_proximo = IndiceGeografico(df_radares_geo['latitude'], df_radares_geo['longitude'], tamanho_celula_km=dist_max_radar_geo_km)
+    indice_geo_raio = IndiceGeografico(df_radares_geo['latitude'], df_radares_geo['longitude'], tamanho_celula_km=raio_radares_geo_km)
+    nomes = nomes_colunas_vizinhanca(raio_radares_geo_km=raio_radares_geo_km)
+
+    if {'latitude', 'longitude'}.issubset(df_proc.columns):
+        lat_acidente = df_proc['latitude'].to_numpy(dtype=float)
+        lon_acidente = df_proc['longitude'].to_numpy(dtype=float)
+    else:
+        lat_acidente = lon_acidente = np.full(len(df_proc), np.nan)
+    _, dist_geo_acidente = indice_geo_proximo.mais_proximo(lat_acidente, lon_acidente, dist_max_radar_geo_km)
+    com_coordenada = ~np.isnan(lat_acidente) & ~np.isnan(lon_acidente)
+    radar_no_raio = indice_geo_raio.contar_no_raio(lat_acidente, lon_acidente, raio_radares_geo_km) > 0
+    geo_acidentes = pd.DataFrame({
+        'id_trecho': df_proc['id_trecho'].to_numpy(),
+        'dist_geo_radar_km': dist_geo_acidente,
+        'com_coordenada': com_coordenada,
+        'radar_no_raio': radar_no_raio & com_coordenada,
+    }).groupby('id_trecho')
+    geo_trechos_df = pd.DataFrame({
+        'distancia_geo_media_acidentes_radar_km': geo_acidentes['dist_geo_radar_km'].mean(),
+        nomes['prop_raio_geo']: geo_acidentes['radar_no_raio'].sum() / geo_acidentes['com_coordenada'].sum().replace(0, np.nan),
+    }).rename_axis('id_trecho').reset_index()
+
+    # Coordenada do ponto crítico: média das coordenadas dos acidentes naquele km do trecho
+    if {'latitude', 'longitude'}.issubset(df_proc.columns):
+        coords_por_km = df_proc.groupby(['id_trecho', 'km'])[['latitude', 'longitude']].mean().reset_index()
+        coords_criticos = pd.merge(pontos_criticos_df[['id_trecho', 'ponto_critico_km']], coords_por_km.rename(columns={'km': 'ponto_critico_km'}), on=['id_trecho', 'ponto_critico_km'], how='left')
+        lat_critico = coords_criticos['latitude'].to_numpy(dtype=float)
+        lon_critico = coords_criticos['longitude'].to_numpy(dtype=float)
+    else:
+        lat_critico = lon_critico = np.full(len(pontos_criticos_df), np.nan)
+    _, dist_geo_critico = indice_geo_proximo.mais_proximo(lat_critico, lon_critico, dist_max_radar_geo_km)
+    distancias_df = distancias_df.copy()
+    distancias_df['distancia_geo_radar_mais_proximo_km'] = dist_geo_critico
+    distancias_df[nomes['qtd_raio_geo']] = indice_geo_raio.contar_no_raio(lat_critico, lon_critico, raio_radares_geo_km)
+    return pd.merge(distancias_df, geo_trechos_df, on='id_trecho', how='left')
+
 
 # ==============================================================================
 # ETAPA 6: Gerar Dataset Final e Exibir Insights
 # ==============================================================================
-print("ETAPA 6: Gerando dataset final e exibindo insights...")
-
 # Define as agregações básicas
-agg_dict = {
+AGREGACOES_BASICAS = {
     'br': ('br', 'first'),
     'trecho_km_inicial': ('km', 'min'),
     'trecho_km_final': ('km', 'max'),
@@ -140,42 +287,380 @@ agg_dict = {
     'trecho_severidade_media': ('indice_severidade', 'mean')
 }
 
-# Identifica dinamicamente as colunas one-hot-encoded para calcular a proporção (média)
-colunas_one_hot = [col for col in df_proc.columns if set(df_proc[col].dropna().unique()).issubset({0, 1}) and col not in agg_dict]
 
-# Adiciona as colunas one-hot ao dicionário de agregação
-for col in colunas_one_hot:
-    agg_dict[col.replace('causa_acidente_', 'prop_causa_').replace('condicao_metereologica_', 'prop_cond_').replace('tipo_pista_', 'prop_pista_')] = (col, 'mean')
+# Indicadores 0/1 criados em preparar_acidentes, agregados como proporção junto com os do esquema
+INDICADORES_DERIVADOS = ['causa_relevante_radar']
+
+
+def identificar_colunas_one_hot(df_proc):
+    # Colunas indicadoras pelo esquema (one-hot e multirrótulo do pré-processamento), sem varrer os valores
+    return esquema.colunas_indicadoras(df_proc.columns) + [col for col in INDICADORES_DERIVADOS if col in df_proc.columns]
+
+
+def nome_proporcao(col):
+    return col.replace('causa_acidente_', 'prop_causa_').replace('condicao_metereologica_', 'prop_cond_').replace('tipo_pista_', 'prop_pista_')
+
+
+def somar_segmentos(valores, inicios):
+    # Soma de cada segmento contíguo; inteiros acumulam em int64 (int16/uint8 estourariam)
+    tipo = np.int64 if np.issubdtype(valores.dtype, np.integer) or valores.dtype == bool else np.float64
+    return np.add.reduceat(valores, inicios, axis=0, dtype=tipo)
+
+
+def agregar_por_trecho(df_proc, agregacoes, colunas_proporcao):
+    # Mesmo resultado de groupby('id_trecho').agg(**agregacoes, proporções=mean), sem
+    # uma redução por coluna: as linhas são ordenadas pelo código do trecho e cada
+    # trecho vira um segmento contíguo. Os indicadores vão para uma única matriz
+    # uint8 contígua e todas as proporções saem de um np.add.reduceat.
+    if df_proc.empty:
+        return pd.DataFrame(columns=['id_trecho', *agregacoes, *map(nome_proporcao, colunas_proporcao)])
+    codigo, trechos = pd.factorize(df_proc['id_trecho'], sort=True)
+    ordem = np.argsort(codigo, kind='stable')
+    inicios = np.flatnonzero(np.diff(codigo[ordem], prepend=-1))
+    tamanhos = np.diff(np.append(inicios, len(ordem)))
+    resultado = {'id_trecho': np.asarray(trechos, dtype=object)}
+    for nome, (col, funcao) in agregacoes.items():
+        if funcao == 'size':
+            resultado[nome] = tamanhos.astype(np.int64)
+            continue
+        if funcao == 'first':
+            resultado[nome] = df_proc[col].to_numpy()[ordem[inicios]]
+            continue
+        valores = df_proc[col].to_numpy()[ordem]
+        if funcao == 'min':
+            resultado[nome] = np.minimum.reduceat(valores, inicios)
+        elif funcao == 'max':
+            resultado[nome] = np.maximum.reduceat(valores, inicios)
+        elif funcao == 'sum':
+            resultado[nome] = somar_segmentos(valores, inicios)
+        elif funcao == 'mean':
+            resultado[nome] = somar_segmentos(valores, inicios) / tamanhos
+        else:
+            raise ValueError(f'agregação não suportada: {funcao}')
+    if colunas_proporcao:
+        matriz = np.ascontiguousarray(df_proc[colunas_proporcao].to_numpy(dtype=np.uint8)[ordem])
+        proporcoes = somar_segmentos(matriz, inicios) / tamanhos[:, None]
+        for j, col in enumerate(colunas_proporcao):
+            resultado[nome_proporcao(col)] = proporcoes[:, j]
+    return pd.DataFrame(resultado)
+
+
+@instrumentacao.medir()
+def agregar_trechos(df_proc, pontos_criticos_df, distancias_df, df_trechos_com_radar, df_impacto, nomes, colunas_one_hot=None):
+    # Colunas indicadoras pelo esquema; a proporção de cada uma no trecho é a média
+    if colunas_one_hot is None:
+        colunas_one_hot = identificar_colunas_one_hot(df_proc)
+    df_trechos_final = agregar_por_trecho(df_proc, AGREGACOES_BASICAS, colunas_one_hot)
+
+    df_trechos_final['trecho_extensao_km'] = df_trechos_final['trecho_km_final'] - df_trechos_final['trecho_km_inicial']
+
+    # Junta todas as novas informações que criamos (ponto crítico, distância, impacto)
+    df_trechos_final = pd.merge(df_trechos_final, pontos_criticos_df[['id_trecho', 'ponto_critico_km']], on='id_trecho', how='left')
+    df_trechos_final = pd.merge(df_trechos_final, distancias_df, on='id_trecho', how='left')
+    df_trechos_final['tem_radar'] = df_trechos_final['id_trecho'].isin(df_trechos_com_radar['id_trecho']).astype(int)
+    df_trechos_final = pd.merge(df_trechos_final, df_impacto, on='id_trecho', how='left')
+
+    # Preenche valores nulos para as novas colunas
+    for col in ['reducao_pct_taxa_acidente', 'qtd_instalacoes_radar', 'reducao_pct_taxa_acidente_ultimo_radar']:
+        df_trechos_final[col] = df_trechos_final[col].fillna(0)
+    for col in ['distancia_radar_mais_proximo', nomes['media_k'], 'distancia_radar_mesmo_sentido', 'distancia_geo_radar_mais_proximo_km', 'distancia_geo_media_acidentes_radar_km']:
+        df_trechos_final[col] = df_trechos_final[col].fillna(-1)
+    for col in [nomes['qtd_raio'], nomes['qtd_raio_geo'], nomes['prop_raio_geo']]:
+        df_trechos_final[col] = df_trechos_final[col].fillna(0)
+    return df_trechos_final
+
+
+def analisar_trechos(df_proc, df_radares, df_radares_geo, gap_threshold_km=GAP_THRESHOLD_KM,
+                     tolerancia_snap_radar_km=TOLERANCIA_SNAP_RADAR_KM, k_radares_proximos=K_RADARES_PROXIMOS,
+                     raio_radares_km=RAIO_RADARES_KM, raio_radares_geo_km=RAIO_RADARES_GEO_KM,
+                     dist_max_radar_geo_km=DIST_MAX_RADAR_GEO_KM, colunas_one_hot=None, exibir_progresso=True):
+    # Etapas que dependem só dos acidentes e radares de cada BR (mais os radares geográficos de todas as UFs)
+    exibir = print if exibir_progresso else (lambda *args: None)
+    exibir(f"ETAPA 2: Segmentando BRs em trechos (gap > {gap_threshold_km} km)...")
+    df_proc = segmentar_trechos(df_proc, gap_threshold_km)
+
+    exibir("ETAPA 4: Calculando o impacto 'Antes x Depois' dos radares existentes...")
+    df_trechos_com_radar = localizar_radares_em_trechos(df_proc, df_radares, tolerancia_snap_radar_km)
+    df_impacto = resumir_impacto(construir_cubo(df_proc), df_trechos_com_radar)
+
+    exibir("ETAPA 5: Analisando pontos críticos dentro de cada trecho...")
+    pontos_criticos_df, distancias_df = analisar_pontos_criticos(df_proc, df_radares, k_radares_proximos, raio_radares_km)
+    exibir("ETAPA 5: Junção geoespacial de acidentes e pontos críticos com os radares...")
+    distancias_df = juncao_geoespacial(df_proc, pontos_criticos_df, distancias_df, df_radares_geo, raio_radares_geo_km, dist_max_radar_geo_km)
+
+    exibir("ETAPA 6: Gerando dataset final e exibindo insights...")
+    nomes = nomes_colunas_vizinhanca(k_radares_proximos, raio_radares_km, raio_radares_geo_km)
+    return agregar_trechos(df_proc, pontos_criticos_df, distancias_df, df_trechos_com_radar, df_impacto, nomes, colunas_one_hot)
+
+
+@instrumentacao.medir()
+def gerar_dataset_trechos(df_acidentes, df_radares_brutos, gap_threshold_km=GAP_THRESHOLD_KM,
+                          tolerancia_snap_radar_km=TOLERANCIA_SNAP_RADAR_KM, k_radares_proximos=K_RADARES_PROXIMOS,
+                          raio_radares_km=RAIO_RADARES_KM, raio_radares_geo_km=RAIO_RADARES_GEO_KM,
+                          dist_max_radar_geo_km=DIST_MAX_RADAR_GEO_KM, colunas_one_hot=None, processos=None,
+                          features_janela_12m=FEATURES_JANELA_12M):
+    # colunas_one_hot: lista fixa de colunas de proporção (ex.: calculada sobre a base
+    # inteira quando só um subconjunto de BRs é processado)
+    # processos: None usa PROCESSOS; o resultado não depende da quantidade de processos
+    parametros = dict(
+        gap_threshold_km=gap_threshold_km, tolerancia_snap_radar_km=tolerancia_snap_radar_km,
+        k_radares_proximos=k_radares_proximos, raio_radares_km=raio_radares_km,
+        raio_radares_geo_km=raio_radares_geo_km, dist_max_radar_geo_km=dist_max_radar_geo_km,
+    )
+    processos = PROCESSOS if processos is None else processos
+    print("ETAPA 1: Carregando e preparando a base de acidentes...")
+    df_proc = preparar_acidentes(df_acidentes)
+
+    print("ETAPA 3: Carregando e preparando a base de radares...")
+    df_radares, df_radares_geo = preparar_radares(df_radares_brutos)
+
+    if processos <= 1:
+        df_trechos = analisar_trechos(df_proc, df_radares, df_radares_geo, colunas_one_hot=colunas_one_hot, **parametros)
+    else:
+        df_trechos = gerar_dataset_trechos_paralelo(df_proc, df_radares, df_radares_geo, processos, parametros, colunas_one_hot)
+    if features_janela_12m:
+        # Cubo da base inteira sobre os trechos finais: a janela termina no último mês de
+        # dados de todas as BRs, qualquer que seja a quantidade de processos
+        print("ETAPA 6: Features de janelas de 12 meses pelo cubo (trecho x mês)...")
+        df_trechos = pd.merge(df_trechos, cubo_do_dataset(df_proc, df_trechos).features_janela(12), on='id_trecho', how='left')
+    return df_trechos
+
+
+# ------------------------------------------------------------------------------
+# Execução paralela por BR
+# ------------------------------------------------------------------------------
+# As BRs são distribuídas entre as partições pela quantidade de acidentes. Acidentes
+# e radares vão para arquivos Arrow IPC com uma record batch por partição; cada
+# processo mapeia os arquivos em memória e lê só a sua batch, sem DataFrames
+# serializados. Os trechos de todas as partições são renumerados juntos, então
+# id_trecho não depende da quantidade de processos.
+def particionar_brs(br, n_particoes):
+    # {br: partição}; cada BR, da com mais acidentes para a com menos, vai para a partição menos carregada
+    contagem = br.value_counts()
+    contagem = contagem.sort_index().sort_values(ascending=False, kind='stable')
+    carga = np.zeros(n_particoes, dtype=np.int64)
+    particao_br = {}
+    for chave, n in contagem.items():
+        destino = int(np.argmin(carga))
+        particao_br[chave] = destino
+        carga[destino] += n
+    return particao_br
+
+
+def escrever_particoes_arrow(df, particao, n_particoes, caminho):
+    # Linhas fora de toda partição (-1) ficam de fora; cada partição mantém a ordem original das linhas
+    ordem = np.argsort(particao, kind='stable')
+    limites = np.searchsorted(particao[ordem], np.arange(n_particoes + 1))
+    lote = pa.RecordBatch.from_pandas(df.iloc[ordem], preserve_index=False)
+    with pa.OSFile(caminho, 'wb') as destino, pa.ipc.new_file(destino, lote.schema) as escritor:
+        for i in range(n_particoes):
+            escritor.write_batch(lote.slice(limites[i], limites[i + 1] - limites[i]))
+
+
+def ler_particao_arrow(caminho, particao):
+    return pa.ipc.open_file(pa.memory_map(caminho)).get_batch(particao).to_pandas()
+
+
+def processar_particao(caminhos, particao, parametros, colunas_one_hot):
+    df_proc = ler_particao_arrow(caminhos['acidentes'], particao)
+    df_radares = ler_particao_arrow(caminhos['radares'], particao)
+    df_radares_geo = ler_particao_arrow(caminhos['radares_geo'], 0)
+    df_trechos = analisar_trechos(df_proc, df_radares, df_radares_geo, colunas_one_hot=colunas_one_hot, exibir_progresso=False, **parametros)
+    # Volta ao processo principal como buffer Arrow
+    tabela = pa.Table.from_pandas(df_trechos, preserve_index=False)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue().to_pybytes()
+
+
+@instrumentacao.medir()
+def gerar_dataset_trechos_paralelo(df_proc, df_radares, df_radares_geo, processos, parametros, colunas_one_hot=None):
+    # Mesma limpeza de br/km/data da segmentação, para particionar e decidir as colunas de proporção sobre a base inteira
+    df_proc = df_proc.dropna(subset=['br', 'km', 'data_inversa'])
+    df_proc['br'] = df_proc['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
+    if colunas_one_hot is None:
+        colunas_one_hot = identificar_colunas_one_hot(df_proc)
+    n_particoes = min(processos, df_proc['br'].nunique())
+    if n_particoes <= 1:
+        return analisar_trechos(df_proc, df_radares, df_radares_geo, colunas_one_hot=colunas_one_hot, **parametros)
+
+    print(f"ETAPAS 2, 4, 5 e 6: {df_proc['br'].nunique()} BRs em {n_particoes} partições, {processos} processos...")
+    particao_br = particionar_brs(df_proc['br'], n_particoes)
+    with tempfile.TemporaryDirectory(prefix='analise_trechos_') as dir_temp:
+        caminhos = {nome: os.path.join(dir_temp, f'{nome}.arrow') for nome in ['acidentes', 'radares', 'radares_geo']}
+        escrever_particoes_arrow(df_proc, df_proc['br'].map(particao_br).to_numpy(dtype=np.int64), n_particoes, caminhos['acidentes'])
+        escrever_particoes_arrow(df_radares, df_radares['br'].map(particao_br).fillna(-1).to_numpy(dtype=np.int64), n_particoes, caminhos['radares'])
+        escrever_particoes_arrow(df_radares_geo, np.zeros(len(df_radares_geo), dtype=np.int64), 1, caminhos['radares_geo'])
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = [executor.submit(processar_particao, caminhos, i, parametros, colunas_one_hot) for i in range(n_particoes)]
+            # Resultados juntados na ordem das partições, não na ordem em que terminam
+            partes = [pa.ipc.open_stream(futuro.result()).read_pandas() for futuro in futuros]
+    return renumerar_trechos(pd.concat(partes, ignore_index=True))
+
+
+def renumerar_trechos(df_trechos):
+    # Numeração global dos trechos como na segmentação da base inteira: contagem
+    # contínua em ordem de (br, km inicial), e linhas em ordem de id_trecho
+    df_trechos = df_trechos.sort_values(['br', 'trecho_km_inicial']).reset_index(drop=True)
+    df_trechos['id_trecho'] = 'BR' + df_trechos['br'] + '_T' + pd.Series(np.arange(1, len(df_trechos) + 1)).astype(str)
+    return df_trechos.sort_values('id_trecho').reset_index(drop=True)
+
+
+# ------------------------------------------------------------------------------
+# Varredura de limiares de segmentação
+# ------------------------------------------------------------------------------
+# A segmentação é um corte por ligação simples sobre os km ordenados de cada BR:
+# um trecho novo começa onde o vão até o acidente anterior passa do limiar. Com
+# uma única ordenação por (br, km) os vãos são calculados uma vez e os trechos de
+# cada limiar são segmentos contíguos das linhas ordenadas, agregados com
+# np.add.reduceat. A posição de cada radar nas linhas ordenadas também não
+# depende do limiar.
+def ordenar_por_br_km(df_proc):
+    # Linhas na ordem da segmentação, com o código da BR (BRs em ordem alfabética, como no sort_values)
+    df_proc = df_proc.dropna(subset=['br', 'km', 'data_inversa'])
+    br = df_proc['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
+    codigos, brs = pd.factorize(br, sort=True)
+    ordem = np.lexsort((df_proc['km'].to_numpy(dtype=float), codigos))
+    return df_proc.iloc[ordem].reset_index(drop=True), codigos[ordem], np.asarray(brs, dtype=object)
+
+
+def posicionar_radares(codigos, brs, km, df_radares):
+    # Para cada radar numa BR com acidentes: (início e fim do bloco da BR, última linha
+    # com km <= km do radar, km do radar); a última linha é início - 1 se não houver
+    codigo_br = {br: i for i, br in enumerate(brs)}
+    cod_radar = df_radares['br'].map(codigo_br).to_numpy(dtype=float)
+    km_radar = df_radares['km'].to_numpy(dtype=float)
+    ok = ~np.isnan(cod_radar) & ~np.isnan(km_radar)
+    cod_radar, km_radar = cod_radar[ok].astype(np.int64), km_radar[ok]
+    inicio_bloco = np.searchsorted(codigos, cod_radar, side='left')
+    fim_bloco = np.searchsorted(codigos, cod_radar, side='right')
+    ultima = np.empty(len(km_radar), dtype=np.int64)
+    for pos in posicoes_por_br(cod_radar).values():
+        a, b = inicio_bloco[pos[0]], fim_bloco[pos[0]]
+        ultima[pos] = a + np.searchsorted(km[a:b], km_radar[pos], side='right') - 1
+    return inicio_bloco, fim_bloco, ultima, km_radar
+
+
+def trechos_dos_radares(inicios, fins, id_linha, km, radares, tolerancia_snap_radar_km):
+    # Trecho de cada radar, com as mesmas regras de IndiceIntervalosBR.localizar; -1 sem trecho
+    inicio_bloco, fim_bloco, ultima, km_radar = radares
+    tem_esq = ultima >= inicio_bloco
+    t_esq = id_linha[np.maximum(ultima, 0)]
+    dentro = tem_esq & (km_radar <= km[fins[t_esq]])
+    trecho = np.where(dentro, t_esq, -1)
+    if tolerancia_snap_radar_km > 0:
+        # Vão entre trechos: o mais próximo dos dois vizinhos na mesma BR (empate fica com o da esquerda)
+        t_dir = np.where(tem_esq, t_esq + 1, id_linha[np.minimum(inicio_bloco, len(id_linha) - 1)])
+        t_dir_valido = np.minimum(t_dir, len(inicios) - 1)
+        tem_dir = (t_dir < len(inicios)) & (inicios[t_dir_valido] < fim_bloco)
+        d_esq = np.where(tem_esq, km_radar - km[fins[t_esq]], np.inf)
+        d_dir = np.where(tem_dir, km[inicios[t_dir_valido]] - km_radar, np.inf)
+        usa_dir = d_dir < d_esq
+        snap = ~dentro & (np.minimum(d_esq, d_dir) <= tolerancia_snap_radar_km)
+        trecho = np.where(snap, np.where(usa_dir, t_dir_valido, t_esq), trecho)
+    return trecho
+
+
+@instrumentacao.medir()
+def varrer_limiares(df_proc, df_radares, limiares=LIMIARES_VARREDURA_KM, tolerancia_snap_radar_km=TOLERANCIA_SNAP_RADAR_KM):
+    # df_proc e df_radares já preparados (preparar_acidentes / preparar_radares).
+    # Devolve (tabela comparativa, uma linha por limiar; {limiar: agregados por trecho};
+    # índice do trecho de cada linha ordenada por limiar, com as linhas ordenadas)
+    df_ord, codigos, brs = ordenar_por_br_km(df_proc)
+    km = df_ord['km'].to_numpy(dtype=float)
+    risco = df_ord['risco_radar'].to_numpy(dtype=float)
+    severidade = df_ord['indice_severidade'].to_numpy(dtype=float)
+    inicio_br = np.r_[True, codigos[1:] != codigos[:-1]] if len(km) else np.zeros(0, dtype=bool)
+    vao = np.r_[np.inf, np.diff(km)] if len(km) else np.zeros(0)
+    radares = posicionar_radares(codigos, brs, km, df_radares)
+
+    linhas, trechos, ids = [], {}, {}
+    for limiar in sorted(limiares):
+        novo = inicio_br | (vao > limiar)
+        inicios = np.flatnonzero(novo)
+        fins = np.r_[inicios[1:], len(km)] - 1
+        id_linha = np.cumsum(novo) - 1
+        acidentes = fins - inicios + 1
+        extensao = km[fins] - km[inicios]
+        risco_trecho = np.add.reduceat(risco, inicios) if len(inicios) else np.zeros(0)
+        trecho_radar = trechos_dos_radares(inicios, fins, id_linha, km, radares, tolerancia_snap_radar_km)
+        tem_radar = np.zeros(len(inicios), dtype=int)
+        tem_radar[trecho_radar[trecho_radar >= 0]] = 1
+
+        br_trecho = brs[codigos[inicios]]
+        trechos[limiar] = pd.DataFrame({
+            'id_trecho': 'BR' + pd.Series(br_trecho, dtype=object) + '_T' + pd.Series(np.arange(1, len(inicios) + 1)).astype(str),
+            'br': br_trecho,
+            'trecho_km_inicial': km[inicios],
+            'trecho_km_final': km[fins],
+            'trecho_densidade_acidentes': acidentes,
+            'trecho_risco_total': risco_trecho,
+            'trecho_severidade_media': np.add.reduceat(severidade, inicios) / acidentes if len(inicios) else np.zeros(0),
+            'trecho_extensao_km': extensao,
+            'tem_radar': tem_radar,
+        })
+        ids[f'trecho_{limiar:g}'] = id_linha
+
+        # Parcela do risco total nos 10% de trechos de maior risco
+        top = np.sort(risco_trecho)[::-1][:int(np.ceil(0.1 * len(inicios)))]
+        linhas.append({
+            'limiar_km': limiar,
+            'trechos': len(inicios),
+            'trechos_unitarios_pct': 100 * np.mean(acidentes == 1) if len(inicios) else np.nan,
+            'acidentes_por_trecho_media': np.mean(acidentes) if len(inicios) else np.nan,
+            'acidentes_por_trecho_mediana': np.median(acidentes) if len(inicios) else np.nan,
+            'acidentes_por_trecho_max': acidentes.max() if len(inicios) else np.nan,
+            'extensao_km_mediana': np.median(extensao) if len(inicios) else np.nan,
+            'extensao_km_max': extensao.max() if len(inicios) else np.nan,
+            'trechos_com_radar': int(tem_radar.sum()),
+            'risco_top10pct_trechos_pct': 100 * top.sum() / risco.sum() if risco.sum() > 0 else np.nan,
+        })
+    return pd.DataFrame(linhas), trechos, df_ord.assign(**ids)
 
-# Executa a agregação completa
-df_trechos_final = df_proc.groupby('id_trecho').agg(**agg_dict).reset_index()
 
-df_trechos_final['trecho_extensao_km'] = df_trechos_final['trecho_km_final'] - df_trechos_final['trecho_km_inicial']
+def executar_varredura(df_acidentes, df_radares_brutos, limiares=LIMIARES_VARREDURA_KM, tolerancia_snap_radar_km=TOLERANCIA_SNAP_RADAR_KM):
+    df_proc = preparar_acidentes(df_acidentes)
+    df_radares, _ = preparar_radares(df_radares_brutos)
+    tabela, _, _ = varrer_limiares(df_proc, df_radares, limiares, tolerancia_snap_radar_km)
+    tabela.to_csv(ARQUIVO_VARREDURA, index=False, encoding='utf-8')
+    print(f"\n=== Varredura de limiares de segmentação ({len(df_proc)} acidentes) ===")
+    print(tabela.round(2).to_string(index=False))
+    print(f"\nTabela salva em: '{ARQUIVO_VARREDURA}'")
+    return tabela
 
-# Junta todas as novas informações que criamos (ponto crítico, distância, impacto)
-df_trechos_final = pd.merge(df_trechos_final, pontos_criticos_df[['id_trecho', 'ponto_critico_km']], on='id_trecho', how='left')
-df_trechos_final = pd.merge(df_trechos_final, distancias_df, on='id_trecho', how='left')
-df_trechos_final['tem_radar'] = df_trechos_final['id_trecho'].isin(df_trechos_com_radar['id_trecho']).astype(int)
-df_trechos_final = pd.merge(df_trechos_final, df_impacto, on='id_trecho', how='left')
 
-# Preenche valores nulos para as novas colunas
-df_trechos_final['reducao_pct_taxa_acidente'].fillna(0, inplace=True)
-df_trechos_final['distancia_radar_mais_proximo'].fillna(-1, inplace=True)
+def exibir_insights(df_trechos_final):
+    print("\n" + "="*80)
+    print("=== INSIGHTS FINAIS: DATASET CONSOLIDADO ===")
+    print("="*80)
+    print(f"\n[INFO] Total de trechos únicos identificados: {len(df_trechos_final)}")
+    print(f"[INFO] Dataset final criado com {df_trechos_final.shape[1]} colunas (features).")
 
-df_trechos_final.to_csv(ARQUIVO_SAIDA, index=False, encoding='utf-8')
+    print("\n--- Top 10 Trechos por Risco Total (com todas as features) ---")
+    cols_display = [
+        'id_trecho', 'trecho_risco_total', 'trecho_extensao_km', 
+        'ponto_critico_km', 'distancia_radar_mais_proximo', 'tem_radar', 'reducao_pct_taxa_acidente'
+    ]
+    print(df_trechos_final.sort_values('trecho_risco_total', ascending=False).head(10)[cols_display].round(2))
 
-# Exibir Insights
-print("\n" + "="*80)
-print("=== INSIGHTS FINAIS: DATASET CONSOLIDADO ===")
-print("="*80)
-print(f"\n[INFO] Total de trechos únicos identificados: {len(df_trechos_final)}")
-print(f"[INFO] Dataset final criado com {df_trechos_final.shape[1]} colunas (features).")
 
-print("\n--- Top 10 Trechos por Risco Total (com todas as features) ---")
-cols_display = [
-    'id_trecho', 'trecho_risco_total', 'trecho_extensao_km', 
-    'ponto_critico_km', 'distancia_radar_mais_proximo', 'tem_radar', 'reducao_pct_taxa_acidente'
-]
-print(df_trechos_final.sort_values('trecho_risco_total', ascending=False).head(10)[cols_display].round(2))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Segmenta os acidentes em trechos e gera o dataset final para ML.')
+    parser.add_argument('--varrer', type=float, nargs='*', metavar='LIMIAR_KM',
+                        help=f'compara limiares de gap (km) numa única passada em vez de gerar o dataset; sem valores usa {LIMIARES_VARREDURA_KM}')
+    args = parser.parse_args()
 
-print(f"\nScript concluído com sucesso. Arquivo final salvo em: '{ARQUIVO_SAIDA}'")
\ No newline at end of file
+    with instrumentacao.medir_etapa('leitura') as medicao:
+        df_acidentes, df_radares_brutos = carregar_acidentes(), carregar_radares()
+        medicao.linhas_saida = len(df_acidentes)
+    if args.varrer is not None:
+        executar_varredura(df_acidentes, df_radares_brutos, args.varrer or LIMIARES_VARREDURA_KM)
+    else:
+        df_trechos_final = gerar_dataset_trechos(df_acidentes, df_radares_brutos)
+        with instrumentacao.medir_etapa('gravacao', len(df_trechos_final)):
+            df_trechos_final.to_csv(ARQUIVO_SAIDA, index=False, encoding='utf-8')
+            matriz_ml.exportar_matriz(df_trechos_final)
+        exibir_insights(df_trechos_final)
+        print(f"\nScript concluído com sucesso. Arquivo final salvo em: '{ARQUIVO_SAIDA}' (matriz float32: '{matriz_ml.ARQUIVO_MATRIZ}')")
+    instrumentacao.salvar_relatorio('analise_trechos')
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+import pre_processamento
+import padronizar_categorias_mg
+import analise_trechos
+import gerar_dados_sinteticos
+from pipeline import ETAPAS, Pipeline
+
+# ==============================================================================
+# Benchmark de escalabilidade do pipeline sobre dados sintéticos
+# ==============================================================================
+# Para cada tamanho gera (ou reaproveita) uma base sintética em
+# DIR_BENCHMARK/n{linhas}/ e executa cada etapa do pipeline em um subprocesso
+# próprio. As entradas vêm do cache da etapa anterior, e o subprocesso mede o
+# tempo de parede, o tempo de CPU e o pico de memória (RSS) do próprio processo.
+# Os resultados vão para um CSV junto com o expoente de escala de cada etapa
+# (tempo ~ linhas^expoente). Eles podem ser comparados com uma execução de
+# referência para detectar regressões.
+#
+#   python benchmark_pipeline.py --tamanhos 100000 1000000 10000000
+#   python benchmark_pipeline.py --tamanhos 100000 --comparar benchmark/referencia.csv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_BENCHMARK = os.path.join(BASE_DIR, 'benchmark')
+TAMANHOS_PADRAO = [100_000, 1_000_000]
+ANOS_BENCHMARK = list(range(2015, 2025))
+# Arquivos de estado que as etapas reaproveitam entre execuções; são removidos
+# antes de cada repetição para medir sempre a execução a frio
+ARQUIVOS_ESTADO = ['tabelas_padronizacao.json', 'indice_km_coordenadas.parquet', 'indice_km_coordenadas.json']
+# Aumento relativo de tempo ou de memória considerado regressão
+TOLERANCIA_REGRESSAO = 0.25
+
+
+def pico_rss_mb():
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 2**10
+
+
+# ------------------------------------------------------------------------------
+# Subprocesso: uma etapa sobre as saídas em cache das anteriores
+# ------------------------------------------------------------------------------
+def executar_etapa(dir_dados, nome, caminho_resultado):
+    # Entradas (datatran, radares) e arquivos de estado ficam no diretório da base sintética
+    dir_dados = os.path.abspath(dir_dados)
+    os.chdir(dir_dados)
+    pre_processamento.BASE_DIR = dir_dados
+    padronizar_categorias_mg.arquivo_tabelas = os.path.join(dir_dados, 'tabelas_padronizacao.json')
+    pipeline = Pipeline(dir_cache=os.path.join(dir_dados, '.cache_pipeline'), parametros={'anos': pre_processamento.anos_disponiveis()})
+    etapa = pipeline.etapas[nome]
+
+    inicio = time.perf_counter()
+    entradas = []
+    for dependencia in etapa.dependencias:
+        df = pipeline.carregar_cache(dependencia)
+        if df is None:
+            raise Exception(f'Etapa {dependencia} sem cache em {dir_dados}: execute as etapas anteriores primeiro')
+        entradas.append(df)
+    tempo_carga = time.perf_counter() - inicio
+    rss_entradas = pico_rss_mb()
+
+    inicio, cpu_inicio = time.perf_counter(), time.process_time()
+    filhos_inicio = resource.getrusage(resource.RUSAGE_CHILDREN)
+    df = etapa.funcao(*entradas, **etapa.parametros).reset_index(drop=True)
+    tempo = time.perf_counter() - inicio
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # CPU dos processos filhos (ex.: análise de trechos com vários processos) entra na conta
+    cpu = time.process_time() - cpu_inicio + (filhos.ru_utime - filhos_inicio.ru_utime) + (filhos.ru_stime - filhos_inicio.ru_stime)
+
+    resultado = {
+        'etapa': nome,
+        'linhas_entrada': sum(len(e) for e in entradas) if entradas else None,
+        'linhas_saida': len(df),
+        'colunas_saida': df.shape[1],
+        'memoria_saida_mb': df.memory_usage(deep=True).sum() / 2**20,
+        'tempo_carga_s': tempo_carga,
+        'tempo_s': tempo,
+        'cpu_s': cpu,
+        'rss_entradas_mb': rss_entradas,
+        'pico_rss_mb': pico_rss_mb(),
+    }
+    pipeline.salvar_cache(nome, df)
+    pipeline.salvar_hashes()
+    with open(caminho_resultado, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f)
+
+
+# ------------------------------------------------------------------------------
+# Processo principal
+# ------------------------------------------------------------------------------
+def preparar_base(linhas, anos=ANOS_BENCHMARK, semente=42):
+    # Gera a base sintética de um tamanho, ou reaproveita a já gerada com os mesmos parâmetros
+    dir_dados = os.path.join(DIR_BENCHMARK, f'n{linhas}')
+    caminho_meta = os.path.join(dir_dados, 'base.json')
+    meta = {'linhas': linhas, 'anos': anos, 'semente': semente}
+    if os.path.exists(caminho_meta):
+        with open(caminho_meta, 'r', encoding='utf-8') as f:
+            if json.load(f) == meta:
+                return dir_dados
+    shutil.rmtree(dir_dados, ignore_errors=True)
+    print(f'Gerando base sintética com {linhas} linhas em {dir_dados}...')
+    gerar_dados_sinteticos.gerar_datatran(dir_dados, linhas, anos, semente)
+    gerar_dados_sinteticos.gerar_radares(os.path.join(dir_dados, analise_trechos.ARQUIVO_RADARES), gerar_dados_sinteticos.radares_para(linhas), semente)
+    with open(caminho_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return dir_dados
+
+
+def medir_etapa(dir_dados, nome, processos=1):
+    caminho_resultado = os.path.join(dir_dados, f'resultado_{nome}.json')
+    caminho_log = os.path.join(dir_dados, f'log_{nome}.txt')
+    comando = [sys.executable, os.path.abspath(__file__), '--executar-etapa', nome, '--dados', dir_dados,
+               '--resultado', caminho_resultado, '--processos', str(processos)]
+    with open(caminho_log, 'w', encoding='utf-8') as log:
+        retorno = subprocess.run(comando, stdout=log, stderr=subprocess.STDOUT).returncode
+    if retorno != 0:
+        raise Exception(f'Etapa {nome} falhou (código {retorno}); ver {caminho_log}')
+    with open(caminho_resultado, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def executar_benchmark(tamanhos=TAMANHOS_PADRAO, anos=ANOS_BENCHMARK, semente=42, repeticoes=1, processos=1):
+    registros = []
+    for linhas in tamanhos:
+        dir_dados = preparar_base(linhas, anos, semente)
+        for repeticao in range(repeticoes):
+            for arquivo in ARQUIVOS_ESTADO:
+                if os.path.exists(os.path.join(dir_dados, arquivo)):
+                    os.remove(os.path.join(dir_dados, arquivo))
+            for etapa in ETAPAS:
+                resultado = medir_etapa(dir_dados, etapa.nome, processos)
+                registros.append({'tamanho': linhas, 'repeticao': repeticao, **resultado})
+                print(f"n={linhas:<10} {etapa.nome:<22} {resultado['tempo_s']:>9.2f} s {resultado['cpu_s']:>9.2f} s CPU "
+                      f"{resultado['pico_rss_mb']:>9.1f} MB  {resultado['linhas_saida']} linhas")
+    return pd.DataFrame(registros)
+
+
+def resumir(df):
+    # Mediana das repetições para os tempos e máximo para a memória
+    colunas_tempo = ['tempo_carga_s', 'tempo_s', 'cpu_s']
+    colunas_max = ['linhas_entrada', 'linhas_saida', 'colunas_saida', 'memoria_saida_mb', 'rss_entradas_mb', 'pico_rss_mb']
+    ordem = {e.nome: i for i, e in enumerate(ETAPAS)}
+    resumo = df.groupby(['tamanho', 'etapa']).agg(
+        **{c: (c, 'median') for c in colunas_tempo}, **{c: (c, 'max') for c in colunas_max}
+    ).reset_index()
+    return resumo.sort_values(['tamanho', 'etapa'], key=lambda s: s.map(ordem) if s.name == 'etapa' else s).reset_index(drop=True)
+
+
+def expoentes_escala(resumo):
+    # Inclinação de log(tempo) x log(linhas) por etapa: ~1 linear, ~2 quadrática
+    expoentes = {}
+    for nome, grupo in resumo.groupby('etapa', sort=False):
+        if grupo['tamanho'].nunique() >= 2:
+            expoentes[nome] = np.polyfit(np.log(grupo['tamanho']), np.log(grupo['tempo_s'].clip(lower=1e-3)), 1)[0]
+    return pd.Series(expoentes, name='expoente_tempo')
+
+
+def comparar(resumo, referencia, tolerancia=TOLERANCIA_REGRESSAO):
+    # Etapas (por tamanho) mais lentas ou com mais memória que a referência além da tolerância
+    juntos = pd.merge(resumo, referencia, on=['tamanho', 'etapa'], suffixes=('', '_referencia'))
+    juntos['razao_tempo'] = juntos['tempo_s'] / juntos['tempo_s_referencia']
+    juntos['razao_rss'] = juntos['pico_rss_mb'] / juntos['pico_rss_mb_referencia']
+    juntos['regressao'] = (juntos['razao_tempo'] > 1 + tolerancia) | (juntos['razao_rss'] > 1 + tolerancia)
+    return juntos[['tamanho', 'etapa', 'tempo_s', 'tempo_s_referencia', 'razao_tempo', 'pico_rss_mb', 'pico_rss_mb_referencia', 'razao_rss', 'regressao']]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede tempo e memória de cada etapa do pipeline em bases sintéticas de vários tamanhos.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help='linhas de datatran de cada base')
+    parser.add_argument('--anos', type=gerar_dados_sinteticos.ler_anos, default=ANOS_BENCHMARK, help="anos das bases, ex.: '2015-2024'")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--repeticoes', type=int, default=1)
+    parser.add_argument('--processos', type=int, default=1, help='processos da análise de trechos')
+    parser.add_argument('--saida', default=os.path.join(DIR_BENCHMARK, 'resultados.csv'))
+    parser.add_argument('--comparar', help='CSV de resultados de referência')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_REGRESSAO)
+    # Uso interno: execução de uma etapa no subprocesso
+    parser.add_argument('--executar-etapa', help=argparse.SUPPRESS)
+    parser.add_argument('--dados', help=argparse.SUPPRESS)
+    parser.add_argument('--resultado', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executar_etapa:
+        analise_trechos.PROCESSOS = args.processos
+        executar_etapa(args.dados, args.executar_etapa, args.resultado)
+        sys.exit(0)
+
+    resumo = resumir(executar_benchmark(args.tamanhos, args.anos, args.semente, args.repeticoes, args.processos))
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    resumo.to_csv(args.saida, index=False)
+    print(f'\nResultados salvos em: {args.saida}')
+    expoentes = expoentes_escala(resumo)
+    if not expoentes.empty:
+        print('\n=== Expoente de escala do tempo por etapa ===')
+        print(expoentes.round(2).to_string())
+
+    if args.comparar:
+        comparacao = comparar(resumo, pd.read_csv(args.comparar), args.tolerancia)
+        print(f'\n=== Comparação com {args.comparar} (tolerância {args.tolerancia:.0%}) ===')
+        print(comparacao.round(2).to_string(index=False))
+        if comparacao['regressao'].any():
+            print('\nRegressões encontradas.')
+            sys.exit(1)
@@ -0,0 +1,49 @@
+import re
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# Codificação multi-rótulo de colunas com valores separados por ';'
+# ==============================================================================
+# Ex.: tracado_via = 'reta;aclive' -> tracado_tem_reta = 1, tracado_tem_aclive = 1.
+# A coluna é tokenizada uma única vez sobre seus valores distintos (poucas
+# combinações em muitas linhas); a matriz de indicadores de cada combinação é
+# então replicada para as linhas com um único take.
+
+
+def nome_coluna_padrao(cat):
+    return re.sub(r'[^a-z0-9]', '_', cat)
+
+
+def tokenizar_unicos(serie, sep=';'):
+    # Devolve (códigos por linha, categorias ordenadas, matriz uint8 combinação x categoria)
+    codigos, unicos = pd.factorize(serie.fillna('').astype(str))
+    itens = pd.Series(unicos, dtype=object).str.split(sep).explode().str.strip()
+    itens = itens[itens.notna() & (itens != '')]
+    codigos_cat, categorias = pd.factorize(itens, sort=True)
+    indicadores = np.zeros((len(unicos), len(categorias)), dtype=np.uint8)
+    indicadores[itens.index.to_numpy(), codigos_cat] = 1
+    return codigos, list(categorias), indicadores
+
+
+def codificar_multirrotulo(serie, prefixo, sep=';', esparso=False, nome_coluna=nome_coluna_padrao):
+    codigos, categorias, indicadores = tokenizar_unicos(serie, sep)
+
+    # Categorias que viram o mesmo nome de coluna: como no laço original, a última
+    # (em ordem) sobrescreve a coluna, que fica na posição em que o nome apareceu primeiro
+    fonte = {}
+    for j, cat in enumerate(categorias):
+        fonte[f"{prefixo}{nome_coluna(cat)}"] = j
+    nomes = list(fonte)
+    if len(nomes) < len(categorias):
+        indicadores = indicadores[:, list(fonte.values())]
+
+    # Linha extra de zeros para os valores nulos (código -1)
+    indicadores = np.vstack([indicadores, np.zeros((1, len(nomes)), dtype=np.uint8)])
+
+    if esparso:
+        from scipy import sparse
+        # Saída CSR: (matriz linhas x categorias, nomes das colunas)
+        return sparse.csr_matrix(indicadores)[codigos], nomes
+
+    return pd.DataFrame(indicadores[codigos], index=serie.index, columns=nomes)
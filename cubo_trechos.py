@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+from indices_rodovia import IndiceIntervalosBR
+import instrumentacao
+
+# ==============================================================================
+# Cubo (trecho x mês) de acidentes
+# ==============================================================================
+# Contagem de acidentes e somas de severidade, risco e vítimas por (id_trecho,
+# mês), montadas de uma vez com np.bincount sobre a chave trecho * n_meses + mês.
+# Cada medida é uma matriz densa (trechos x meses) com somas acumuladas ao longo
+# dos meses, então qualquer janela [mês a, mês b) de qualquer trecho custa duas
+# leituras: acumulado[:, b] - acumulado[:, a]. Daí saem o antes x depois das
+# instalações de radar, as somas por ano e as janelas móveis de 12 meses, sem
+# voltar às linhas de acidente. A resolução é o mês: uma data de corte no meio
+# do mês conta a partir do início daquele mês.
+#
+#   python cubo_trechos.py    # monta o cubo dos trechos de dataset_final_para_ml.csv
+
+ARQUIVO_CUBO = 'cubo_trecho_mes.parquet'
+# Medida -> coluna somada (None conta as linhas)
+MEDIDAS = {
+    'acidentes': None,
+    'indice_severidade': 'indice_severidade',
+    'risco_radar': 'risco_radar',
+    'mortos': 'mortos',
+    'feridos_graves': 'feridos_graves',
+    'feridos_leves': 'feridos_leves',
+}
+MESES_JANELA = 12
+
+
+def meses_desde_1970(datas):
+    return np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+
+def dias_desde_1970(datas):
+    return np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+
+class CuboTrechoMes:
+    def __init__(self, trechos, mes_inicial, medidas, primeiro_dia, ultimo_dia):
+        # trechos: Index de id_trecho; mes_inicial: meses desde 1970 da primeira coluna;
+        # medidas: {nome: matriz int32 trechos x meses}; primeiro/último dia com acidente de cada trecho
+        self.trechos = pd.Index(trechos)
+        self.mes_inicial = int(mes_inicial)
+        self.medidas = medidas
+        self.primeiro_dia = np.asarray(primeiro_dia, dtype=np.int64)
+        self.ultimo_dia = np.asarray(ultimo_dia, dtype=np.int64)
+        self.n_meses = next(iter(medidas.values())).shape[1]
+        self._acumulados = {}
+
+    def __len__(self):
+        return len(self.trechos)
+
+    @property
+    def meses(self):
+        return pd.DatetimeIndex((self.mes_inicial + np.arange(self.n_meses)).astype('datetime64[M]'))
+
+    @classmethod
+    def construir(cls, id_trecho, datas, valores):
+        # valores: {medida: array por acidente}; linhas sem trecho ou sem data ficam de fora
+        id_trecho = pd.Series(np.asarray(id_trecho, dtype=object))
+        datas = np.asarray(datas, dtype='datetime64[ns]')
+        validas = id_trecho.notna().to_numpy() & ~np.isnat(datas)
+        codigo, trechos = pd.factorize(id_trecho[validas], sort=True)
+        mes = meses_desde_1970(datas[validas])
+        dia = dias_desde_1970(datas[validas])
+        mes_inicial = mes.min() if len(mes) else 0
+        n_meses = int(mes.max() - mes_inicial + 1) if len(mes) else 1
+        chave = codigo.astype(np.int64) * n_meses + (mes - mes_inicial)
+        tamanho = len(trechos) * n_meses
+        medidas = {}
+        for nome, coluna in MEDIDAS.items():
+            pesos = None if coluna is None else np.nan_to_num(np.asarray(valores[coluna], dtype=float)[validas])
+            soma = np.bincount(chave, weights=pesos, minlength=tamanho)
+            medidas[nome] = np.rint(soma).astype(np.int32).reshape(len(trechos), n_meses)
+        primeiro_dia = np.full(len(trechos), np.iinfo(np.int64).max)
+        ultimo_dia = np.full(len(trechos), np.iinfo(np.int64).min)
+        np.minimum.at(primeiro_dia, codigo, dia)
+        np.maximum.at(ultimo_dia, codigo, dia)
+        return cls(trechos, mes_inicial, medidas, primeiro_dia, ultimo_dia)
+
+    # --------------------------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------------------------
+    def acumulado(self, medida):
+        # (trechos x n_meses + 1): coluna j = soma dos meses anteriores a j
+        if medida not in self._acumulados:
+            acumulado = np.zeros((len(self.trechos), self.n_meses + 1), dtype=np.int64)
+            np.cumsum(self.medidas[medida], axis=1, out=acumulado[:, 1:])
+            self._acumulados[medida] = acumulado
+        return self._acumulados[medida]
+
+    def coluna_mes(self, datas):
+        # Posição do mês de cada data nas colunas do cubo, limitada a [0, n_meses]
+        return np.clip(meses_desde_1970(datas) - self.mes_inicial, 0, self.n_meses)
+
+    def codigos(self, trechos=None):
+        if trechos is None:
+            return np.arange(len(self.trechos))
+        codigos = self.trechos.get_indexer(np.asarray(trechos, dtype=object))
+        if (codigos < 0).any():
+            raise KeyError(f'trechos fora do cubo: {list(np.asarray(trechos, dtype=object)[codigos < 0][:5])}')
+        return codigos
+
+    def somar(self, medida='acidentes', inicio=None, fim=None, trechos=None):
+        # Soma da medida nos meses [inicio, fim) de cada trecho; inicio/fim são datas
+        # (uma só ou uma por trecho) e None é o começo/fim do cubo
+        codigos = self.codigos(trechos)
+        a = 0 if inicio is None else self.coluna_mes(np.broadcast_to(np.asarray(inicio, dtype='datetime64[ns]'), codigos.shape))
+        b = self.n_meses if fim is None else self.coluna_mes(np.broadcast_to(np.asarray(fim, dtype='datetime64[ns]'), codigos.shape))
+        acumulado = self.acumulado(medida)
+        return acumulado[codigos, b] - acumulado[codigos, np.minimum(a, b)]
+
+    def antes_depois(self, trechos, datas_corte, medida='acidentes'):
+        # (soma antes do mês de corte, soma a partir dele) para cada par (trecho, data)
+        antes = self.somar(medida, fim=datas_corte, trechos=trechos)
+        total = self.somar(medida, trechos=trechos)
+        return antes, total - antes
+
+    def janela_movel(self, medida='acidentes', meses=MESES_JANELA):
+        # (trechos x meses do cubo): soma dos `meses` meses terminados em cada mês, inclusive
+        acumulado = self.acumulado(medida)
+        fim = np.arange(1, self.n_meses + 1)
+        return acumulado[:, fim] - acumulado[:, np.maximum(fim - meses, 0)]
+
+    def por_ano(self, medida='acidentes'):
+        # DataFrame trechos x anos com a soma da medida em cada ano civil
+        anos = np.unique(self.meses.year)
+        limites = self.coluna_mes(np.array([f'{ano}-01-01' for ano in anos] + [f'{anos[-1] + 1}-01-01'], dtype='datetime64[ns]'))
+        acumulado = self.acumulado(medida)
+        return pd.DataFrame(np.diff(acumulado[:, limites], axis=1), index=self.trechos.rename('id_trecho'), columns=anos)
+
+    def features_janela(self, meses=MESES_JANELA, referencia=None):
+        # Features por trecho nas janelas de `meses` meses até o mês de referência (inclusive;
+        # None usa o último mês do cubo) e na janela imediatamente anterior
+        fim = self.n_meses if referencia is None else int(self.coluna_mes(np.array([referencia], dtype='datetime64[ns]'))[0]) + 1
+        fim = min(fim, self.n_meses)
+        inicio, anterior = max(fim - meses, 0), max(fim - 2 * meses, 0)
+
+        def janela(medida, a, b):
+            acumulado = self.acumulado(medida)
+            return acumulado[:, b] - acumulado[:, a]
+
+        return pd.DataFrame({
+            'id_trecho': self.trechos.to_numpy(),
+            f'acidentes_ultimos_{meses}m': janela('acidentes', inicio, fim),
+            f'acidentes_{meses}m_anteriores': janela('acidentes', anterior, inicio),
+            f'severidade_ultimos_{meses}m': janela('indice_severidade', inicio, fim),
+            f'risco_ultimos_{meses}m': janela('risco_radar', inicio, fim),
+            f'max_acidentes_{meses}m': self.janela_movel('acidentes', meses)[:, :fim].max(axis=1, initial=0),
+        })
+
+    # --------------------------------------------------------------------------
+    # Persistência: só as células não vazias, em formato longo
+    # --------------------------------------------------------------------------
+    def salvar(self, caminho=ARQUIVO_CUBO):
+        matriz = np.stack([self.medidas[m] for m in MEDIDAS], axis=2)
+        linhas, colunas = np.nonzero(matriz.any(axis=2))
+        df = pd.DataFrame({
+            'id_trecho': pd.Categorical.from_codes(linhas, self.trechos),
+            'mes': (self.mes_inicial + colunas).astype('datetime64[M]').astype('datetime64[ns]'),
+            **{m: matriz[linhas, colunas, i] for i, m in enumerate(MEDIDAS)},
+            # Repetidos em cada célula do trecho; a codificação por repetição do Parquet os compacta
+            'primeiro_dia': self.primeiro_dia[linhas].astype('datetime64[D]').astype('datetime64[ns]'),
+            'ultimo_dia': self.ultimo_dia[linhas].astype('datetime64[D]').astype('datetime64[ns]'),
+        })
+        df.to_parquet(caminho, index=False)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_CUBO):
+        df = pd.read_parquet(caminho)
+        codigo, trechos = pd.factorize(df['id_trecho'].astype(str), sort=True)
+        mes = meses_desde_1970(df['mes'])
+        mes_inicial = mes.min()
+        n_meses = int(mes.max() - mes_inicial + 1)
+        medidas = {}
+        for m in MEDIDAS:
+            matriz = np.zeros((len(trechos), n_meses), dtype=np.int32)
+            matriz[codigo, mes - mes_inicial] = df[m].to_numpy()
+            medidas[m] = matriz
+        primeiro_dia = np.zeros(len(trechos), dtype=np.int64)
+        ultimo_dia = np.zeros(len(trechos), dtype=np.int64)
+        primeiro_dia[codigo] = dias_desde_1970(df['primeiro_dia'])
+        ultimo_dia[codigo] = dias_desde_1970(df['ultimo_dia'])
+        return cls(trechos, mes_inicial, medidas, primeiro_dia, ultimo_dia)
+
+
+@instrumentacao.medir()
+def construir_cubo(df_proc):
+    # Acidentes já preparados (indice_severidade, risco_radar) e segmentados (id_trecho)
+    return CuboTrechoMes.construir(df_proc['id_trecho'], df_proc['data_inversa'], df_proc)
+
+
+def cubo_do_dataset(df_proc, df_trechos):
+    # Cubo dos trechos de um dataset final: cada acidente vai para o trecho da sua BR
+    # que contém o km (os limites dos trechos são o menor e o maior km dos seus acidentes)
+    br = df_proc['br'].astype(str).str.replace('BR-', '', regex=False).str.strip().to_numpy()
+    indice = IndiceIntervalosBR(df_trechos['br'].astype(str), df_trechos['trecho_km_inicial'], df_trechos['trecho_km_final'], df_trechos['id_trecho'])
+    id_trecho, _ = indice.localizar(br, df_proc['km'].to_numpy(dtype=float))
+    return CuboTrechoMes.construir(id_trecho, df_proc['data_inversa'], df_proc)
+
+
+if __name__ == '__main__':
+    import analise_trechos
+
+    with instrumentacao.medir_etapa('leitura') as medicao:
+        df_acidentes = analise_trechos.carregar_acidentes()
+        df_trechos = pd.read_csv(analise_trechos.ARQUIVO_SAIDA, dtype={'br': str, 'id_trecho': str}, encoding='utf-8')
+        medicao.linhas_saida = len(df_acidentes)
+    df_proc = analise_trechos.preparar_acidentes(df_acidentes)
+    with instrumentacao.medir_etapa('cubo_trechos.cubo_do_dataset', len(df_proc)):
+        cubo = cubo_do_dataset(df_proc, df_trechos)
+    with instrumentacao.medir_etapa('gravacao', len(cubo)):
+        cubo.salvar(ARQUIVO_CUBO)
+    meses = cubo.meses
+    print(f'Cubo com {len(cubo)} trechos x {cubo.n_meses} meses ({meses[0]:%Y-%m} a {meses[-1]:%Y-%m}) '
+          f'e {cubo.medidas["acidentes"].sum()} acidentes salvo em: {ARQUIVO_CUBO}')
+    print('\n--- Acidentes por ano ---')
+    print(cubo.por_ano().sum().to_string())
+    instrumentacao.salvar_relatorio('cubo_trechos')
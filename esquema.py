@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import leitura
+
+# ==============================================================================
+# Registro central de esquema dos arquivos datatran e de radares
+# ==============================================================================
+# Cada coluna conhecida tem um tipo compacto:
+#   'categoria'                  categórica; as categorias são os valores válidos
+#                                da coluna (valores_validos) mais os observados, em ordem
+#   'int8' / 'int16'             contagens; com nulos vira o inteiro anulável (Int8/Int16)
+#                                e valores fora da faixa pedem o inteiro seguinte
+#   'float32' / 'float64'        números com vírgula ou ponto decimal
+#   'data'                       datas nos FORMATOS_DATA, tentados em ordem
+# Colunas fora do esquema ficam como estão.
+#
+# As etapas de texto (consolidação, separação por UF, valores faltantes e
+# padronização) trabalham sobre os valores brutos e leem em modo texto
+# (ler_texto / ler_datatran); a partir do pré-processamento para ML as bases
+# são lidas ou convertidas com os tipos do esquema (ler_tipado / aplicar_esquema).
+# Encoding e delimitador de todos os arquivos são detectados pelo leitor
+# compartilhado (leitura.py).
+
+# 2017 em diante usa AAAA-MM-DD; os anos anteriores, DD/MM/AAAA
+FORMATOS_DATA = ['%Y-%m-%d', '%d/%m/%Y']
+
+# Dicionários de valores válidos para padronização
+valores_validos = {
+    'classificacao_acidente': [
+        'Com Vítimas Feridas', 'Com Vítimas Fatais', 'Sem Vítimas',
+        'Com Vítimas', 'Sem Vítima', 'Com Vítima', 'Com Vítimas Leves', 'Com Vítimas Graves'
+    ],
+    'causa_acidente': [
+        'Falta de atenção', 'Velocidade incompatível', 'Animais na Pista', 'Desobediência à sinalização',
+        'Defeito mecânico no veículo', 'Dormiu ao volante', 'Agressão Externa', 'Mal súbito',
+        'Defeito na via', 'Ingestão de álcool', 'Ingestão de substância psicoativa', 'Outras'
+    ],
+    'condicao_metereologica': [
+        'Ceu Claro', 'Chuva', 'Nublado', 'Nevoeiro/neblina/fumaça', 'Granizo', 'Vento forte', 'Neve', 'Outros'
+    ],
+    'tipo_acidente': [
+        'Colisão frontal', 'Colisão traseira', 'Colisão lateral', 'Colisão transversal', 'Atropelamento de animal',
+        'Atropelamento de pessoa', 'Capotamento', 'Tombamento', 'Queda de ocupante de veículo', 'Saída de pista',
+        'Incêndio', 'Danos eventuais', 'Engavetamento', 'Outros', 'Colisão'
+    ],
+    'tipo_pista': ['Dupla', 'Simples', 'Múltipla', 'Outros'],
+    'tracado_via': ['Reta', 'Curva', 'Desvio temporário', 'Outros'],
+    'sentido_via': ['Crescente', 'Decrescente', 'Duplo', 'Outros'],
+    'fase_dia': ['Pleno dia', 'Plena noite', 'Amanhecer', 'Anoitecer', 'Outros'],
+    'dia_semana': ['Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado'],
+    'uf': ['MG'],
+}
+
+ESQUEMA_DATATRAN = {
+    'data_inversa': 'data',
+    'dia_semana': 'categoria',
+    'horario': 'categoria',
+    'uf': 'categoria',
+    'br': 'categoria',
+    # km continua float64: a segmentação compara diferenças de km com o limiar de gap
+    'km': 'float64',
+    'municipio': 'categoria',
+    'causa_acidente': 'categoria',
+    'tipo_acidente': 'categoria',
+    'classificacao_acidente': 'categoria',
+    'fase_dia': 'categoria',
+    'sentido_via': 'categoria',
+    'condicao_metereologica': 'categoria',
+    'tipo_pista': 'categoria',
+    'tracado_via': 'categoria',
+    'uso_solo': 'categoria',
+    'pessoas': 'int16',
+    'mortos': 'int16',
+    'feridos_leves': 'int16',
+    'feridos_graves': 'int16',
+    'ilesos': 'int16',
+    'ignorados': 'int16',
+    'feridos': 'int16',
+    'veiculos': 'int8',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'regional': 'categoria',
+    'delegacia': 'categoria',
+    'uop': 'categoria',
+    'ano': 'int16',
+    'ANO_DADOS': 'int16',
+}
+
+ESQUEMA_RADARES = {
+    'concessionaria': 'categoria',
+    'ano_do_pnv_snv': 'int16',
+    'tipo_de_radar': 'categoria',
+    'rodovia': 'categoria',
+    'uf': 'categoria',
+    'km_m': 'float64',
+    'municipio': 'categoria',
+    'tipo_pista': 'categoria',
+    'sentido': 'categoria',
+    'situacao': 'categoria',
+    'data_da_inativacao': 'data',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'velocidade_leve': 'int16',
+    'velocidade_pesado': 'int16',
+}
+
+INTEIRO_SEGUINTE = {'int8': 'int16', 'int16': 'int32', 'int32': 'int64'}
+
+# Colunas indicadoras (0/1) geradas no pré-processamento para ML: uma por valor
+# das colunas de COLUNAS_ONE_HOT (prefixo '<coluna>_') e uma por característica
+# de tracado_via (PREFIXO_MULTIRROTULO). Colunas de contagem do esquema nunca
+# são indicadoras, mesmo quando uma base só tem valores 0 e 1.
+COLUNAS_ONE_HOT = [
+    'classificacao_acidente', 'causa_acidente', 'condicao_metereologica',
+    'tipo_acidente', 'tipo_pista', 'sentido_via', 'fase_dia',
+]
+PREFIXO_MULTIRROTULO = 'tracado_tem_'
+
+
+def colunas_indicadoras(colunas):
+    prefixos = tuple(f'{col}_' for col in COLUNAS_ONE_HOT) + (PREFIXO_MULTIRROTULO,)
+    return [col for col in colunas if str(col).startswith(prefixos)]
+
+
+# ==============================================================================
+# Conversões
+# ==============================================================================
+def converter_numero(serie, tipo):
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = pd.to_numeric(serie.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    if tipo.startswith('float'):
+        return serie.astype(tipo)
+    valores = serie.dropna()
+    if (valores % 1 != 0).any():
+        return serie.astype('float32')
+    while len(valores) and (valores.min() < np.iinfo(tipo).min or valores.max() > np.iinfo(tipo).max):
+        tipo = INTEIRO_SEGUINTE[tipo]
+    return serie.astype(tipo.capitalize() if len(valores) < len(serie) else tipo)
+
+
+def converter_data(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    # Cada formato é tentado sobre os valores distintos ainda sem data; o resto vira NaT
+    codigos, unicos = pd.factorize(serie)
+    texto = pd.Series(unicos, dtype=object).astype(str).str.strip()
+    datas = pd.to_datetime(texto, format=FORMATOS_DATA[0], errors='coerce')
+    for formato in FORMATOS_DATA[1:]:
+        datas = datas.fillna(pd.to_datetime(texto, format=formato, errors='coerce'))
+    valores = np.append(datas.to_numpy(), np.array(['NaT'], dtype=datas.dtype))
+    return pd.Series(valores[codigos], index=serie.index, name=serie.name)
+
+
+def converter_categoria(serie, validos=()):
+    # Categorias em ordem alfabética: as mesmas colunas e a mesma ordem do one-hot sobre texto
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        presentes = serie.cat.categories
+    else:
+        if not pd.api.types.is_string_dtype(serie):
+            serie = serie.astype(str).where(serie.notna())
+        presentes = serie.dropna().unique()
+    categorias = sorted(set(presentes) | set(validos))
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.set_categories(categorias)
+    return serie.astype(pd.CategoricalDtype(categorias))
+
+
+def converter(serie, tipo, nome):
+    if tipo == 'categoria':
+        return converter_categoria(serie, valores_validos.get(nome, ()))
+    if tipo == 'data':
+        return converter_data(serie)
+    return converter_numero(serie, tipo)
+
+
+def aplicar_esquema(df, esquema=ESQUEMA_DATATRAN, colunas=None):
+    # Converte as colunas do esquema (ou só as de `colunas`) para o tipo compacto
+    df = df.copy()
+    for col in df.columns:
+        nome = str(col).strip()
+        if nome in esquema and (colunas is None or nome in colunas):
+            df[col] = converter(df[col], esquema[nome], nome)
+    return df
+
+
+# ==============================================================================
+# Leitura
+# ==============================================================================
+def ler_texto(caminho, sep=None, encoding=None, **kwargs):
+    # Modo texto: todas as colunas como str, para as etapas que tratam os valores brutos
+    return leitura.ler_csv(caminho, sep=sep, encoding=encoding, **kwargs)
+
+
+def ler_datatran(caminho, **kwargs):
+    # Arquivo anual datatran{ano}.csv, em modo texto
+    return ler_texto(caminho, **kwargs)
+
+
+def ler_tipado(caminho, esquema=ESQUEMA_DATATRAN, sep=None, encoding=None, decimal=',', **kwargs):
+    # Categóricas já chegam como dicionário (category) e os números com vírgula
+    # decimal são lidos pelo próprio parser; valores fora do padrão (colunas que
+    # ficam texto) passam pela conversão com coerção de aplicar_esquema
+    sep, encoding = leitura.detectar_formato(caminho, sep, encoding)
+    tipos = {}
+    for c in leitura.ler_colunas(caminho, sep, encoding):
+        if esquema.get(c.strip()) == 'categoria':
+            tipos[c] = pa.dictionary(pa.int32(), pa.string())
+        elif esquema.get(c.strip()) == 'data':
+            tipos[c] = pa.string()
+    df = leitura.ler_csv(caminho, sep, encoding, tipos=tipos, decimal=decimal, **kwargs)
+    return aplicar_esquema(df, esquema)
+
+
+def ler_radares(caminho):
+    return ler_tipado(caminho, ESQUEMA_RADARES)
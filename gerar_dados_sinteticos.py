@@ -0,0 +1,426 @@
+import os
+import zlib
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ==============================================================================
+# Gerador de dados sintéticos no formato datatran (PRF) e do inventário de radares
+# ==============================================================================
+# Gera datatran{ano}/datatran{ano}.csv com o esquema de cada época (até 2016 datas
+# dd/mm/aaaa e sem coordenadas; a partir de 2017 datas aaaa-mm-dd, latitude,
+# longitude, regional, delegacia e uop), decimais com vírgula, tracado_via com
+# vários rótulos separados por ';', valores sujos ('Ignorado', 'NA', '(null)',
+# vazios) e municípios com erros de digitação. Os acidentes se concentram em
+# pontos quentes de cada BR, e o inventário de radares usa a mesma geometria
+# km -> coordenada das rodovias, de modo que as junções por km e por
+# latitude/longitude encontrem radares.
+#
+#   python gerar_dados_sinteticos.py --linhas 1000000 --saida bench/n1000000
+#   python gerar_dados_sinteticos.py --linhas 50000000 --anos 2007-2024 --saida /dados/sinteticos
+
+# Linhas geradas e gravadas por vez; a memória fica limitada ao tamanho do bloco
+TAMANHO_BLOCO = 500_000
+ANOS_PADRAO = list(range(2015, 2025))
+# A partir deste ano o datatran traz coordenadas e datas no formato ISO
+ANO_ESQUEMA_NOVO = 2017
+# Fração de células com marcador de ausência em cada coluna de texto
+TAXA_FALTANTES = 0.003
+# Fração de municípios com erro de digitação
+TAXA_ERROS_MUNICIPIO = 0.01
+VARIANTES_ERRO = 3
+# Acidentes em pontos quentes (o resto se espalha ao longo da BR)
+FRACAO_PONTOS_QUENTES = 0.6
+PONTOS_QUENTES_POR_BR = 40
+
+COLUNAS_ESQUEMA_ANTIGO = [
+    'id', 'data_inversa', 'dia_semana', 'horario', 'uf', 'br', 'km', 'municipio', 'causa_acidente',
+    'tipo_acidente', 'classificacao_acidente', 'fase_dia', 'sentido_via', 'condicao_metereologica',
+    'tipo_pista', 'tracado_via', 'uso_solo', 'pessoas', 'mortos', 'feridos_leves', 'feridos_graves',
+    'ilesos', 'ignorados', 'feridos', 'veiculos', 'ano',
+]
+COLUNAS_ESQUEMA_NOVO = COLUNAS_ESQUEMA_ANTIGO[:-1] + ['latitude', 'longitude', 'regional', 'delegacia', 'uop']
+
+# Distribuições aproximadas das categorias (valores como publicados pela PRF)
+DISTRIBUICOES = {
+    'causa_acidente': {
+        'Falta de Atenção à Condução': 0.33, 'Velocidade Incompatível': 0.10, 'Desobediência às normas de trânsito pelo condutor': 0.08,
+        'Não guardar distância de segurança': 0.07, 'Ingestão de Álcool': 0.06, 'Defeito Mecânico no Veículo': 0.05,
+        'Animais na Pista': 0.04, 'Condutor Dormindo': 0.04, 'Pista Escorregadia': 0.03, 'Ultrapassagem Indevida': 0.03,
+        'Defeito na Via': 0.03, 'Mal Súbito': 0.02, 'Avarias e/ou desgaste excessivo no pneu': 0.02,
+        'Falta de Atenção do Pedestre': 0.02, 'Ingestão de Substâncias Psicoativas': 0.01, 'Agressão Externa': 0.01,
+        'Restrição de Visibilidade': 0.01, 'Sinalização da via insuficiente ou inadequada': 0.01,
+        'Objeto estático sobre o leito carroçável': 0.01, 'Fenômenos da Natureza': 0.005, 'Outras': 0.035,
+    },
+    'tipo_acidente': {
+        'Colisão traseira': 0.20, 'Saída de leito carroçável': 0.13, 'Colisão transversal': 0.11, 'Colisão lateral': 0.10,
+        'Colisão frontal': 0.06, 'Tombamento': 0.06, 'Colisão com objeto estático': 0.05, 'Queda de ocupante de veículo': 0.05,
+        'Capotamento': 0.04, 'Atropelamento de Pedestre': 0.04, 'Atropelamento de Animal': 0.03, 'Engavetamento': 0.02,
+        'Colisão com objeto em movimento': 0.02, 'Incêndio': 0.01, 'Derramamento de carga': 0.01, 'Danos eventuais': 0.01,
+        'Ignorado': 0.06,
+    },
+    'classificacao_acidente': {'Com Vítimas Feridas': 0.62, 'Sem Vítimas': 0.27, 'Com Vítimas Fatais': 0.07, 'Ignorado': 0.04},
+    'fase_dia': {'Pleno dia': 0.55, 'Plena Noite': 0.33, 'Anoitecer': 0.06, 'Amanhecer': 0.05, 'Ignorado': 0.01},
+    'sentido_via': {'Crescente': 0.49, 'Decrescente': 0.48, 'Não Informado': 0.03},
+    'condicao_metereologica': {
+        'Céu Claro': 0.58, 'Nublado': 0.15, 'Chuva': 0.10, 'Sol': 0.07, 'Garoa/Chuvisco': 0.03, 'Nevoeiro/Neblina': 0.01,
+        'Vento': 0.005, 'Granizo': 0.001, 'Neve': 0.001, 'Ignorado': 0.053,
+    },
+    'tipo_pista': {'Simples': 0.50, 'Dupla': 0.40, 'Múltipla': 0.10},
+}
+# Rótulos de tracado_via; cada acidente tem um, às vezes dois ou três
+TRACADOS = {
+    'Reta': 0.55, 'Curva': 0.15, 'Interseção de vias': 0.06, 'Declive': 0.06, 'Aclive': 0.04, 'Retorno Regulamentado': 0.02,
+    'Rotatória': 0.02, 'Ponte': 0.02, 'Viaduto': 0.015, 'Desvio Temporário': 0.01, 'Túnel': 0.002, 'Em Obras': 0.013,
+    'Não Informado': 0.04,
+}
+PROB_SEGUNDO_TRACADO = 0.2
+PROB_TERCEIRO_TRACADO = 0.04
+MARCADORES_FALTANTES = ['NA', '', '(null)', 'null']
+COLUNAS_COM_FALTANTES = ['horario', 'municipio', 'causa_acidente', 'tipo_acidente', 'fase_dia', 'condicao_metereologica', 'tipo_pista', 'tracado_via']
+DIAS_SEMANA = ['segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira', 'sábado', 'domingo']
+
+# UF: (peso, latitude e longitude aproximadas do centro, BRs, municípios)
+UFS = {
+    'MG': (0.14, -18.5, -44.5, [381, 116, 40, 262, 50, 365, 251, 135, 153, 267, 354, 146, 265, 120, 356, 460, 494, 452, 497, 364], [
+        'BELO HORIZONTE', 'BETIM', 'CONTAGEM', 'JUIZ DE FORA', 'UBERLANDIA', 'UBERABA', 'MONTES CLAROS', 'GOVERNADOR VALADARES',
+        'IPATINGA', 'SETE LAGOAS', 'DIVINOPOLIS', 'POUSO ALEGRE', 'TEOFILO OTONI', 'BARBACENA', 'CONSELHEIRO LAFAIETE',
+        'VARGINHA', 'ARAXA', 'PATOS DE MINAS', 'LAVRAS', 'ITABIRA', 'CARATINGA', 'PARA DE MINAS', 'JOAO MONLEVADE',
+        'ITAUNA', 'NOVA LIMA', 'SABARA', 'BRUMADINHO', 'IGARAPE', 'OLIVEIRA', 'SAO JOAQUIM DE BICAS', 'TRES CORACOES',
+        'CAMBUI', 'EXTREMA', 'LEOPOLDINA', 'MURIAE', 'UBA', 'FRUTAL', 'PARACATU', 'JANAUBA', 'CURVELO',
+    ]),
+    'PR': (0.12, -24.6, -51.5, [277, 376, 116, 369, 153, 373, 467, 476], ['CURITIBA', 'LONDRINA', 'MARINGA', 'PONTA GROSSA', 'CASCAVEL', 'FOZ DO IGUACU', 'GUARAPUAVA', 'SAO JOSE DOS PINHAIS']),
+    'SC': (0.11, -27.3, -50.5, [101, 470, 282, 116, 153, 280], ['FLORIANOPOLIS', 'JOINVILLE', 'BLUMENAU', 'ITAJAI', 'SAO JOSE', 'PALHOCA', 'LAGES', 'CHAPECO']),
+    'RJ': (0.07, -22.3, -42.8, [116, 101, 40, 393, 465, 493], ['RIO DE JANEIRO', 'DUQUE DE CAXIAS', 'NOVA IGUACU', 'PETROPOLIS', 'RESENDE', 'ITABORAI', 'CAMPOS DOS GOYTACAZES']),
+    'RS': (0.07, -29.8, -53.0, [116, 290, 386, 101, 285, 392, 158], ['PORTO ALEGRE', 'CAXIAS DO SUL', 'PELOTAS', 'CANOAS', 'SANTA MARIA', 'PASSO FUNDO', 'OSORIO']),
+    'SP': (0.06, -22.0, -48.5, [116, 381, 153, 374, 101, 459], ['SAO PAULO', 'GUARULHOS', 'REGISTRO', 'TAUBATE', 'SAO JOSE DOS CAMPOS', 'ATIBAIA']),
+    'GO': (0.05, -16.0, -49.5, [153, 60, 20, 40, 364, 70], ['GOIANIA', 'ANAPOLIS', 'APARECIDA DE GOIANIA', 'RIO VERDE', 'LUZIANIA', 'JATAI']),
+    'BA': (0.05, -12.5, -41.5, [116, 101, 324, 242, 407, 110], ['SALVADOR', 'FEIRA DE SANTANA', 'VITORIA DA CONQUISTA', 'JEQUIE', 'ITABUNA', 'EUNAPOLIS']),
+    'ES': (0.04, -19.6, -40.6, [101, 262, 259, 482], ['SERRA', 'VIANA', 'CARIACICA', 'LINHARES', 'GUARAPARI', 'CACHOEIRO DE ITAPEMIRIM']),
+    'PE': (0.04, -8.3, -37.5, [101, 232, 408, 104, 423], ['RECIFE', 'JABOATAO DOS GUARARAPES', 'CARUARU', 'PETROLINA', 'GARANHUNS']),
+    'MT': (0.03, -13.0, -56.0, [163, 364, 70, 158], ['CUIABA', 'VARZEA GRANDE', 'RONDONOPOLIS', 'SINOP']),
+    'MS': (0.03, -20.5, -54.8, [163, 262, 60, 267], ['CAMPO GRANDE', 'DOURADOS', 'TRES LAGOAS', 'CORUMBA']),
+    'DF': (0.025, -15.8, -47.9, [20, 40, 60, 70, 80], ['BRASILIA']),
+    'CE': (0.025, -5.2, -39.5, [116, 222, 20, 304], ['FORTALEZA', 'CAUCAIA', 'JUAZEIRO DO NORTE', 'SOBRAL']),
+    'PB': (0.02, -7.1, -36.6, [230, 101, 104], ['JOAO PESSOA', 'CAMPINA GRANDE', 'PATOS']),
+    'RN': (0.02, -5.8, -36.5, [101, 304, 226], ['NATAL', 'MOSSORO', 'PARNAMIRIM']),
+    'RO': (0.02, -10.9, -63.0, [364, 319, 425], ['PORTO VELHO', 'JI-PARANA', 'ARIQUEMES']),
+    'PI': (0.015, -7.5, -42.5, [316, 343, 135, 230], ['TERESINA', 'PARNAIBA', 'PICOS']),
+    'MA': (0.015, -5.0, -45.3, [135, 10, 316, 222], ['SAO LUIS', 'IMPERATRIZ', 'CAXIAS']),
+    'PA': (0.015, -4.0, -52.0, [316, 10, 230, 155], ['BELEM', 'ANANINDEUA', 'MARABA']),
+    'TO': (0.01, -10.2, -48.3, [153, 10, 226], ['PALMAS', 'ARAGUAINA', 'GURUPI']),
+    'AL': (0.01, -9.6, -36.6, [101, 104, 316], ['MACEIO', 'ARAPIRACA']),
+    'SE': (0.01, -10.6, -37.4, [101, 235], ['ARACAJU', 'NOSSA SENHORA DO SOCORRO']),
+    'AC': (0.005, -9.5, -69.5, [364, 317], ['RIO BRANCO', 'CRUZEIRO DO SUL']),
+    'RR': (0.003, 2.5, -61.0, [174, 401], ['BOA VISTA']),
+    'AP': (0.002, 1.0, -51.5, [156, 210], ['MACAPA']),
+    'AM': (0.005, -3.5, -61.0, [174, 319], ['MANAUS']),
+}
+
+CONCESSIONARIAS = ['AUTOPISTA FERNÃO DIAS', 'VIA 040', 'CONCER', 'ECO101', 'AUTOPISTA LITORAL SUL', 'VIABAHIA', 'DNIT']
+
+
+def sortear(rng, distribuicao, n):
+    # n valores de um dicionário {valor: peso}
+    valores = np.array(list(distribuicao.keys()), dtype=object)
+    pesos = np.array(list(distribuicao.values()), dtype=float)
+    return valores[rng.choice(len(valores), size=n, p=pesos / pesos.sum())]
+
+
+def pt_br(valores, casas):
+    # Números com vírgula decimal, como no datatran
+    texto = pc.cast(pa.array(np.round(np.asarray(valores, dtype=float), casas)), pa.string())
+    return pc.replace_substring(texto, '.', ',').to_numpy(zero_copy_only=False).astype(object)
+
+
+# ------------------------------------------------------------------------------
+# Geometria das rodovias: cada (uf, br) é uma reta com extensão e pontos quentes fixos
+# ------------------------------------------------------------------------------
+class Rodovias:
+    def __init__(self, semente):
+        self.ufs = list(UFS)
+        pesos = np.array([UFS[uf][0] for uf in self.ufs])
+        self.pesos_uf = pesos / pesos.sum()
+        # Rodovias numeradas na ordem de UFS; codigos_uf[uf] são os códigos das BRs da UF
+        self.chaves = [(uf, br) for uf, (_, _, _, brs, _) in UFS.items() for br in brs]
+        self.codigos_uf = {}
+        self.trechos = {}
+        for uf, (_, lat_centro, lon_centro, brs, _) in UFS.items():
+            self.codigos_uf[uf] = np.arange(len(self.trechos), len(self.trechos) + len(brs))
+            for br in brs:
+                rng = np.random.default_rng([semente, zlib.crc32(f'{uf}-{br}'.encode())])
+                extensao = rng.uniform(150, 800)
+                self.trechos[(uf, br)] = {
+                    'lat0': lat_centro + rng.uniform(-2, 2), 'lon0': lon_centro + rng.uniform(-2, 2),
+                    'rumo': rng.uniform(0, 2 * np.pi), 'extensao': extensao,
+                    'pontos_quentes': rng.uniform(0, extensao, PONTOS_QUENTES_POR_BR),
+                }
+
+    def sortear_km(self, rng, uf, br, n):
+        trecho = self.trechos[(uf, br)]
+        quente = rng.random(n) < FRACAO_PONTOS_QUENTES
+        centros = trecho['pontos_quentes'][rng.integers(0, PONTOS_QUENTES_POR_BR, n)]
+        km = np.where(quente, centros + rng.normal(0, 1.5, n), rng.uniform(0, trecho['extensao'], n))
+        return np.clip(km, 0, trecho['extensao'])
+
+    def coordenadas(self, uf, br, km):
+        trecho = self.trechos[(uf, br)]
+        lat = trecho['lat0'] + km / 111.0 * np.cos(trecho['rumo'])
+        lon = trecho['lon0'] + km / (111.0 * np.cos(np.radians(trecho['lat0']))) * np.sin(trecho['rumo'])
+        return lat, lon
+
+
+def sortear_rodovias(rng, rodovias, n):
+    # Código da rodovia de cada linha: UF pelo peso; as primeiras BRs de cada UF são as mais movimentadas
+    codigo_uf = rng.choice(len(rodovias.ufs), size=n, p=rodovias.pesos_uf)
+    rodovia = np.zeros(n, dtype=np.int64)
+    for i, uf in enumerate(rodovias.ufs):
+        linhas = np.flatnonzero(codigo_uf == i)
+        codigos = rodovias.codigos_uf[uf]
+        pesos = 1.0 / np.arange(1, len(codigos) + 1)
+        rodovia[linhas] = codigos[rng.choice(len(codigos), size=len(linhas), p=pesos / pesos.sum())]
+    uf = np.array([uf for uf, _ in rodovias.chaves], dtype=object)[rodovia]
+    br = np.array([br for _, br in rodovias.chaves])[rodovia]
+    return rodovia, uf, br
+
+
+def linhas_por_rodovia(rodovias, rodovia):
+    ordem = np.argsort(rodovia, kind='stable')
+    limites = np.searchsorted(rodovia[ordem], np.arange(len(rodovias.chaves) + 1))
+    for codigo, chave in enumerate(rodovias.chaves):
+        if limites[codigo + 1] > limites[codigo]:
+            yield chave, ordem[limites[codigo]:limites[codigo + 1]]
+
+
+def sortear_kms(rng, rodovias, rodovia):
+    # km com uma casa, como no datatran
+    km = np.zeros(len(rodovia))
+    for (uf, br), linhas in linhas_por_rodovia(rodovias, rodovia):
+        km[linhas] = rodovias.sortear_km(rng, uf, br, len(linhas))
+    return np.round(km, 1)
+
+
+def coordenadas_das_linhas(rodovias, rodovia, km):
+    lat = np.full(len(rodovia), np.nan)
+    lon = np.full(len(rodovia), np.nan)
+    for (uf, br), linhas in linhas_por_rodovia(rodovias, rodovia):
+        lat[linhas], lon[linhas] = rodovias.coordenadas(uf, br, km[linhas])
+    return lat, lon
+
+
+def errar_digitacao(rng, nome):
+    # Remove ou troca um caractere, como nos municípios digitados à mão
+    pos = rng.integers(1, len(nome))
+    if rng.random() < 0.5:
+        return nome[:pos] + nome[pos + 1:]
+    return nome[:pos] + chr(ord('A') + rng.integers(0, 26)) + nome[pos + 1:]
+
+
+def sortear_municipios(rng, uf):
+    municipio = np.empty(len(uf), dtype=object)
+    for chave in np.unique(uf):
+        linhas = np.flatnonzero(uf == chave)
+        nomes = np.array(UFS[chave][4], dtype=object)
+        # Distribuição concentrada nos primeiros municípios da lista
+        pesos = 1.0 / np.arange(1, len(nomes) + 1) ** 0.8
+        municipio[linhas] = nomes[rng.choice(len(nomes), size=len(linhas), p=pesos / pesos.sum())]
+    # Cada município errado recebe uma de VARIANTES_ERRO grafias erradas
+    erro = np.flatnonzero(rng.random(len(uf)) < TAXA_ERROS_MUNICIPIO)
+    nomes_errados, codigos = np.unique(municipio[erro], return_inverse=True)
+    variantes = np.array([[errar_digitacao(rng, nome) for _ in range(VARIANTES_ERRO)] for nome in nomes_errados], dtype=object).reshape(-1, VARIANTES_ERRO)
+    municipio[erro] = variantes[codigos, rng.integers(0, VARIANTES_ERRO, len(erro))]
+    return municipio
+
+
+def sortear_tracados(rng, n):
+    # Até três rótulos distintos por acidente, separados por ';'
+    valores = np.array(list(TRACADOS.keys()), dtype=object)
+    pesos = np.array(list(TRACADOS.values()))
+    a, b, c = (rng.choice(len(valores), size=n, p=pesos / pesos.sum()) for _ in range(3))
+    segundo = (rng.random(n) < PROB_SEGUNDO_TRACADO) & (b != a)
+    terceiro = segundo & (rng.random(n) < PROB_TERCEIRO_TRACADO / PROB_SEGUNDO_TRACADO) & (c != a) & (c != b)
+    rotulos = valores[a]
+    rotulos[segundo] = rotulos[segundo] + ';' + valores[b[segundo]]
+    rotulos[terceiro] = rotulos[terceiro] + ';' + valores[c[terceiro]]
+    return rotulos
+
+
+def sortear_vitimas(rng, classificacao):
+    # Contagens de pessoas coerentes com a classificação do acidente
+    n = len(classificacao)
+    fatal = classificacao == 'Com Vítimas Fatais'
+    feridos = (classificacao == 'Com Vítimas Feridas') | fatal
+    mortos = np.where(fatal, 1 + rng.poisson(0.25, n), 0)
+    feridos_graves = np.where(feridos, rng.poisson(0.35, n), 0)
+    feridos_leves = np.where(feridos, rng.poisson(1.0, n), 0)
+    # Acidente com feridos tem ao menos um ferido
+    sem_ferido = (classificacao == 'Com Vítimas Feridas') & (feridos_graves + feridos_leves == 0)
+    feridos_leves = feridos_leves + sem_ferido
+    ilesos = rng.poisson(1.3, n)
+    ignorados = (rng.random(n) < 0.05).astype(np.int64)
+    veiculos = 1 + rng.poisson(0.8, n)
+    return {
+        'pessoas': mortos + feridos_graves + feridos_leves + ilesos + ignorados, 'mortos': mortos,
+        'feridos_leves': feridos_leves, 'feridos_graves': feridos_graves, 'ilesos': ilesos, 'ignorados': ignorados,
+        'feridos': feridos_leves + feridos_graves, 'veiculos': veiculos,
+    }
+
+
+def gerar_bloco(rng, rodovias, ano, n, id_inicial):
+    # DataFrame de texto com n acidentes de um ano, no esquema daquele ano
+    esquema_novo = ano >= ANO_ESQUEMA_NOVO
+    dias = pd.date_range(f'{ano}-01-01', f'{ano}-12-31', freq='D')
+    dia = rng.integers(0, len(dias), n)
+    formato = '%Y-%m-%d' if esquema_novo else '%d/%m/%Y'
+    datas = np.array(dias.strftime(formato), dtype=object)[dia]
+    dia_semana = np.array([DIAS_SEMANA[d.weekday()] for d in dias], dtype=object)[dia]
+    # Mais acidentes de dia e no fim da tarde
+    pesos_hora = np.array([2, 1.5, 1.5, 1.5, 2, 3, 5, 6, 6, 5, 5, 5, 5, 5, 5, 5, 6, 7, 7, 6, 5, 4, 3, 2.5])
+    hora = rng.choice(24, size=n, p=pesos_hora / pesos_hora.sum())
+    horario = np.array([f'{h:02d}:{m:02d}:00' for h in range(24) for m in range(60)], dtype=object)[hora * 60 + rng.integers(0, 60, n)]
+
+    rodovia, uf, br = sortear_rodovias(rng, rodovias, n)
+    km = sortear_kms(rng, rodovias, rodovia)
+    lat, lon = coordenadas_das_linhas(rodovias, rodovia, km)
+    classificacao = sortear(rng, DISTRIBUICOES['classificacao_acidente'], n)
+
+    df = pd.DataFrame({
+        'id': np.arange(id_inicial, id_inicial + n).astype(str),
+        'data_inversa': datas, 'dia_semana': dia_semana, 'horario': horario,
+        'uf': uf, 'br': br.astype(str), 'km': pt_br(km, 1), 'municipio': sortear_municipios(rng, uf),
+        'causa_acidente': sortear(rng, DISTRIBUICOES['causa_acidente'], n),
+        'tipo_acidente': sortear(rng, DISTRIBUICOES['tipo_acidente'], n),
+        'classificacao_acidente': classificacao,
+        'fase_dia': sortear(rng, DISTRIBUICOES['fase_dia'], n),
+        'sentido_via': sortear(rng, DISTRIBUICOES['sentido_via'], n),
+        'condicao_metereologica': sortear(rng, DISTRIBUICOES['condicao_metereologica'], n),
+        'tipo_pista': sortear(rng, DISTRIBUICOES['tipo_pista'], n),
+        'tracado_via': sortear_tracados(rng, n),
+        'uso_solo': np.where(rng.random(n) < 0.4, 'Sim', 'Não') if esquema_novo else np.where(rng.random(n) < 0.4, 'Urbano', 'Rural'),
+    })
+    for col, valores in sortear_vitimas(rng, classificacao).items():
+        df[col] = valores.astype(str)
+
+    if esquema_novo:
+        # Ruído de algumas dezenas de metros; parte das linhas sem coordenada ou com coordenada zerada
+        lat = lat + rng.normal(0, 0.0003, n)
+        lon = lon + rng.normal(0, 0.0003, n)
+        df['latitude'] = pt_br(lat, 6)
+        df['longitude'] = pt_br(lon, 6)
+        sem_coordenada = rng.random(n) < 0.02
+        df.loc[sem_coordenada, ['latitude', 'longitude']] = 'NA'
+        zerada = rng.random(n) < 0.001
+        df.loc[zerada, ['latitude', 'longitude']] = '0'
+        df['regional'] = 'SR-' + df['uf']
+        delegacia = rng.integers(1, 8, n).astype(str)
+        df['delegacia'] = 'DEL0' + delegacia + '-' + df['uf']
+        df['uop'] = 'UOP0' + rng.integers(1, 5, n).astype(str) + '-DEL0' + delegacia + '-' + df['uf']
+    else:
+        df['ano'] = str(ano)
+
+    # Marcadores de ausência espalhados pelas colunas de texto
+    for col in COLUNAS_COM_FALTANTES:
+        faltante = np.flatnonzero(rng.random(n) < TAXA_FALTANTES)
+        df.loc[faltante, col] = np.array(MARCADORES_FALTANTES, dtype=object)[rng.integers(0, len(MARCADORES_FALTANTES), len(faltante))]
+    return df[COLUNAS_ESQUEMA_NOVO if esquema_novo else COLUNAS_ESQUEMA_ANTIGO]
+
+
+def linhas_csv(df):
+    # Bytes UTF-8 das linhas separadas por ';', montadas pelo Arrow; aspas só em valores
+    # com ';' (ex.: tracado_via). O buffer de dados de um array de texto é a concatenação
+    # dos valores, então as linhas já terminadas em '\n' formam o trecho do arquivo.
+    aspas, separador, vazio, fim_linha = (pa.scalar(t, pa.large_string()) for t in ['"', ';', '', '\n'])
+    colunas = []
+    for col in df.columns:
+        valores = pc.cast(pa.array(df[col]), pa.large_string())
+        com_separador = pc.match_substring(valores, ';')
+        colunas.append(pc.if_else(com_separador, pc.binary_join_element_wise(aspas, valores, aspas, vazio), valores))
+    linhas = pc.binary_join_element_wise(pc.binary_join_element_wise(*colunas, separador), vazio, fim_linha)
+    offsets = np.frombuffer(linhas.buffers()[1], dtype=np.int64)[linhas.offset:linhas.offset + len(linhas) + 1]
+    return memoryview(linhas.buffers()[2])[offsets[0]:offsets[-1]]
+
+
+def gerar_datatran(dir_saida, linhas, anos=ANOS_PADRAO, semente=42, encoding='utf-8'):
+    # Divide as linhas entre os anos e grava cada ano em blocos; devolve {ano: caminho}
+    rng = np.random.default_rng(semente)
+    rodovias = Rodovias(semente)
+    por_ano = np.full(len(anos), linhas // len(anos))
+    por_ano[:linhas % len(anos)] += 1
+    arquivos = {}
+    for ano, n_ano in zip(anos, por_ano):
+        os.makedirs(os.path.join(dir_saida, f'datatran{ano}'), exist_ok=True)
+        caminho = os.path.join(dir_saida, f'datatran{ano}', f'datatran{ano}.csv')
+        id_inicial = ano * 10**8
+        utf8 = encoding.lower().replace('-', '') == 'utf8'
+        with open(caminho, 'wb') as f:
+            for inicio in range(0, int(n_ano), TAMANHO_BLOCO):
+                n = int(min(TAMANHO_BLOCO, n_ano - inicio))
+                bloco = gerar_bloco(rng, rodovias, ano, n, id_inicial + inicio)
+                if inicio == 0:
+                    f.write((';'.join(bloco.columns) + '\n').encode(encoding))
+                linhas = linhas_csv(bloco)
+                f.write(linhas if utf8 else bytes(linhas).decode('utf-8').encode(encoding))
+        print(f'{caminho}: {n_ano} linhas')
+        arquivos[ano] = caminho
+    return arquivos
+
+
+def gerar_radares(caminho, quantidade, semente=42, encoding='latin-1'):
+    # Inventário no formato de dados_dos_radares.csv, sobre as mesmas rodovias dos acidentes
+    rng = np.random.default_rng([semente, 1])
+    rodovias = Rodovias(semente)
+    rodovia, uf, br = sortear_rodovias(rng, rodovias, quantidade)
+    # km com duas casas, como no inventário
+    km = np.round(sortear_kms(rng, rodovias, rodovia) + rng.uniform(-0.05, 0.05, quantidade), 2).clip(0)
+    lat, lon = coordenadas_das_linhas(rodovias, rodovia, km)
+    ativo = rng.random(quantidade) < 0.85
+    df = pd.DataFrame({
+        'concessionaria': np.array(CONCESSIONARIAS, dtype=object)[rng.integers(0, len(CONCESSIONARIAS), quantidade)],
+        'ano_do_pnv_snv': rng.integers(2005, 2023, quantidade).astype(str),
+        'tipo_de_radar': np.where(rng.random(quantidade) < 0.7, 'Controlador', 'Redutor'),
+        'rodovia': 'BR-' + pd.Series(br).astype(str).str.zfill(3),
+        'uf': uf,
+        'km_m': pt_br(km, 2),
+        'municipio': sortear_municipios(rng, uf),
+        'tipo_pista': np.where(rng.random(quantidade) < 0.9, 'Principal', 'Marginal'),
+        'sentido': sortear(rng, {'Crescente': 0.45, 'Decrescente': 0.45, 'Crescente/Decrescente': 0.10}, quantidade),
+        'situacao': np.where(ativo, 'Ativo', 'Inativo'),
+        'data_da_inativacao': np.where(ativo, '', pd.Series(rng.integers(2015, 2024, quantidade)).astype(str) + '-06-30'),
+        'latitude': pt_br(lat + rng.normal(0, 0.0002, quantidade), 6),
+        'longitude': pt_br(lon + rng.normal(0, 0.0002, quantidade), 6),
+        'velocidade_leve': sortear(rng, {'60': 0.3, '80': 0.4, '100': 0.2, '110': 0.1}, quantidade),
+        'velocidade_pesado': sortear(rng, {'60': 0.5, '80': 0.4, '90': 0.1}, quantidade),
+    })
+    df.to_csv(caminho, sep=';', index=False, encoding=encoding)
+    print(f'{caminho}: {quantidade} radares')
+    return caminho
+
+
+def radares_para(linhas):
+    # Quantidade padrão de radares para uma base de acidentes
+    return int(np.clip(linhas // 100, 200, 20_000))
+
+
+def ler_anos(texto):
+    # '2015-2024' ou '2015,2017,2019'
+    if '-' in texto:
+        inicio, fim = texto.split('-')
+        return list(range(int(inicio), int(fim) + 1))
+    return [int(a) for a in texto.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera arquivos datatran e de radares sintéticos.')
+    parser.add_argument('--linhas', type=int, default=1_000_000, help='total de acidentes (somando todos os anos)')
+    parser.add_argument('--anos', type=ler_anos, default=ANOS_PADRAO, help="anos, ex.: '2015-2024' ou '2017,2018'")
+    parser.add_argument('--radares', type=int, default=None, help='quantidade de radares (padrão: proporcional às linhas)')
+    parser.add_argument('--saida', default='.', help='diretório onde ficam datatran{ano}/ e dados_dos_radares.csv')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--encoding', default='utf-8', help='encoding dos arquivos datatran')
+    args = parser.parse_args()
+
+    gerar_datatran(args.saida, args.linhas, args.anos, args.semente, args.encoding)
+    quantidade = args.radares if args.radares is not None else radares_para(args.linhas)
+    gerar_radares(os.path.join(args.saida, 'dados_dos_radares.csv'), quantidade, args.semente)
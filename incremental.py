@@ -0,0 +1,250 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+import esquema
+import valores_faltantes
+import padronizar_categorias_mg
+import pre_processa_acidentes_MG
+import analise_trechos
+import cubo_trechos
+from pipeline import Pipeline, ARQUIVO_ULTIMA_EXECUCAO, inferir_tipos
+
+# ==============================================================================
+# Acréscimo incremental de anos novos de datatran
+# ==============================================================================
+# Parte das saídas em cache da última execução (anos já processados) e passa
+# só as linhas dos anos novos pelas etapas de texto e de codificação, juntando
+# o resultado ao histórico na ordem da consolidação completa. Na análise de
+# trechos só as BRs que receberam acidentes novos são segmentadas e agregadas
+# de novo; os demais trechos são reaproveitados e a numeração global de
+# id_trecho é refeita. O índice km -> coordenada é reconstruído sobre a base
+# inteira, como na etapa completa. O resultado é o mesmo de uma execução completa.
+#
+# Quando o histórico mudaria com os anos novos (colunas novas na consolidação,
+# outra decisão de colunas numéricas, outro mapeamento de municípios) ou falta
+# o cache de uma etapa, aquela etapa e as seguintes rodam por inteiro.
+
+# Colunas que compactar_tipos converte por conta própria
+COLUNAS_COMPACTADAS = ['km', 'latitude', 'longitude', 'data_inversa']
+
+
+def anos_ultima_execucao(pipeline):
+    caminho = os.path.join(pipeline.dir_cache, ARQUIVO_ULTIMA_EXECUCAO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)['anos']
+
+
+def linhas_dos_anos(df, anos):
+    return df[pd.to_numeric(df['ANO_DADOS']).isin(anos)].reset_index(drop=True)
+
+
+def ordenar_por_ano(df):
+    # Ordem da consolidação completa: anos em ordem crescente, cada um na ordem do arquivo
+    ano = pd.to_numeric(df['ANO_DADOS']).to_numpy()
+    return df.iloc[np.argsort(ano, kind='stable')].reset_index(drop=True)
+
+
+def acrescentar_linhas(historico, novas):
+    # None se as linhas novas trazem colunas que o histórico não tem (a união de
+    # colunas da consolidação completa mudaria também as linhas antigas)
+    if not set(novas.columns) <= set(historico.columns):
+        return None
+    return ordenar_por_ano(pd.concat([historico, novas.reindex(columns=historico.columns)], ignore_index=True))
+
+
+def catalogo_valores(df):
+    # DataFrame pequeno com todos os valores distintos de cada coluna (inclusive nulo),
+    # repetidos ciclicamente. As decisões da codificação que dependem só do conjunto de
+    # valores de cada coluna (tipo inferido, colunas one-hot, uint8) saem iguais às da base inteira.
+    unicos = {col: np.asarray(df[col].unique(), dtype=object) for col in df.columns}
+    n = max(len(u) for u in unicos.values())
+    return pd.DataFrame({col: np.resize(u, n) for col, u in unicos.items()})
+
+
+def inferir_tipos_como(df, tipos):
+    # Inferência de tipos das linhas novas alinhada aos tipos inferidos da base inteira
+    inferido = inferir_tipos(df)
+    for col in df.columns:
+        if tipos[col] == object or pd.api.types.is_string_dtype(tipos[col]):
+            inferido[col] = df[col]
+        else:
+            inferido[col] = inferido[col].astype(tipos[col])
+    return inferido
+
+
+def reinterpolar_coordenadas(df_ml, df_texto, indice_coord):
+    # Linhas sem coordenada na origem são interpoladas de novo com o índice km ->
+    # coordenada da base inteira (anos novos incluídos), como numa execução completa
+    if not pre_processa_acidentes_MG.PREENCHER_COORDENADAS or not set(pre_processa_acidentes_MG.COLUNAS_INDICE_COORDENADAS).issubset(df_ml.columns):
+        return df_ml
+    lat, lon = (esquema.converter_numero(df_texto[c], 'float64') for c in ['latitude', 'longitude'])
+    faltando = (lat.isna() | lon.isna()).to_numpy()
+    lat_interp, lon_interp = indice_coord.interpolar(df_ml.loc[faltando, 'br'], df_ml.loc[faltando, 'km'])
+    # Sem interpolação a linha fica com os valores de origem (uma das coordenadas pode existir)
+    preenchido = ~np.isnan(lat_interp)
+    df_ml = df_ml.copy()
+    df_ml.loc[faltando, 'latitude'] = np.where(preenchido, lat_interp, lat[faltando]).astype('float32')
+    df_ml.loc[faltando, 'longitude'] = np.where(preenchido, lon_interp, lon[faltando]).astype('float32')
+    return df_ml
+
+
+def combinar_codificados(historico, novas, referencia):
+    # Junta as duas partes codificadas com as colunas e os tipos da codificação da
+    # base inteira: famílias one-hot ausentes em uma das partes valem 0
+    partes = []
+    for parte in (historico, novas):
+        faltantes = [c for c in referencia.columns if c not in parte.columns]
+        partes.append(parte.assign(**{c: 0 for c in faltantes})[list(referencia.columns)])
+    df = pd.concat(partes, ignore_index=True)
+    for col in referencia.columns:
+        if col in COLUNAS_COMPACTADAS:
+            continue
+        if referencia[col].dtype == object or pd.api.types.is_string_dtype(referencia[col]):
+            df[col] = df[col].astype(str).where(df[col].notna()).astype('category')
+        else:
+            df[col] = df[col].astype(referencia[col].dtype)
+    return ordenar_por_ano(df)
+
+
+# ==============================================================================
+# Etapas incrementais: devolvem a saída completa ou None se for preciso recalcular tudo
+# ==============================================================================
+def incremental_consolidacao(ctx):
+    novas = ctx.etapa('consolidacao').funcao(ctx.anos_novos)
+    return acrescentar_linhas(ctx.anteriores['consolidacao'], novas)
+
+
+def incremental_separacao_uf(ctx):
+    etapa = ctx.etapa('separacao_uf')
+    novas = etapa.funcao(ctx.novas('consolidacao'), **etapa.parametros)
+    return acrescentar_linhas(ctx.anteriores['separacao_uf'], novas)
+
+
+def incremental_valores_faltantes(ctx):
+    # A detecção de colunas numéricas olha os primeiros valores de cada coluna
+    colunas_numericas = valores_faltantes.detectar_colunas_numericas(ctx.atuais['separacao_uf'])
+    if colunas_numericas != valores_faltantes.detectar_colunas_numericas(ctx.anteriores['separacao_uf']):
+        return None
+    novas = ctx.etapa('valores_faltantes').funcao(ctx.novas('separacao_uf'), colunas_numericas=colunas_numericas)
+    return acrescentar_linhas(ctx.anteriores['valores_faltantes'], novas)
+
+
+def incremental_padronizacao(ctx):
+    # Os municípios são comparados com a lista de todos os municípios da base
+    municipios = sorted(ctx.atuais['valores_faltantes']['municipio'].dropna().unique())
+    municipios_anteriores = sorted(ctx.anteriores['valores_faltantes']['municipio'].dropna().unique())
+    tabela = padronizar_categorias_mg.mapear_municipios(municipios, municipios)
+    tabela_anterior = padronizar_categorias_mg.mapear_municipios(municipios_anteriores, municipios_anteriores)
+    if any(tabela[v] != m for v, m in tabela_anterior.items()):
+        return None
+    novas = ctx.etapa('padronizacao').funcao(ctx.novas('valores_faltantes'), municipios_validos=municipios)
+    return acrescentar_linhas(ctx.anteriores['padronizacao'], novas)
+
+
+def incremental_pre_processamento_ml(ctx):
+    base = ctx.atuais['padronizacao']
+    catalogo = inferir_tipos(catalogo_valores(base))
+    referencia = pre_processa_acidentes_MG.codificar_features(catalogo)
+    novas = pre_processa_acidentes_MG.codificar_features(inferir_tipos_como(ctx.novas('padronizacao'), catalogo.dtypes))
+    # Índice km -> coordenada de todas as linhas, como o da etapa completa (só as colunas que ele usa)
+    colunas_indice = pre_processa_acidentes_MG.COLUNAS_INDICE_COORDENADAS
+    indice_coord = None
+    if pre_processa_acidentes_MG.PREENCHER_COORDENADAS and set(colunas_indice).issubset(base.columns):
+        indice_coord = pre_processa_acidentes_MG.construir_indice_coordenadas(inferir_tipos_como(base[colunas_indice], catalogo.dtypes))
+    novas = pre_processa_acidentes_MG.compactar_tipos(novas, indice_coord)
+    historico = reinterpolar_coordenadas(ctx.anteriores['pre_processamento_ml'], ctx.anteriores['padronizacao'], indice_coord)
+    return combinar_codificados(historico, novas, referencia)
+
+
+def incremental_analise_trechos(ctx):
+    etapa = ctx.etapa('analise_trechos')
+    base = ctx.atuais['pre_processamento_ml']
+    # Colunas de proporção decididas sobre a base inteira, como na segmentação completa
+    df_proc = analise_trechos.preparar_acidentes(base).dropna(subset=['br', 'km', 'data_inversa'])
+    df_proc['br'] = df_proc['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
+    colunas_one_hot = analise_trechos.identificar_colunas_one_hot(df_proc)
+
+    br_base = base['br'].astype(str).str.replace('BR-', '', regex=False).str.strip()
+    brs_alteradas = set(br_base[pd.to_numeric(base['ANO_DADOS']).isin(ctx.anos_novos)])
+    print(f'[incremental] analise_trechos: {len(brs_alteradas)} BRs com acidentes novos')
+    # Janelas de 12 meses terminam no último mês da base inteira: recalculadas abaixo para todas as BRs
+    parametros = dict(etapa.parametros, features_janela_12m=False)
+    trechos_novos = etapa.funcao(base[br_base.isin(brs_alteradas)], colunas_one_hot=colunas_one_hot, **parametros)
+
+    anteriores = ctx.anteriores['analise_trechos']
+    anteriores = anteriores[~anteriores['br'].astype(str).isin(brs_alteradas)]
+    # Colunas de proporção novas (categorias que só aparecem nos anos novos) valem 0 nas BRs antigas
+    anteriores = anteriores.assign(**{c: 0.0 for c in trechos_novos.columns if c not in anteriores.columns})
+    df = analise_trechos.renumerar_trechos(pd.concat([anteriores[list(trechos_novos.columns)], trechos_novos], ignore_index=True))
+    if etapa.parametros.get('features_janela_12m'):
+        df = pd.merge(df, cubo_trechos.cubo_do_dataset(df_proc, df).features_janela(12), on='id_trecho', how='left')
+    return df
+
+
+INCREMENTAIS = {
+    'consolidacao': incremental_consolidacao,
+    'separacao_uf': incremental_separacao_uf,
+    'valores_faltantes': incremental_valores_faltantes,
+    'padronizacao': incremental_padronizacao,
+    'pre_processamento_ml': incremental_pre_processamento_ml,
+    'analise_trechos': incremental_analise_trechos,
+}
+
+
+class Contexto:
+    def __init__(self, pipeline, anos_novos):
+        self.pipeline = pipeline
+        self.anos_novos = anos_novos
+        self.anteriores = {}  # saídas da última execução
+        self.atuais = {}  # saídas completas com os anos novos
+
+    def etapa(self, nome):
+        return self.pipeline.etapas[nome]
+
+    def novas(self, nome):
+        return linhas_dos_anos(self.atuais[nome], self.anos_novos)
+
+
+def executar_incremental(pipeline, alvo='analise_trechos'):
+    anos_atuais = pipeline.etapas['consolidacao'].parametros['anos']
+    anos_anteriores = anos_ultima_execucao(pipeline)
+    if anos_anteriores is None or not set(anos_anteriores) < set(anos_atuais) or os.path.exists(pipeline.caminho_cache(alvo)):
+        print('[incremental] nenhum ano novo sobre a última execução; execução normal')
+        return pipeline.executar(alvo)
+    anos_novos = sorted(set(anos_atuais) - set(anos_anteriores))
+    print(f'[incremental] acrescentando {anos_novos} a {len(anos_anteriores)} anos já processados')
+
+    anterior = Pipeline(pipeline.etapas.values(), pipeline.dir_cache, {'anos': anos_anteriores})
+    anterior.hashes = pipeline.hashes
+    ctx = Contexto(pipeline, anos_novos)
+    # Uma etapa recalculada por inteiro pode mudar linhas antigas: as seguintes também recalculam
+    completo = False
+    nomes = list(pipeline.etapas)
+    try:
+        for nome in nomes[:nomes.index(alvo) + 1]:
+            etapa = pipeline.etapas[nome]
+            df = pipeline.carregar_cache(nome)
+            # Saída anterior da etapa: base do incremento dela e do da etapa seguinte
+            ctx.anteriores[nome] = None if completo else anterior.carregar_cache(nome)
+            if df is not None:
+                print(f'[pipeline] {nome}: cache {os.path.basename(pipeline.caminho_cache(nome))}')
+            else:
+                if ctx.anteriores[nome] is not None and all(ctx.anteriores.get(d) is not None for d in etapa.dependencias):
+                    df = INCREMENTAIS[nome](ctx)
+                if df is None:
+                    print(f'[incremental] {nome}: recalculando a etapa inteira')
+                    df = etapa.funcao(*[ctx.atuais[d] for d in etapa.dependencias], **etapa.parametros)
+                    completo = True
+                else:
+                    print(f'[incremental] {nome}: {len(df)} linhas ({len(ctx.anteriores[nome])} na execução anterior)')
+                df = df.reset_index(drop=True)
+                pipeline.salvar_cache(nome, df)
+            ctx.atuais[nome] = df
+        pipeline.registrar_execucao()
+    finally:
+        pipeline.salvar_hashes()
+    return ctx.atuais[alvo]
@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+import math
+
+# ==============================================================================
+# Índice de similaridade equivalente a get_close_matches(valor, referencias, n=1, cutoff)
+# ==============================================================================
+# O índice é construído uma vez sobre a lista de referência e filtra os
+# candidatos antes de rodar o SequenceMatcher:
+#   1. Comprimento: ratio <= 2*min(la, lb)/(la + lb) (o real_quick_ratio), então
+#      só entram os comprimentos que ainda podem atingir o cutoff.
+#   2. Bigramas: com M caracteres casados em k blocos, os blocos compartilham ao
+#      menos M - k bigramas e k - 1 <= T - 2M (T = la + lb). Como ratio >= cutoff
+#      exige M >= cutoff*T/2, o candidato precisa compartilhar pelo menos
+#      1.5*cutoff*T - T - 1 bigramas com o valor consultado.
+# Os dois filtros são limites superiores do ratio, então o resultado é o mesmo
+# do get_close_matches (inclusive o desempate pelo maior valor em caso de ratio igual).
+
+# Acima deste tamanho o SequenceMatcher ativa o autojunk e o limite por bigramas
+# deixa de valer; a consulta cai na varredura por comprimento
+TAMANHO_MAX_BIGRAMAS = 200
+
+
+def bigramas(texto):
+    return Counter(texto[i:i + 2] for i in range(len(texto) - 1))
+
+
+class IndiceFuzzy:
+    def __init__(self, referencias, cutoff=0.85):
+        self.cutoff = cutoff
+        self.referencias = sorted(set(referencias))
+        self.conjunto = set(self.referencias)
+        self.por_tamanho = defaultdict(list)
+        self.postings = defaultdict(list)
+        for i, ref in enumerate(self.referencias):
+            self.por_tamanho[len(ref)].append(i)
+            for bg, qtd in bigramas(ref).items():
+                self.postings[bg].append((i, qtd))
+        self.tamanhos = sorted(self.por_tamanho)
+        self._cache = {}
+
+    def _tamanho_possivel(self, la, lb):
+        # Mesmo cálculo do real_quick_ratio do difflib
+        total = la + lb
+        if total == 0:
+            return True
+        return 2.0 * min(la, lb) / total >= self.cutoff
+
+    def _candidatos(self, valor):
+        lb = len(valor)
+        tamanhos = [la for la in self.tamanhos if self._tamanho_possivel(la, lb)]
+        # Mínimo de bigramas compartilhados por comprimento (com 1 de folga para arredondamento)
+        minimos = {}
+        if lb < TAMANHO_MAX_BIGRAMAS:
+            for la in tamanhos:
+                minimo = math.ceil(1.5 * self.cutoff * (la + lb) - (la + lb) - 1) - 1
+                if minimo > 0:
+                    minimos[la] = minimo
+        candidatos = [i for la in tamanhos if la not in minimos for i in self.por_tamanho[la]]
+        if minimos:
+            compartilhados = defaultdict(int)
+            for bg, qtd in bigramas(valor).items():
+                for i, qtd_ref in self.postings.get(bg, ()):
+                    compartilhados[i] += min(qtd, qtd_ref)
+            for i, n in compartilhados.items():
+                minimo = minimos.get(len(self.referencias[i]))
+                if minimo is not None and n >= minimo:
+                    candidatos.append(i)
+        return candidatos
+
+    def _melhor(self, valor):
+        # Valor presente na referência tem ratio 1.0 com ele mesmo, o máximo possível
+        if valor in self.conjunto:
+            return valor
+        s = SequenceMatcher()
+        s.set_seq2(valor)
+        melhor = None
+        for i in self._candidatos(valor):
+            x = self.referencias[i]
+            s.set_seq1(x)
+            if s.real_quick_ratio() >= self.cutoff and s.quick_ratio() >= self.cutoff:
+                r = s.ratio()
+                if r >= self.cutoff and (melhor is None or (r, x) > melhor):
+                    melhor = (r, x)
+        return melhor[1] if melhor else None
+
+    def buscar_lote(self, valores):
+        # Resolve cada valor distinto uma única vez; devolve None quando nada atinge o cutoff
+        resultado = []
+        for valor in valores:
+            if valor not in self._cache:
+                self._cache[valor] = self._melhor(valor)
+            resultado.append(self._cache[valor])
+        return resultado
+
+    def buscar(self, valor):
+        return self.buscar_lote([valor])[0]
@@ -0,0 +1,107 @@
+import math
+import numpy as np
+
+# ==============================================================================
+# Índice espacial em grade com distância haversine
+# ==============================================================================
+# Os pontos são agrupados em células de tamanho_celula_km (em graus de latitude)
+# e ordenados pela chave da célula. Uma consulta de raio r visita só as células
+# vizinhas que podem conter pontos a até r km, todas as consultas de uma vez por
+# deslocamento de célula. O desempenho é melhor com células do tamanho do raio
+# usado nas consultas. Não trata a virada do antimeridiano (irrelevante para o Brasil).
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = math.pi * RAIO_TERRA_KM / 180
+DESLOCAMENTO_CELULA = 10**6
+MULTIPLICADOR_CELULA = 10**7
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class IndiceGeografico:
+    def __init__(self, lat, lon, tamanho_celula_km=5.0):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        # Pontos sem coordenada ficam fora do índice; ids referem-se às posições originais
+        valido = ~(np.isnan(lat) | np.isnan(lon))
+        self.tamanho_celula_km = tamanho_celula_km
+        self.graus_celula = tamanho_celula_km / KM_POR_GRAU
+        ids = np.flatnonzero(valido)
+        chaves = self._chave(*self._celula(lat[valido], lon[valido]))
+        ordem = np.argsort(chaves, kind='stable')
+        self.ids = ids[ordem]
+        self.lat = lat[valido][ordem]
+        self.lon = lon[valido][ordem]
+        self.chaves, self.inicio, contagem = np.unique(chaves[ordem], return_index=True, return_counts=True)
+        self.fim = self.inicio + contagem
+
+    def _celula(self, lat, lon):
+        return np.floor(lat / self.graus_celula).astype(np.int64), np.floor(lon / self.graus_celula).astype(np.int64)
+
+    def _chave(self, ci, cj):
+        return (ci + DESLOCAMENTO_CELULA) * MULTIPLICADOR_CELULA + (cj + DESLOCAMENTO_CELULA)
+
+    def _pares(self, lat, lon, raio_km):
+        # Gera, por deslocamento de célula, os pares (consulta, ponto, distância) com distância <= raio_km
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        consultas = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        if len(consultas) == 0 or len(self.chaves) == 0:
+            return
+        lat_q, lon_q = lat[consultas], lon[consultas]
+        ci, cj = self._celula(lat_q, lon_q)
+        n_lat = math.ceil(raio_km / self.tamanho_celula_km)
+        # Em longitude a célula encolhe com cos(lat): usa a maior latitude alcançável pelas consultas
+        lat_max = min(89.9, float(np.abs(lat_q).max()) + raio_km / KM_POR_GRAU)
+        n_lon = math.ceil(raio_km / (self.tamanho_celula_km * math.cos(math.radians(lat_max))))
+        for di in range(-n_lat, n_lat + 1):
+            for dj in range(-n_lon, n_lon + 1):
+                chaves_q = self._chave(ci + di, cj + dj)
+                loc = np.clip(np.searchsorted(self.chaves, chaves_q), 0, len(self.chaves) - 1)
+                achou = np.flatnonzero(self.chaves[loc] == chaves_q)
+                if len(achou) == 0:
+                    continue
+                ini, fim = self.inicio[loc[achou]], self.fim[loc[achou]]
+                qtd = fim - ini
+                q = np.repeat(achou, qtd)
+                # Posições dos pontos de cada célula encontrada, concatenadas
+                p = np.arange(qtd.sum()) - np.repeat(np.cumsum(qtd) - qtd, qtd) + np.repeat(ini, qtd)
+                d = haversine_km(lat_q[q], lon_q[q], self.lat[p], self.lon[p])
+                perto = d <= raio_km
+                if perto.any():
+                    yield consultas[q[perto]], p[perto], d[perto]
+
+    def pares_no_raio(self, lat, lon, raio_km):
+        # Todos os pares (índice da consulta, id do ponto, distância km) a no máximo raio_km
+        partes = list(self._pares(lat, lon, raio_km))
+        if not partes:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+        q, p, d = (np.concatenate(v) for v in zip(*partes))
+        return q, self.ids[p], d
+
+    def contar_no_raio(self, lat, lon, raio_km):
+        contagem = np.zeros(len(np.asarray(lat)), dtype=np.int64)
+        for q, _, _ in self._pares(lat, lon, raio_km):
+            contagem += np.bincount(q, minlength=len(contagem))
+        return contagem
+
+    def mais_proximo(self, lat, lon, raio_max_km):
+        # (id do ponto mais próximo, distância km) de cada consulta; -1 e NaN se não
+        # houver ponto a até raio_max_km
+        n = len(np.asarray(lat))
+        melhor_d = np.full(n, np.inf)
+        melhor_p = np.full(n, -1, dtype=np.int64)
+        for q, p, d in self._pares(lat, lon, raio_max_km):
+            anterior = melhor_d[q]
+            np.minimum.at(melhor_d, q, d)
+            # Pares que atingiram o novo mínimo da consulta (empates ficam com o último)
+            venceu = (d == melhor_d[q]) & (d < anterior)
+            melhor_p[q[venceu]] = p[venceu]
+        encontrado = melhor_p >= 0
+        ids = np.full(n, -1, dtype=np.int64)
+        ids[encontrado] = self.ids[melhor_p[encontrado]]
+        return ids, np.where(encontrado, melhor_d, np.nan)
@@ -0,0 +1,137 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from indice_geografico import haversine_km
+from indices_rodovia import posicoes_por_br
+
+# ==============================================================================
+# Índice offline km -> coordenada por BR
+# ==============================================================================
+# Construído a partir dos acidentes que têm (br, km) e latitude/longitude. Cada
+# BR vira uma sequência de nós (km, lat, lon) ordenados por km, um por faixa de
+# PASSO_KM, com a mediana das coordenadas da faixa. Coordenadas faltantes são
+# interpoladas linearmente entre os nós vizinhos, em lote, por BR. O índice
+# salvo guarda as observações de cada faixa, não só os nós, e os nós são
+# sempre recalculados a partir delas.
+
+PASSO_KM = 0.1
+# Caixa do território brasileiro: descarta coordenadas zeradas, trocadas ou fora do país
+LIMITES_BRASIL = {'lat': (-34.0, 5.5), 'lon': (-74.5, -28.5)}
+# Ponto a mais de LIMIAR_OUTLIER_KM da mediana da sua faixa é descartado
+LIMIAR_OUTLIER_KM = 2.0
+# Nó incoerente com os dois vizinhos (distância > FATOR_VIZINHO * Δkm + TOLERANCIA_VIZINHO_KM) é descartado
+FATOR_VIZINHO = 3.0
+TOLERANCIA_VIZINHO_KM = 2.0
+# Só interpola entre nós separados por no máximo este intervalo de km
+GAP_MAX_INTERPOLACAO_KM = 5.0
+
+
+def normalizar_br(br):
+    return pd.Series(br).astype(str).str.replace('BR-', '', regex=False).str.strip().to_numpy()
+
+
+def coordenadas_validas(lat, lon):
+    return (
+        (lat >= LIMITES_BRASIL['lat'][0]) & (lat <= LIMITES_BRASIL['lat'][1])
+        & (lon >= LIMITES_BRASIL['lon'][0]) & (lon <= LIMITES_BRASIL['lon'][1])
+    )
+
+
+def observacoes_validas(br, km, lat, lon):
+    # Observações (br, km da faixa, latitude, longitude) com coordenada dentro do Brasil
+    df = pd.DataFrame({
+        'br': normalizar_br(br), 'km': np.asarray(km, dtype=float),
+        'latitude': np.asarray(lat, dtype=float), 'longitude': np.asarray(lon, dtype=float),
+    }).dropna()
+    df = df[coordenadas_validas(df['latitude'], df['longitude'])]
+    df['km'] = ((df['km'] / PASSO_KM).round() * PASSO_KM).round(6)
+    return df.reset_index(drop=True)
+
+
+def calcular_nos(obs):
+    # Nós (br, km, latitude, longitude, n) a partir das observações
+    # Mediana da faixa e descarte de quem está longe dela
+    medianas = obs.groupby(['br', 'km'])[['latitude', 'longitude']].transform('median')
+    perto = haversine_km(obs['latitude'], obs['longitude'], medianas['latitude'], medianas['longitude']) <= LIMIAR_OUTLIER_KM
+    obs = obs[perto]
+    nos = obs.groupby(['br', 'km']).agg(
+        latitude=('latitude', 'median'), longitude=('longitude', 'median'), n=('latitude', 'size'),
+    ).reset_index()
+    return nos
+
+
+def filtrar_vizinhos(nos):
+    # Remove nós cuja posição não é coerente com nenhum dos dois vizinhos ao longo da BR
+    nos = nos.sort_values(['br', 'km']).reset_index(drop=True)
+    mesma_br_ant = nos['br'].eq(nos['br'].shift(1)).to_numpy()
+    mesma_br_prox = nos['br'].eq(nos['br'].shift(-1)).to_numpy()
+    lat, lon, km = nos['latitude'].to_numpy(), nos['longitude'].to_numpy(), nos['km'].to_numpy()
+    d_ant = haversine_km(lat, lon, np.roll(lat, 1), np.roll(lon, 1))
+    d_prox = haversine_km(lat, lon, np.roll(lat, -1), np.roll(lon, -1))
+    ok_ant = mesma_br_ant & (d_ant <= FATOR_VIZINHO * np.abs(km - np.roll(km, 1)) + TOLERANCIA_VIZINHO_KM)
+    ok_prox = mesma_br_prox & (d_prox <= FATOR_VIZINHO * np.abs(np.roll(km, -1) - km) + TOLERANCIA_VIZINHO_KM)
+    # Nó isolado (único da BR) é mantido
+    isolado = ~mesma_br_ant & ~mesma_br_prox
+    return nos[ok_ant | ok_prox | isolado].reset_index(drop=True)
+
+
+class IndiceKmCoordenadas:
+    # Guarda as observações válidas e recalcula os nós sobre todas elas: incorporar
+    # anos em qualquer ordem dá o mesmo índice que construí-lo com todos de uma vez
+    def __init__(self, observacoes=None, anos=None):
+        self.observacoes = observacoes if observacoes is not None else observacoes_validas([], [], [], [])
+        self.anos = set(anos or [])
+        self.nos = filtrar_vizinhos(calcular_nos(self.observacoes))
+        self._montar()
+
+    def _montar(self):
+        self.grupos = {
+            chave: (g['km'].to_numpy(dtype=float), g['latitude'].to_numpy(dtype=float), g['longitude'].to_numpy(dtype=float))
+            for chave, g in self.nos.sort_values(['br', 'km']).groupby('br', sort=False)
+        }
+
+    def atualizar(self, br, km, lat, lon, anos=()):
+        # Incorpora novas observações e recalcula os nós
+        novas = observacoes_validas(br, km, lat, lon)
+        self.observacoes = pd.concat([self.observacoes, novas], ignore_index=True)
+        self.nos = filtrar_vizinhos(calcular_nos(self.observacoes))
+        self.anos.update(str(a) for a in anos)
+        self._montar()
+
+    def interpolar(self, br, km):
+        # (lat, lon) interpolados para cada (br, km); NaN fora da cobertura ou em vãos
+        # maiores que GAP_MAX_INTERPOLACAO_KM
+        km = np.asarray(km, dtype=float)
+        lat = np.full(len(km), np.nan)
+        lon = np.full(len(km), np.nan)
+        for chave, pos in posicoes_por_br(normalizar_br(br)).items():
+            if chave not in self.grupos:
+                continue
+            km_nos, lat_nos, lon_nos = self.grupos[chave]
+            k = km[pos]
+            j = np.clip(np.searchsorted(km_nos, k), 1, max(len(km_nos) - 1, 1))
+            ok = (k >= km_nos[0]) & (k <= km_nos[-1])
+            if len(km_nos) > 1:
+                ok &= (km_nos[j] - km_nos[j - 1]) <= GAP_MAX_INTERPOLACAO_KM
+            lat[pos[ok]] = np.interp(k[ok], km_nos, lat_nos)
+            lon[pos[ok]] = np.interp(k[ok], km_nos, lon_nos)
+        return lat, lon
+
+    def salvar(self, caminho):
+        # Parquet guarda os float64 sem arredondar: o índice recarregado interpola igual ao da memória
+        self.observacoes.to_parquet(caminho, index=False)
+        with open(os.path.splitext(caminho)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'anos': sorted(self.anos)}, f)
+
+    @classmethod
+    def carregar(cls, caminho):
+        if not os.path.exists(caminho):
+            return cls()
+        observacoes = pd.read_parquet(caminho)
+        caminho_meta = os.path.splitext(caminho)[0] + '.json'
+        anos = []
+        if os.path.exists(caminho_meta):
+            with open(caminho_meta, 'r', encoding='utf-8') as f:
+                anos = json.load(f)['anos']
+        return cls(observacoes, anos)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# Índices por BR sobre a posição quilométrica (km)
+# ==============================================================================
+
+
+def posicoes_por_br(br):
+    # Posições das linhas de cada BR, para processar as consultas em lote por rodovia
+    return pd.Series(np.asarray(br)).groupby(np.asarray(br), sort=False).indices
+
+
+class IndiceIntervalosBR:
+    # Intervalos [inicio, fim] por BR ordenados pelo início. Supõe intervalos sem
+    # sobreposição dentro da mesma BR, como os trechos gerados pela segmentação.
+    def __init__(self, br, inicio, fim, ids):
+        df = pd.DataFrame({
+            'br': np.asarray(br), 'inicio': np.asarray(inicio, dtype=float),
+            'fim': np.asarray(fim, dtype=float), 'id': np.asarray(ids, dtype=object),
+        }).sort_values(['br', 'inicio'], kind='stable')
+        self.grupos = {
+            chave: (g['inicio'].to_numpy(), g['fim'].to_numpy(), g['id'].to_numpy())
+            for chave, g in df.groupby('br', sort=False)
+        }
+
+    def localizar(self, br, km, tolerancia_km=0.0):
+        # Devolve (id do intervalo que contém cada km, distância até ele). Um km que cai
+        # num vão entre intervalos é atribuído ao intervalo mais próximo se estiver a no
+        # máximo tolerancia_km dele; sem correspondência, id None e distância NaN.
+        km = np.asarray(km, dtype=float)
+        ids = np.full(len(km), None, dtype=object)
+        distancias = np.full(len(km), np.nan)
+        for chave, pos in posicoes_por_br(br).items():
+            if chave not in self.grupos:
+                continue
+            inicio, fim, ids_br = self.grupos[chave]
+            k = km[pos]
+            i = np.searchsorted(inicio, k, side='right') - 1
+            i_valido = np.clip(i, 0, len(inicio) - 1)
+            dentro = (i >= 0) & (k <= fim[i_valido])
+            ids[pos[dentro]] = ids_br[i_valido[dentro]]
+            distancias[pos[dentro]] = 0.0
+            if tolerancia_km > 0:
+                # Distância até o fim do intervalo à esquerda e ao início do da direita
+                d_esq = np.where(i >= 0, k - fim[i_valido], np.inf)
+                j = i + 1
+                j_valido = np.clip(j, 0, len(inicio) - 1)
+                d_dir = np.where(j < len(inicio), inicio[j_valido] - k, np.inf)
+                usa_dir = d_dir < d_esq
+                d = np.where(usa_dir, d_dir, d_esq)
+                alvo = np.where(usa_dir, j_valido, i_valido)
+                snap = ~dentro & (d <= tolerancia_km)
+                ids[pos[snap]] = ids_br[alvo[snap]]
+                distancias[pos[snap]] = d[snap]
+        return ids, distancias
+
+
+class IndicePontosBR:
+    # km de pontos (ex.: radares) ordenados dentro de cada grupo. O grupo costuma ser
+    # a BR, mas pode ser qualquer chave, como BR + sentido.
+    def __init__(self, grupo, km):
+        df = pd.DataFrame({'grupo': np.asarray(grupo), 'km': np.asarray(km, dtype=float)}).dropna()
+        self.grupos = {chave: np.sort(g['km'].to_numpy()) for chave, g in df.groupby('grupo', sort=False)}
+
+    def k_mais_proximos(self, grupo, km, k=1):
+        # Distâncias (n x k) aos k pontos mais próximos do mesmo grupo, em ordem crescente;
+        # NaN quando o grupo tem menos de k pontos. Os k vizinhos estão sempre entre as k
+        # posições de cada lado do ponto de inserção da busca binária.
+        km = np.asarray(km, dtype=float)
+        distancias = np.full((len(km), k), np.nan)
+        deslocamentos = np.arange(-k, k)
+        for chave, pos in posicoes_por_br(grupo).items():
+            pontos = self.grupos.get(chave)
+            if pontos is None:
+                continue
+            q = km[pos]
+            janela = np.searchsorted(pontos, q)[:, None] + deslocamentos
+            valido = (janela >= 0) & (janela < len(pontos))
+            d = np.abs(pontos[np.clip(janela, 0, len(pontos) - 1)] - q[:, None])
+            d[~valido] = np.inf
+            d = np.sort(d, axis=1)[:, :k]
+            d[np.isinf(d)] = np.nan
+            distancias[pos] = d
+        return distancias
+
+    def contar_no_raio(self, grupo, km, raio_km):
+        # Quantidade de pontos do mesmo grupo a no máximo raio_km de cada consulta
+        km = np.asarray(km, dtype=float)
+        contagem = np.zeros(len(km), dtype=np.int64)
+        for chave, pos in posicoes_por_br(grupo).items():
+            pontos = self.grupos.get(chave)
+            if pontos is None:
+                continue
+            q = km[pos]
+            contagem[pos] = np.searchsorted(pontos, q + raio_km, side='right') - np.searchsorted(pontos, q - raio_km, side='left')
+        return contagem
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import functools
+import contextlib
+from datetime import datetime
+import pandas as pd
+
+# ==============================================================================
+# Instrumentação de etapas: tempo, CPU, memória, linhas e bytes
+# ==============================================================================
+# Cada etapa nomeada (bloco `with medir_etapa(...)` ou função decorada com
+# @medir) gera um registro com tempo de parede, tempo de CPU, pico de memória
+# (RSS) da própria etapa, linhas de entrada e de saída e bytes lidos e gravados.
+# Etapas podem ser aninhadas. Ao fim da execução, salvar_relatorio() grava os
+# registros em JSON e CSV.
+#
+# No Linux o pico de memória de cada etapa vem do VmHWM, zerado no início da
+# etapa (/proc/self/clear_refs), e os bytes vêm de /proc/self/io (chamadas de
+# read/write, inclusive de pipes e do terminal; leituras via mmap não entram).
+# Fora do Linux o pico é o do processo até o fim da etapa, e os bytes ficam
+# vazios. Etapas executadas em outros processos (ex.: a análise de trechos com
+# vários processos) não entram no relatório do processo principal.
+#
+#   PERFIL_ETAPA='analise_trechos.juncao_geoespacial' python pipeline.py
+# grava o cProfile das etapas cujo nome começa com o texto dado.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_RELATORIOS = os.path.join(BASE_DIR, 'relatorios')
+ETAPA_PERFILADA = os.environ.get('PERFIL_ETAPA')
+# Funções exibidas no resumo do cProfile
+LINHAS_PERFIL = 25
+
+registros = []
+pilha = []
+inicio_execucao = datetime.now()
+
+
+def ler_proc(arquivo, campos):
+    # {campo: valor inteiro} de um arquivo /proc/self/*, ou {} fora do Linux
+    try:
+        with open(f'/proc/self/{arquivo}', 'r') as f:
+            linhas = [linha.split(':') for linha in f]
+    except OSError:
+        return {}
+    return {c.strip(): int(v.split()[0]) for c, v in linhas if c.strip() in campos}
+
+
+def memoria_mb():
+    # (RSS atual, pico desde o último zeramento) em MB
+    status = ler_proc('status', {'VmRSS', 'VmHWM'})
+    if status:
+        return status['VmRSS'] / 1024, status['VmHWM'] / 1024
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    pico = pico / 2**20 if sys.platform == 'darwin' else pico / 1024
+    return None, pico
+
+
+def zerar_pico():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def contar_linhas(obj):
+    # Linhas de um DataFrame/Series, ou do primeiro DataFrame de uma tupla
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, tuple):
+        for item in obj:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+    return None
+
+
+class Medicao:
+    def __init__(self, nome, linhas_entrada=None):
+        self.nome = nome
+        self.caminho = '/'.join([m.nome for m in pilha] + [nome])
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.pico_mb = 0.0
+
+    def iniciar(self):
+        # O pico acumulado até aqui pertence à etapa externa, antes do zeramento
+        if pilha:
+            pilha[-1].pico_mb = max(pilha[-1].pico_mb, memoria_mb()[1])
+        zerar_pico()
+        # Registro reservado no início: o relatório fica na ordem em que as etapas começam
+        self.indice = len(registros)
+        registros.append(None)
+        self.rss_inicio_mb, self.pico_mb = memoria_mb()
+        # /proc/self/io lido por último no início e primeiro no fim, para não contar as leituras da própria medição
+        self.io_inicio = ler_proc('io', {'rchar', 'wchar'})
+        self.inicio = datetime.now()
+        self.t0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+        self.perfil = None
+        # Um cProfile por vez: etapas internas de uma etapa já perfilada entram no mesmo perfil
+        if ETAPA_PERFILADA and self.nome.startswith(ETAPA_PERFILADA) and not any(m.perfil for m in pilha):
+            self.perfil = cProfile.Profile()
+            self.perfil.enable()
+
+    def finalizar(self, erro=None):
+        tempo = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.cpu0
+        io_fim = ler_proc('io', {'rchar', 'wchar'})
+        if self.perfil is not None:
+            self.perfil.disable()
+            salvar_perfil(self.nome, self.perfil)
+        rss_fim, pico = memoria_mb()
+        self.pico_mb = max(self.pico_mb, pico)
+        if pilha:
+            pilha[-1].pico_mb = max(pilha[-1].pico_mb, self.pico_mb)
+        registros[self.indice] = {
+            'etapa': self.caminho,
+            'inicio': self.inicio.isoformat(timespec='milliseconds'),
+            'tempo_s': round(tempo, 4),
+            'cpu_s': round(cpu, 4),
+            'pico_rss_mb': round(self.pico_mb, 1),
+            'rss_inicio_mb': None if self.rss_inicio_mb is None else round(self.rss_inicio_mb, 1),
+            'rss_fim_mb': None if rss_fim is None else round(rss_fim, 1),
+            'linhas_entrada': self.linhas_entrada,
+            'linhas_saida': self.linhas_saida,
+            'bytes_lidos': io_fim['rchar'] - self.io_inicio['rchar'] if io_fim else None,
+            'bytes_gravados': io_fim['wchar'] - self.io_inicio['wchar'] if io_fim else None,
+            'erro': erro,
+        }
+
+
+@contextlib.contextmanager
+def medir_etapa(nome, linhas_entrada=None):
+    # with medir_etapa('nome', len(df)) as m: ...; m.linhas_saida = len(resultado)
+    medicao = Medicao(nome, linhas_entrada)
+    medicao.iniciar()
+    pilha.append(medicao)
+    erro = None
+    try:
+        yield medicao
+    except BaseException as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        pilha.pop()
+        medicao.finalizar(erro)
+
+
+def medir(nome=None):
+    # Decorador: linhas de entrada do primeiro argumento e de saída do retorno
+    def decorador(funcao):
+        # Módulo executado como script aparece pelo nome do arquivo, não como __main__
+        modulo = os.path.splitext(os.path.basename(sys.argv[0]))[0] if funcao.__module__ == '__main__' else funcao.__module__
+        nome_etapa = nome or f'{modulo}.{funcao.__name__}'
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir_etapa(nome_etapa, contar_linhas(args[0]) if args else None) as medicao:
+                resultado = funcao(*args, **kwargs)
+                medicao.linhas_saida = contar_linhas(resultado)
+            return resultado
+        return envolvida
+    return decorador
+
+
+def salvar_perfil(nome, perfil):
+    os.makedirs(DIR_RELATORIOS, exist_ok=True)
+    caminho = os.path.join(DIR_RELATORIOS, f"perfil-{nome.replace('/', '_').replace(' ', '_')}-{datetime.now():%Y%m%d-%H%M%S}.prof")
+    perfil.dump_stats(caminho)
+    print(f'\n=== cProfile de {nome} (salvo em {caminho}) ===')
+    pstats.Stats(perfil).sort_stats('cumulative').print_stats(LINHAS_PERFIL)
+
+
+def salvar_relatorio(script, dir_saida=None):
+    # Grava {script}-{data}.json (metadados + etapas) e .csv (uma linha por etapa); devolve os caminhos
+    dir_saida = dir_saida or DIR_RELATORIOS
+    os.makedirs(dir_saida, exist_ok=True)
+    base = os.path.join(dir_saida, f'{script}-{inicio_execucao:%Y%m%d-%H%M%S}')
+    relatorio = {
+        'script': script,
+        'argv': sys.argv,
+        'inicio': inicio_execucao.isoformat(timespec='seconds'),
+        'fim': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'etapas': registros,
+    }
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=1)
+    pd.DataFrame(registros).to_csv(base + '.csv', index=False, encoding='utf-8')
+    print(f'Relatório de execução salvo em: {base}.json / .csv')
+    return base + '.json', base + '.csv'
@@ -0,0 +1,161 @@
+import os
+import csv
+import codecs
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# ==============================================================================
+# Leitor de CSV compartilhado
+# ==============================================================================
+# Encoding e delimitador são detectados por uma amostra do início do arquivo
+# (utf-8, com ou sem BOM; sem isso cp1252, que cobre o latin-1 dos arquivos da
+# PRF e da ANTT; e latin-1, que decodifica qualquer byte). A leitura completa
+# usa o parser colunar multithread do pyarrow.csv, que transcodifica em blocos
+# enquanto lê. Se a amostra enganar (ex.: um acento latin-1 só no fim de um
+# arquivo que começa em ASCII), o arquivo inteiro é examinado e relido, em vez
+# de o ano ser descartado. Leituras em blocos (chunksize) e parciais (nrows)
+# continuam no pd.read_csv, com o encoding e o delimitador detectados.
+
+TAMANHO_AMOSTRA = 1 << 20
+ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+DELIMITADORES = [';', ',', '\t', '|']
+# Vários arquivos lidos ao mesmo tempo (o pyarrow solta o GIL durante o parsing)
+LEITURAS_PARALELAS = min(8, os.cpu_count() or 1)
+
+# Valores que o read_csv lê como nulos; o pyarrow recebe a mesma lista para dar o mesmo resultado
+VALORES_NULOS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+
+def ler_amostra(caminho, tamanho=TAMANHO_AMOSTRA):
+    with open(caminho, 'rb') as f:
+        return f.read(tamanho)
+
+
+def detectar_encoding(amostra):
+    # Primeiro encoding que decodifica a amostra; um caractere multibyte cortado no fim não conta
+    if amostra.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(amostra, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def detectar_encoding_arquivo(caminho):
+    # Como detectar_encoding, mas sobre o arquivo inteiro, em blocos do tamanho da amostra
+    decodificadores = {e: codecs.getincrementaldecoder(e)() for e in ENCODINGS}
+    with open(caminho, 'rb') as f:
+        if f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+            return 'utf-8-sig'
+        f.seek(0)
+        for bloco in iter(lambda: f.read(TAMANHO_AMOSTRA), b''):
+            for encoding, decodificador in list(decodificadores.items()):
+                try:
+                    decodificador.decode(bloco)
+                except UnicodeDecodeError:
+                    del decodificadores[encoding]
+    return next(iter(decodificadores), ENCODINGS[-1])
+
+
+def detectar_delimitador(texto):
+    # csv.Sniffer sobre as primeiras linhas completas; se ele não decidir, o candidato mais frequente no cabeçalho
+    linhas = texto.splitlines()[:50]
+    try:
+        return csv.Sniffer().sniff('\n'.join(linhas), delimiters=''.join(DELIMITADORES)).delimiter
+    except csv.Error:
+        cabecalho = linhas[0] if linhas else ''
+        return max(DELIMITADORES, key=cabecalho.count)
+
+
+def detectar_formato(caminho, sep=None, encoding=None):
+    # (sep, encoding) do arquivo; valores informados são mantidos
+    amostra = ler_amostra(caminho) if sep is None or encoding is None else b''
+    encoding = encoding or detectar_encoding(amostra)
+    sep = sep or detectar_delimitador(amostra.decode(encoding, errors='replace'))
+    return sep, encoding
+
+
+def ler_colunas(caminho, sep, encoding):
+    return nomes_unicos(ler_cabecalho(caminho, sep, encoding))
+
+
+def ler_cabecalho(caminho, sep, encoding):
+    with open(caminho, 'r', encoding=encoding, newline='') as f:
+        return next(csv.reader(f, delimiter=sep), [])
+
+
+def nomes_unicos(cabecalho):
+    # Nomes repetidos ganham sufixo .1, .2, ... como no read_csv
+    vistos, nomes = {}, []
+    for nome in cabecalho:
+        n = vistos.get(nome, 0)
+        nomes.append(nome if n == 0 else f'{nome}.{n}')
+        vistos[nome] = n + 1
+    return nomes
+
+
+def ler_arrow(caminho, sep, encoding, tipos=None, decimal='.', usecols=None):
+    # tipos: {coluna: tipo arrow}; tipos=None lê tudo como texto. Demais colunas têm o tipo inferido pelo pyarrow.
+    colunas = ler_colunas(caminho, sep, encoding)
+    if tipos is None:
+        tipos = {c: pa.string() for c in colunas}
+    return pacsv.read_csv(
+        caminho,
+        read_options=pacsv.ReadOptions(encoding=encoding.replace('-sig', ''), column_names=colunas, skip_rows=1, use_threads=True),
+        parse_options=pacsv.ParseOptions(delimiter=sep, newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=tipos, null_values=sorted(VALORES_NULOS), strings_can_be_null=True,
+            quoted_strings_can_be_null=True, decimal_point=decimal, include_columns=usecols,
+        ),
+    )
+
+
+def para_pandas(tabela):
+    # Coluna inteiramente vazia (tipo null no arrow) vira float64 de NaN, como no read_csv
+    df = tabela.to_pandas()
+    for nome, tipo in zip(tabela.column_names, tabela.schema.types):
+        if pa.types.is_null(tipo):
+            df[nome] = df[nome].astype('float64')
+    return df
+
+
+def ler_csv(caminho, sep=None, encoding=None, tipos=None, decimal='.', **kwargs):
+    # DataFrame do CSV; sep/encoding None são detectados. Sem tipos tudo vira texto (dtype=str do read_csv).
+    informado = encoding
+    sep, encoding = detectar_formato(caminho, sep, encoding)
+    if set(kwargs) - {'usecols'}:
+        # chunksize, nrows etc.: pandas, que também aceita o mesmo encoding e delimitador.
+        # Em blocos não há como reler depois de um erro: o encoding é conferido no arquivo todo antes.
+        if 'chunksize' in kwargs and informado is None:
+            encoding = detectar_encoding_arquivo(caminho)
+        dtype = str if tipos is None else None
+        return pd.read_csv(caminho, sep=sep, encoding=encoding, dtype=dtype, decimal=decimal, **kwargs)
+    try:
+        tabela = ler_arrow(caminho, sep, encoding, tipos, decimal, kwargs.get('usecols'))
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        # A amostra não representava o arquivo: detecta sobre o arquivo inteiro
+        completo = detectar_encoding_arquivo(caminho)
+        if completo == encoding:
+            raise
+        print(f'Aviso: {os.path.basename(caminho)} não está em {encoding}; relendo como {completo}.')
+        tabela = ler_arrow(caminho, sep, completo, tipos, decimal, kwargs.get('usecols'))
+    return para_pandas(tabela)
+
+
+def ler_varios(caminhos, ler=ler_csv, processos=LEITURAS_PARALELAS):
+    # {caminho: DataFrame ou a exceção da leitura}, lendo os arquivos em paralelo em threads
+    def ler_um(caminho):
+        try:
+            return ler(caminho)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(max_workers=max(1, processos)) as executor:
+        return dict(zip(caminhos, executor.map(ler_um, caminhos)))
@@ -0,0 +1,156 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from servico_risco import normalizar_br
+import instrumentacao
+
+# ==============================================================================
+# Matriz de features por trecho para treino (float32, memory map)
+# ==============================================================================
+# O dataset final também é gravado como matriz binária float32, uma coluna após
+# a outra (coluna j = bytes [j * linhas * 4, (j + 1) * linhas * 4)), com um JSON
+# ao lado com os nomes das colunas, id_trecho e br de cada linha. O carregamento
+# é um np.memmap somente leitura, sem parsing:
+#   - cada coluna é uma visão contígua do arquivo; as colunas não pedidas nem são lidas
+#   - filtros de linha (BRs, faixas de valores) leem só as colunas filtradas; se as
+#     linhas escolhidas forem contíguas (uma BR, por exemplo) o resultado continua
+#     sendo visão do arquivo, senão só as linhas e colunas pedidas são copiadas
+# As linhas seguem a ordem do CSV. Valores float32 são exatos para contagens até
+# 2^24; as proporções e distâncias perdem os dígitos além do 7º significativo.
+#
+#   python matriz_ml.py --csv dataset_final_para_ml.csv
+#   python matriz_ml.py --colunas trecho_risco_total,tem_radar --br 381
+
+ARQUIVO_MATRIZ = 'dataset_final_para_ml.f32'
+ARQUIVO_ESQUEMA_MATRIZ = 'dataset_final_para_ml.json'
+COLUNAS_IDENTIFICACAO = ['id_trecho', 'br']
+VERSAO = 1
+
+
+# ==============================================================================
+# Exportação
+# ==============================================================================
+@instrumentacao.medir()
+def exportar_matriz(df_trechos, caminho=ARQUIVO_MATRIZ, caminho_esquema=ARQUIVO_ESQUEMA_MATRIZ):
+    colunas = [c for c in df_trechos.columns if c not in COLUNAS_IDENTIFICACAO]
+    nao_numericas = [c for c in colunas if not (pd.api.types.is_numeric_dtype(df_trechos[c]) or pd.api.types.is_bool_dtype(df_trechos[c]))]
+    if nao_numericas:
+        raise ValueError(f'colunas não numéricas no dataset: {nao_numericas}')
+    temporario = caminho + '.tmp'
+    if len(df_trechos) and colunas:
+        matriz = np.memmap(temporario, dtype=np.float32, mode='w+', shape=(len(colunas), len(df_trechos)))
+        for j, col in enumerate(colunas):
+            matriz[j] = df_trechos[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        matriz.flush()
+        del matriz
+    else:
+        open(temporario, 'wb').close()
+    esquema = {
+        'versao': VERSAO,
+        'arquivo': os.path.basename(caminho),
+        'dtype': 'float32',
+        'layout': 'colunas',
+        'linhas': len(df_trechos),
+        'colunas': colunas,
+        'id_trecho': df_trechos['id_trecho'].astype(str).tolist(),
+        'br': df_trechos['br'].map(normalizar_br).tolist(),
+    }
+    # O JSON só é substituído depois da matriz: um esquema publicado sempre descreve um arquivo completo
+    os.replace(temporario, caminho)
+    with open(caminho_esquema + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(esquema, f, ensure_ascii=False)
+    os.replace(caminho_esquema + '.tmp', caminho_esquema)
+    return caminho_esquema
+
+
+# ==============================================================================
+# Carregamento
+# ==============================================================================
+class MatrizML:
+    def __init__(self, caminho_esquema=ARQUIVO_ESQUEMA_MATRIZ):
+        with open(caminho_esquema, 'r', encoding='utf-8') as f:
+            esquema = json.load(f)
+        if esquema.get('versao') != VERSAO or esquema.get('layout') != 'colunas':
+            raise ValueError(f'{caminho_esquema}: formato não suportado (versão {esquema.get("versao")})')
+        self.colunas = esquema['colunas']
+        self.posicao = {c: j for j, c in enumerate(self.colunas)}
+        self.id_trecho = np.array(esquema['id_trecho'], dtype=object)
+        self.br = np.array(esquema['br'], dtype=object)
+        caminho = os.path.join(os.path.dirname(os.path.abspath(caminho_esquema)), esquema['arquivo'])
+        forma = (len(self.colunas), esquema['linhas'])
+        tamanho = forma[0] * forma[1] * np.dtype(np.float32).itemsize
+        if os.path.getsize(caminho) != tamanho:
+            raise ValueError(f'{caminho}: {os.path.getsize(caminho)} bytes, esperados {tamanho} pelo esquema')
+        # np.memmap não aceita arquivo vazio
+        self.valores = np.memmap(caminho, dtype=np.float32, mode='r', shape=forma) if tamanho else np.zeros(forma, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.id_trecho)
+
+    def coluna(self, nome):
+        if nome not in self.posicao:
+            raise KeyError(f'coluna desconhecida: {nome}')
+        return self.valores[self.posicao[nome]]
+
+    def selecionar_linhas(self, brs=None, filtro=None):
+        # slice quando as linhas escolhidas são contíguas, senão array de posições.
+        # filtro: {coluna: (mínimo, máximo)}, limites inclusivos, None para faixa aberta
+        mascara = np.ones(len(self), dtype=bool)
+        if brs is not None:
+            mascara &= np.isin(self.br, [normalizar_br(b) for b in brs])
+        for nome, (minimo, maximo) in (filtro or {}).items():
+            valores = self.coluna(nome)
+            if minimo is not None:
+                mascara &= valores >= minimo
+            if maximo is not None:
+                mascara &= valores <= maximo
+        posicoes = np.flatnonzero(mascara)
+        if len(posicoes) == 0:
+            return slice(0, 0)
+        if posicoes[-1] - posicoes[0] + 1 == len(posicoes):
+            return slice(int(posicoes[0]), int(posicoes[-1]) + 1)
+        return posicoes
+
+    def numpy(self, colunas=None, brs=None, filtro=None):
+        # Matriz (linhas, colunas); visão do arquivo quando as linhas são contíguas e as
+        # colunas pedidas são vizinhas no arquivo (na ordem do esquema), senão cópia só do pedido
+        linhas = self.selecionar_linhas(brs, filtro)
+        indices = np.arange(len(self.colunas)) if colunas is None else np.array([self.posicao[c] for c in colunas], dtype=np.int64)
+        if len(indices) and np.array_equal(indices, np.arange(indices[0], indices[0] + len(indices))):
+            indices = slice(int(indices[0]), int(indices[0]) + len(indices))
+        if isinstance(indices, slice) or isinstance(linhas, slice):
+            bloco = self.valores[indices, linhas]
+        else:
+            bloco = self.valores[np.ix_(indices, linhas)]
+        return bloco.T
+
+    def pandas(self, colunas=None, brs=None, filtro=None):
+        # DataFrame indexado por (br, id_trecho); com linhas contíguas cada coluna é visão do arquivo
+        linhas = self.selecionar_linhas(brs, filtro)
+        indice = pd.MultiIndex.from_arrays([self.br[linhas], self.id_trecho[linhas]], names=COLUNAS_IDENTIFICACAO[::-1])
+        return pd.DataFrame({c: self.coluna(c)[linhas] for c in (self.colunas if colunas is None else colunas)}, index=indice, copy=False)
+
+
+def carregar_matriz(caminho_esquema=ARQUIVO_ESQUEMA_MATRIZ, colunas=None, brs=None, filtro=None):
+    return MatrizML(caminho_esquema).pandas(colunas, brs, filtro)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta ou consulta a matriz float32 do dataset final por trecho.')
+    parser.add_argument('--csv', help='regrava a matriz a partir deste CSV do dataset final')
+    parser.add_argument('--esquema', default=ARQUIVO_ESQUEMA_MATRIZ, help='JSON da matriz')
+    parser.add_argument('--colunas', help='colunas a exibir, separadas por vírgula')
+    parser.add_argument('--br', nargs='*', help='só os trechos destas BRs')
+    args = parser.parse_args()
+
+    if args.csv:
+        df = pd.read_csv(args.csv, dtype={'id_trecho': str, 'br': str}, encoding='utf-8')
+        exportar_matriz(df, os.path.splitext(args.esquema)[0] + '.f32', args.esquema)
+        print(f'{len(df)} trechos exportados para: {args.esquema}')
+    matriz = MatrizML(args.esquema)
+    df = matriz.pandas(args.colunas.split(',') if args.colunas else None, args.br)
+    print(f'{len(matriz)} trechos x {len(matriz.colunas)} colunas; {len(df)} selecionados')
+    print(df.head(10).to_string())
+    instrumentacao.salvar_relatorio('matriz_ml')
@@ -1,38 +1,19 @@
 import pandas as pd
+import numpy as np
 import os
-from difflib import get_close_matches
+import json
+import hashlib
+import inspect
+from functools import partial
+from indice_fuzzy import IndiceFuzzy
+from esquema import valores_validos, ler_texto
+import instrumentacao
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 arquivo_entrada = os.path.join(BASE_DIR, 'acidentes_MG.csv')
 
-df = pd.read_csv(arquivo_entrada, encoding='utf-8', dtype=str)
-
-# Dicionários de valores válidos para padronização
-valores_validos = {
-    'classificacao_acidente': [
-        'Com Vítimas Feridas', 'Com Vítimas Fatais', 'Sem Vítimas',
-        'Com Vítimas', 'Sem Vítima', 'Com Vítima', 'Com Vítimas Leves', 'Com Vítimas Graves'
-    ],
-    'causa_acidente': [
-        'Falta de atenção', 'Velocidade incompatível', 'Animais na Pista', 'Desobediência à sinalização',
-        'Defeito mecânico no veículo', 'Dormiu ao volante', 'Agressão Externa', 'Mal súbito',
-        'Defeito na via', 'Ingestão de álcool', 'Ingestão de substância psicoativa', 'Outras'
-    ],
-    'condicao_metereologica': [
-        'Ceu Claro', 'Chuva', 'Nublado', 'Nevoeiro/neblina/fumaça', 'Granizo', 'Vento forte', 'Neve', 'Outros'
-    ],
-    'tipo_acidente': [
-        'Colisão frontal', 'Colisão traseira', 'Colisão lateral', 'Colisão transversal', 'Atropelamento de animal',
-        'Atropelamento de pessoa', 'Capotamento', 'Tombamento', 'Queda de ocupante de veículo', 'Saída de pista',
-        'Incêndio', 'Danos eventuais', 'Engavetamento', 'Outros', 'Colisão'
-    ],
-    'tipo_pista': ['Dupla', 'Simples', 'Múltipla', 'Outros'],
-    'tracado_via': ['Reta', 'Curva', 'Desvio temporário', 'Outros'],
-    'sentido_via': ['Crescente', 'Decrescente', 'Duplo', 'Outros'],
-    'fase_dia': ['Pleno dia', 'Plena noite', 'Amanhecer', 'Anoitecer', 'Outros'],
-    'dia_semana': ['Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado'],
-    'uf': ['MG'],
-}
+# Tabelas valor bruto -> valor padronizado, reaproveitadas entre execuções
+arquivo_tabelas = os.path.join(BASE_DIR, 'tabelas_padronizacao.json')
 
 # Mapeamentos manuais para aproximações comuns
 mapeamentos = {
@@ -56,6 +37,16 @@ mapeamentos = {
     # Adicione outros mapeamentos se necessário
 }
 
+# Índices de similaridade construídos uma vez por lista de referência e
+# compartilhados por todas as padronizações que usam a mesma lista
+indices_fuzzy = {}
+
+def indice_para(validos, cutoff=0.85):
+    chave = (tuple(validos), cutoff)
+    if chave not in indices_fuzzy:
+        indices_fuzzy[chave] = IndiceFuzzy(validos, cutoff=cutoff)
+    return indices_fuzzy[chave]
+
 def padronizar_dia_semana(val):
     if pd.isnull(val):
         return val
@@ -88,9 +79,9 @@ def padronizar_condicao(val):
     if 'nevoeiro' in v:
         return 'Outros'
     # Similaridade alta
-    match = get_close_matches(val, valores_validos['condicao_metereologica'], n=1, cutoff=0.85)
-    if match:
-        return match[0]
+    match = indice_para(valores_validos['condicao_metereologica']).buscar(val)
+    if match is not None:
+        return match
     return val
 
 def padronizar_tipo_acidente(val):
@@ -107,13 +98,13 @@ def padronizar_tipo_acidente(val):
         return 'Tombamento'
     if 'colisão' in v:
         # Se não for uma das colisões válidas, vira 'Colisão'
-        match = get_close_matches(val, [x for x in valores_validos['tipo_acidente'] if 'Colisão' in x], n=1, cutoff=0.85)
-        if not match:
+        match = indice_para([x for x in valores_validos['tipo_acidente'] if 'Colisão' in x]).buscar(val)
+        if match is None:
             return 'Colisão'
     # Similaridade alta
-    match = get_close_matches(val, valores_validos['tipo_acidente'], n=1, cutoff=0.85)
-    if match:
-        return match[0]
+    match = indice_para(valores_validos['tipo_acidente']).buscar(val)
+    if match is not None:
+        return match
     return 'Outros'
 
 def padronizar_valor(val, validos, mapeamento=None, cutoff=0.85):
@@ -131,47 +122,104 @@ def padronizar_valor(val, validos, mapeamento=None, cutoff=0.85):
             if k in v_lower:
                 return mapeamento[k]
     # Similaridade alta
-    match = get_close_matches(v, validos, n=1, cutoff=cutoff)
-    if match:
-        return match[0]
+    match = indice_para(validos, cutoff).buscar(v)
+    if match is not None:
+        return match
     return v  # Mantém valor original se não for próximo
 
-for col in df.columns:
-    if col == 'dia_semana':
-        print(f'Padronizando coluna: {col}')
-        df[col] = df[col].apply(padronizar_dia_semana)
-    elif col == 'condicao_metereologica':
-        print(f'Padronizando coluna: {col}')
-        df[col] = df[col].apply(padronizar_condicao)
-    elif col == 'tipo_acidente':
-        print(f'Padronizando coluna: {col}')
-        df[col] = df[col].apply(padronizar_tipo_acidente)
-    elif col == 'causa_acidente':
-        print(f'Padronizando coluna: {col}')
-        df[col] = df[col].apply(lambda x: padronizar_valor(x, valores_validos[col], mapeamentos.get(col)))
-    elif col in valores_validos:
-        print(f'Padronizando coluna: {col}')
-        df[col] = df[col].apply(lambda x: padronizar_valor(x, valores_validos[col], mapeamentos.get(col)))
-    else:
-        # Para todas as demais colunas categóricas, padronizar ignorado/ignorada para Outros
-        df[col] = df[col].apply(lambda x: 'Outros' if isinstance(x, str) and x.strip().lower() in ['ignorado', 'ignorada'] else x)
-
-# Padronização semântica dos nomes dos municípios
-if 'municipio' in df.columns:
-    print('Padronizando nomes dos municípios por similaridade...')
-    municipios_unicos = sorted(df['municipio'].dropna().unique())
-    # Usa a própria lista como referência de válidos (poderia ser uma lista externa oficial)
-    municipios_validos = municipios_unicos.copy()
-    def padronizar_municipio(val):
-        if pd.isnull(val) or val.strip() == '':
-            return val
-        match = get_close_matches(val, municipios_validos, n=1, cutoff=0.85)
-        if match:
-            return match[0]
-        return val
-    df['municipio'] = df['municipio'].apply(padronizar_municipio)
-    print('Padronização de municípios concluída.')
+# ==============================================================================
+# Padronização sobre valores distintos
+# ==============================================================================
+# Cada coluna tem poucas dezenas de valores brutos distintos em centenas de
+# milhares de linhas: a função de padronização roda uma vez por valor distinto
+# e o resultado volta para as linhas com um único take sobre os códigos.
+def carregar_tabelas():
+    if os.path.exists(arquivo_tabelas):
+        with open(arquivo_tabelas, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def salvar_tabelas(tabelas):
+    with open(arquivo_tabelas, 'w', encoding='utf-8') as f:
+        json.dump(tabelas, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+# Assinatura das regras de uma coluna: se o código da função, a lista de
+# válidos ou o mapeamento manual mudarem, a tabela salva é descartada
+def assinatura_regras(funcao, col):
+    conteudo = json.dumps([inspect.getsource(getattr(funcao, 'func', funcao)), valores_validos.get(col), mapeamentos.get(col)], ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+def aplicar_tabela(serie, funcao, tabela):
+    codigos, unicos = pd.factorize(serie)
+    novos = [v for v in unicos if v not in tabela]
+    for v in novos:
+        tabela[v] = funcao(v)
+    padronizados = np.array([tabela[v] for v in unicos] + [np.nan], dtype=object)
+    return pd.Series(padronizados[codigos], index=serie.index, dtype=object), len(novos)
+
+def padronizar_coluna(serie, col, funcao, tabelas):
+    assinatura = assinatura_regras(funcao, col)
+    registro = tabelas.get(col)
+    if registro is None or registro['assinatura'] != assinatura:
+        registro = {'assinatura': assinatura, 'tabela': {}}
+        tabelas[col] = registro
+    serie, novos = aplicar_tabela(serie, funcao, registro['tabela'])
+    print(f'Padronizando coluna: {col} ({novos} valores novos, {len(registro["tabela"])} na tabela)')
+    return serie
+
+def padronizar_ignorado(serie):
+    codigos, unicos = pd.factorize(serie)
+    ignorado = pd.Series(unicos, dtype=object).str.strip().str.lower().isin(['ignorado', 'ignorada'])
+    padronizados = np.append(np.where(ignorado, 'Outros', unicos).astype(object), np.nan)
+    return pd.Series(padronizados[codigos], index=serie.index, dtype=object)
+
+def mapear_municipios(municipios_unicos, municipios_validos):
+    indice_municipios = IndiceFuzzy(municipios_validos, cutoff=0.85)
+    # Consulta em lote dos valores distintos; vazios e sem correspondência ficam como estão
+    consultas = [v for v in municipios_unicos if v.strip() != '']
+    return {v: m if m is not None else v for v, m in zip(consultas, indice_municipios.buscar_lote(consultas))}
+
+@instrumentacao.medir()
+def padronizar_categorias(df, municipios_validos=None):
+    # municipios_validos: lista de referência dos municípios; por padrão, os da própria base
+    df = df.copy()
+    tabelas = carregar_tabelas()
+    for col in df.columns:
+        if col == 'dia_semana':
+            df[col] = padronizar_coluna(df[col], col, padronizar_dia_semana, tabelas)
+        elif col == 'condicao_metereologica':
+            df[col] = padronizar_coluna(df[col], col, padronizar_condicao, tabelas)
+        elif col == 'tipo_acidente':
+            df[col] = padronizar_coluna(df[col], col, padronizar_tipo_acidente, tabelas)
+        elif col in valores_validos:
+            funcao = partial(padronizar_valor, validos=valores_validos[col], mapeamento=mapeamentos.get(col))
+            df[col] = padronizar_coluna(df[col], col, funcao, tabelas)
+        else:
+            # Para todas as demais colunas categóricas, padronizar ignorado/ignorada para Outros
+            df[col] = padronizar_ignorado(df[col])
+    salvar_tabelas(tabelas)
+
+    # Padronização semântica dos nomes dos municípios
+    if 'municipio' in df.columns:
+        with instrumentacao.medir_etapa('municipios', len(df)):
+            print('Padronizando nomes dos municípios por similaridade...')
+            municipios_unicos = sorted(df['municipio'].dropna().unique())
+            # Usa a própria lista como referência de válidos (poderia ser uma lista externa oficial)
+            if municipios_validos is None:
+                municipios_validos = municipios_unicos.copy()
+            tabela_municipios = mapear_municipios(municipios_unicos, municipios_validos)
+            df['municipio'], _ = aplicar_tabela(df['municipio'], lambda v: v, tabela_municipios)
+            print('Padronização de municípios concluída.')
+    return df
+
+if __name__ == '__main__':
+    with instrumentacao.medir_etapa('leitura') as medicao:
+        df = ler_texto(arquivo_entrada)
+        medicao.linhas_saida = len(df)
+    df = padronizar_categorias(df)
 
-print(f'Salvando arquivo padronizado em: {arquivo_entrada}')
-df.to_csv(arquivo_entrada, index=False, encoding='utf-8')
-print('Concluído!') 
\ No newline at end of file
+    print(f'Salvando arquivo padronizado em: {arquivo_entrada}')
+    with instrumentacao.medir_etapa('gravacao', len(df)):
+        df.to_csv(arquivo_entrada, index=False, encoding='utf-8')
+    instrumentacao.salvar_relatorio('padronizar_categorias_mg')
+    print('Concluído!') 
\ No newline at end of file
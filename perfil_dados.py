@@ -0,0 +1,221 @@
+import os
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from esquema import valores_validos, ler_texto
+import instrumentacao
+
+# ==============================================================================
+# Perfil de dados em uma passada, com memória limitada
+# ==============================================================================
+# O arquivo é lido em blocos, em modo texto, e cada coluna mantém:
+#   nulos              contagem exata de valores ausentes
+#   contagens          contagem exata por valor enquanto a coluna tiver até
+#                      CAPACIDADE_CONTAGENS valores distintos; acima disso vira um
+#                      resumo Misra-Gries com a mesma capacidade (contagens por baixo,
+#                      com erro máximo registrado), de onde sai o top-k
+#   distintos          HyperLogLog (2^P_HLL registradores) sobre o hash de cada valor
+#   inválidos          para as colunas de valores_validos: valores fora da lista
+#                      (sem diferenciar maiúsculas), com o próprio resumo dos valores
+# O relatório JSON de dois arquivos (ex.: duas versões anuais) é comparado com --comparar.
+#
+#   python perfil_dados.py acidentes_2007_2025.csv
+#   python perfil_dados.py datatran2025/datatran2025.csv --comparar perfil_datatran2024.json
+
+TAMANHO_CHUNK = 200_000
+CAPACIDADE_CONTAGENS = 1000
+TOP_K = 20
+# Colunas com até este número de valores distintos têm todas as contagens no relatório
+MAX_CONTAGENS_RELATORIO = 100
+P_HLL = 14
+
+
+# ==============================================================================
+# Resumos
+# ==============================================================================
+class HyperLogLog:
+    def __init__(self, p=P_HLL, registradores=None):
+        self.p = p
+        self.registradores = np.zeros(1 << p, dtype=np.uint8) if registradores is None else registradores
+
+    def adicionar(self, valores):
+        if len(valores) == 0:
+            return
+        h = pd.util.hash_array(np.asarray(valores, dtype=object))
+        indice = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        # Posição do primeiro bit 1 nos 64 - p bits restantes (cabem exatos num float64)
+        resto = (h & np.uint64((1 << (64 - self.p)) - 1)).astype(np.float64)
+        _, expoente = np.frexp(resto)
+        posicao = (64 - self.p - expoente + 1).astype(np.uint8)
+        np.maximum.at(self.registradores, indice, posicao)
+
+    def estimar(self):
+        m = len(self.registradores)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimativa = alfa * m * m / np.sum(np.ldexp(1.0, -self.registradores.astype(np.int64)))
+        zeros = np.count_nonzero(self.registradores == 0)
+        if estimativa <= 2.5 * m and zeros:
+            # Correção para cardinalidades pequenas (contagem linear)
+            estimativa = m * np.log(m / zeros)
+        return int(round(estimativa))
+
+
+class Contagens:
+    # Contagem exata por valor até a capacidade; depois, resumo Misra-Gries
+    def __init__(self, capacidade=CAPACIDADE_CONTAGENS):
+        self.capacidade = capacidade
+        self.contagens = pd.Series(dtype=np.int64)
+        self.exato = True
+        self.erro_max = 0
+
+    def adicionar(self, contagens_bloco):
+        contagens = self.contagens.add(contagens_bloco, fill_value=0).astype(np.int64)
+        if len(contagens) > self.capacidade:
+            # Desconta de todos a (capacidade + 1)-ésima maior contagem e descarta os que zeram
+            corte = contagens.nlargest(self.capacidade + 1).iloc[-1]
+            contagens = contagens[contagens > corte] - corte
+            self.exato = False
+            self.erro_max += int(corte)
+        self.contagens = contagens
+
+    def top(self, k=TOP_K):
+        return [[str(v), int(c)] for v, c in self.contagens.sort_values(ascending=False, kind='stable').head(k).items()]
+
+
+class PerfilColuna:
+    def __init__(self, nome):
+        self.nome = nome
+        self.linhas = 0
+        self.nulos = 0
+        self.contagens = Contagens()
+        self.hll = HyperLogLog()
+        self.validos = {v.lower() for v in valores_validos[nome]} if nome in valores_validos else None
+        self.invalidos = 0
+        self.contagens_invalidos = Contagens()
+
+    def adicionar(self, serie):
+        self.linhas += len(serie)
+        contagens_bloco = serie.value_counts(dropna=True)
+        self.nulos += len(serie) - int(contagens_bloco.sum())
+        self.contagens.adicionar(contagens_bloco)
+        # Os valores distintos do bloco bastam para o HyperLogLog
+        self.hll.adicionar(contagens_bloco.index.to_numpy())
+        if self.validos is not None:
+            invalido = ~contagens_bloco.index.str.lower().isin(self.validos)
+            self.invalidos += int(contagens_bloco[invalido].sum())
+            self.contagens_invalidos.adicionar(contagens_bloco[invalido])
+
+    def relatorio(self):
+        preenchidos = self.linhas - self.nulos
+        exato = self.contagens.exato
+        r = {
+            'nulos': self.nulos,
+            'taxa_nulos': self.nulos / self.linhas if self.linhas else 0.0,
+            'distintos': len(self.contagens.contagens) if exato else None,
+            'distintos_estimados': self.hll.estimar(),
+            'contagens_exatas': exato,
+            'erro_max_contagem': self.contagens.erro_max,
+            'top': self.contagens.top(),
+        }
+        if exato and len(self.contagens.contagens) <= MAX_CONTAGENS_RELATORIO:
+            r['contagens'] = dict(self.contagens.top(MAX_CONTAGENS_RELATORIO))
+        if self.validos is not None:
+            r['invalidos'] = self.invalidos
+            r['taxa_invalidos'] = self.invalidos / preenchidos if preenchidos else 0.0
+            # Todos os valores inválidos do resumo (no máximo CAPACIDADE_CONTAGENS); a lista
+            # só fica incompleta se o resumo deixou de ser exato
+            r['valores_invalidos'] = self.contagens_invalidos.top(len(self.contagens_invalidos.contagens))
+            r['valores_invalidos_exatos'] = self.contagens_invalidos.exato
+        return r
+
+
+# ==============================================================================
+# Perfil de um arquivo e comparação
+# ==============================================================================
+@instrumentacao.medir()
+def perfilar(caminho, tamanho_chunk=TAMANHO_CHUNK):
+    colunas = {}
+    linhas = 0
+    for chunk in ler_texto(caminho, chunksize=tamanho_chunk):
+        linhas += len(chunk)
+        for col in chunk.columns:
+            if col not in colunas:
+                colunas[col] = PerfilColuna(col)
+            colunas[col].adicionar(chunk[col])
+        print(f'  {linhas} linhas perfiladas...')
+    return {
+        'arquivo': os.path.abspath(caminho),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'linhas': linhas,
+        'colunas': {col: perfil.relatorio() for col, perfil in colunas.items()},
+    }
+
+
+def salvar_perfil(perfil, caminho):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(perfil, f, ensure_ascii=False, indent=1)
+
+
+def carregar_perfil(caminho):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def valores_conhecidos(perfil_coluna):
+    # Todos os valores quando as contagens vêm completas; senão, só os do top
+    return set(perfil_coluna.get('contagens') or dict(perfil_coluna['top']))
+
+
+def comparar(anterior, atual):
+    # Uma linha por coluna dos dois perfis, com as taxas e cardinalidades lado a lado
+    linhas = []
+    for col in list(anterior['colunas']) + [c for c in atual['colunas'] if c not in anterior['colunas']]:
+        a, b = anterior['colunas'].get(col), atual['colunas'].get(col)
+        linha = {'coluna': col, 'situacao': 'removida' if b is None else 'nova' if a is None else ''}
+        for sufixo, p in (('anterior', a), ('atual', b)):
+            linha[f'taxa_nulos_{sufixo}'] = p['taxa_nulos'] if p else np.nan
+            linha[f'distintos_{sufixo}'] = (p['distintos'] if p['distintos'] is not None else p['distintos_estimados']) if p else np.nan
+            linha[f'taxa_invalidos_{sufixo}'] = p.get('taxa_invalidos', np.nan) if p else np.nan
+        if a and b:
+            conhecidos_a, conhecidos_b = valores_conhecidos(a), valores_conhecidos(b)
+            # Valores novos só são afirmados quando o perfil anterior tem todas as contagens
+            linha['valores_novos'] = sorted(conhecidos_b - conhecidos_a) if 'contagens' in a else []
+            linha['valores_ausentes'] = sorted(conhecidos_a - conhecidos_b) if 'contagens' in b else []
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
+
+
+def exibir_perfil(perfil):
+    print(f"\n=== Perfil de {perfil['arquivo']} ({perfil['linhas']} linhas) ===")
+    resumo = pd.DataFrame({
+        col: {
+            'nulos_%': 100 * p['taxa_nulos'],
+            'distintos': p['distintos'] if p['distintos'] is not None else f"~{p['distintos_estimados']}",
+            'invalidos_%': 100 * p['taxa_invalidos'] if 'taxa_invalidos' in p else '',
+            'mais_frequente': p['top'][0][0] if p['top'] else '',
+        }
+        for col, p in perfil['colunas'].items()
+    }).T
+    print(resumo.to_string())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Perfil de um arquivo no esquema datatran, em uma passada e com memória limitada.')
+    parser.add_argument('arquivo')
+    parser.add_argument('--saida', help='relatório JSON (padrão: perfil_<arquivo>.json)')
+    parser.add_argument('--comparar', metavar='PERFIL_JSON', help='perfil anterior para comparar com este')
+    parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK, help='linhas por bloco')
+    args = parser.parse_args()
+
+    perfil = perfilar(args.arquivo, args.chunk)
+    saida = args.saida or f'perfil_{os.path.splitext(os.path.basename(args.arquivo))[0]}.json'
+    salvar_perfil(perfil, saida)
+    exibir_perfil(perfil)
+    print(f'\nPerfil salvo em: {saida}')
+    if args.comparar:
+        diferencas = comparar(carregar_perfil(args.comparar), perfil)
+        print(f'\n=== Comparação com {args.comparar} ===')
+        print(diferencas.round(4).to_string(index=False))
+    instrumentacao.salvar_relatorio('perfil_dados')
@@ -0,0 +1,333 @@
+import os
+import sys
+import copy
+import json
+import glob
+import hashlib
+import inspect
+import argparse
+import pandas as pd
+
+import pre_processamento
+import separar_uf_mg
+import valores_faltantes
+import padronizar_categorias_mg
+import pre_processa_acidentes_MG
+import analise_trechos
+import matriz_ml
+import esquema
+import leitura
+import instrumentacao
+
+# ==============================================================================
+# Execução do pipeline completo como um DAG de etapas com cache
+# ==============================================================================
+# Cada etapa tem uma chave sha256 calculada a partir do código dos módulos que
+# ela usa, dos seus parâmetros, das chaves das etapas de que depende e do
+# conteúdo dos arquivos externos que lê. A saída fica em .cache_pipeline/ como
+# Parquet com a chave no nome: se nada mudou a etapa não roda, e dentro da mesma
+# execução os DataFrames passam de uma etapa para a outra em memória.
+#
+#   python pipeline.py                                # até o dataset final
+#   python pipeline.py --param gap_threshold_km=0.3   # só a análise de trechos roda de novo
+#   python pipeline.py --ate padronizacao --forcar valores_faltantes
+#   python pipeline.py --listar
+#   python pipeline.py --incremental                  # só os anos novos de datatran (ver incremental.py)
+#   python pipeline.py --varrer 0.1 0.2 0.5           # compara limiares de gap da segmentação
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_CACHE = os.path.join(BASE_DIR, '.cache_pipeline')
+ARQUIVO_HASHES = os.path.join(DIR_CACHE, 'hashes_arquivos.json')
+ARQUIVO_ULTIMA_EXECUCAO = 'ultima_execucao.json'
+# Versões guardadas por etapa (as mais recentes), para alternar parâmetros sem recalcular
+MAX_VERSOES_CACHE = 3
+
+# Valores que a leitura de CSV trata como nulos: as etapas de texto trocavam dados
+# por CSV, então a passagem em memória aplica a mesma regra para dar o mesmo resultado
+VALORES_NULOS_CSV = leitura.VALORES_NULOS
+
+
+def normalizar_texto(df):
+    # Marcadores de ausência viram nulos, como na releitura do CSV intermediário
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].where(~df[col].isin(VALORES_NULOS_CSV))
+    return df
+
+
+def inferir_tipos(df):
+    # Colunas do esquema ganham os tipos compactos, como em esquema.ler_tipado na
+    # entrada de pre_processa_acidentes_MG; as demais colunas de texto cujos
+    # valores são todos numéricos viram números, como o read_csv faria
+    df = esquema.aplicar_esquema(df)
+    for col in df.columns:
+        if col not in esquema.ESQUEMA_DATATRAN and (df[col].dtype == object or pd.api.types.is_string_dtype(df[col])):
+            convertido = pd.to_numeric(df[col], errors='coerce')
+            if convertido.notna().sum() == df[col].notna().sum():
+                df[col] = convertido
+    return df
+
+
+# ==============================================================================
+# Etapas
+# ==============================================================================
+def etapa_consolidacao(anos):
+    df = pre_processamento.consolidar_anos(anos)
+    if df is None:
+        raise Exception('Nenhum arquivo datatran encontrado para consolidar!')
+    return normalizar_texto(df)
+
+
+def etapa_separacao_uf(df, uf):
+    return normalizar_texto(separar_uf_mg.filtrar_uf(df, uf))
+
+
+def etapa_valores_faltantes(df, colunas_numericas=None):
+    return normalizar_texto(valores_faltantes.tratar_valores_faltantes(df, colunas_numericas))
+
+
+def etapa_padronizacao(df, municipios_validos=None):
+    return normalizar_texto(padronizar_categorias_mg.padronizar_categorias(df, municipios_validos))
+
+
+def etapa_pre_processamento_ml(df):
+    return pre_processa_acidentes_MG.pre_processar(inferir_tipos(df))
+
+
+def etapa_analise_trechos(df, **parametros):
+    return analise_trechos.gerar_dataset_trechos(df, analise_trechos.carregar_radares(), **parametros)
+
+
+def arquivos_datatran(parametros):
+    return [pre_processamento.caminho_ano(ano) for ano in parametros['anos']]
+
+
+class Etapa:
+    def __init__(self, nome, funcao, dependencias=(), modulos=(), parametros=None, arquivos=None):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = list(dependencias)
+        self.modulos = list(modulos)
+        self.parametros = dict(parametros or {})
+        # Função (dos parâmetros) que lista os arquivos externos lidos pela etapa
+        self.arquivos = arquivos or (lambda parametros: [])
+
+
+ETAPAS = [
+    Etapa('consolidacao', etapa_consolidacao, modulos=['pre_processamento.py', 'esquema.py', 'leitura.py'], parametros={'anos': pre_processamento.anos_disponiveis()}, arquivos=arquivos_datatran),
+    Etapa('separacao_uf', etapa_separacao_uf, ['consolidacao'], ['separar_uf_mg.py'], {'uf': 'MG'}),
+    Etapa('valores_faltantes', etapa_valores_faltantes, ['separacao_uf'], ['valores_faltantes.py']),
+    Etapa('padronizacao', etapa_padronizacao, ['valores_faltantes'], ['padronizar_categorias_mg.py', 'indice_fuzzy.py', 'esquema.py']),
+    Etapa(
+        'pre_processamento_ml', etapa_pre_processamento_ml, ['padronizacao'],
+        ['pre_processa_acidentes_MG.py', 'codificacao.py', 'indice_km_coordenadas.py', 'indice_geografico.py', 'indices_rodovia.py', 'esquema.py'],
+    ),
+    Etapa(
+        'analise_trechos', etapa_analise_trechos, ['pre_processamento_ml'],
+        ['analise_trechos.py', 'cubo_trechos.py', 'indices_rodovia.py', 'indice_geografico.py', 'esquema.py', 'leitura.py'],
+        {
+            'gap_threshold_km': analise_trechos.GAP_THRESHOLD_KM,
+            'tolerancia_snap_radar_km': analise_trechos.TOLERANCIA_SNAP_RADAR_KM,
+            'k_radares_proximos': analise_trechos.K_RADARES_PROXIMOS,
+            'raio_radares_km': analise_trechos.RAIO_RADARES_KM,
+            'raio_radares_geo_km': analise_trechos.RAIO_RADARES_GEO_KM,
+            'dist_max_radar_geo_km': analise_trechos.DIST_MAX_RADAR_GEO_KM,
+            'features_janela_12m': analise_trechos.FEATURES_JANELA_12M,
+        },
+        lambda parametros: [analise_trechos.ARQUIVO_RADARES],
+    ),
+]
+
+
+# ==============================================================================
+# Chaves e cache
+# ==============================================================================
+class Pipeline:
+    def __init__(self, etapas=ETAPAS, dir_cache=DIR_CACHE, parametros=None):
+        # Cópias das etapas: cada instância pode ter os próprios parâmetros
+        self.etapas = {}
+        for e in etapas:
+            self.etapas[e.nome] = copy.copy(e)
+            self.etapas[e.nome].parametros = dict(e.parametros)
+        self.dir_cache = dir_cache
+        self.arquivo_hashes = os.path.join(dir_cache, os.path.basename(ARQUIVO_HASHES))
+        # sha256 de arquivos lidos, reaproveitado enquanto tamanho e data de modificação não mudam
+        self.hashes = {}
+        if os.path.exists(self.arquivo_hashes):
+            with open(self.arquivo_hashes, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f)
+        self.chaves = {}
+        self.definir_parametros(parametros or {})
+
+    def hash_arquivo(self, caminho):
+        caminho = os.path.abspath(caminho)
+        info = os.stat(caminho)
+        assinatura = [info.st_size, info.st_mtime_ns]
+        registro = self.hashes.get(caminho)
+        if registro is None or registro['assinatura'] != assinatura:
+            h = hashlib.sha256()
+            with open(caminho, 'rb') as f:
+                for bloco in iter(lambda: f.read(1 << 20), b''):
+                    h.update(bloco)
+            registro = {'assinatura': assinatura, 'sha256': h.hexdigest()}
+            self.hashes[caminho] = registro
+        return registro['sha256']
+
+    def salvar_hashes(self):
+        os.makedirs(self.dir_cache, exist_ok=True)
+        with open(self.arquivo_hashes, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f, indent=1, sort_keys=True)
+
+    def chave(self, nome):
+        if nome not in self.chaves:
+            etapa = self.etapas[nome]
+            conteudo = json.dumps({
+                'etapa': nome,
+                'funcao': inspect.getsource(etapa.funcao),
+                'auxiliares': [inspect.getsource(f) for f in (normalizar_texto, inferir_tipos)],
+                'codigo': {m: self.hash_arquivo(os.path.join(BASE_DIR, m)) for m in etapa.modulos},
+                'parametros': etapa.parametros,
+                'dependencias': {d: self.chave(d) for d in etapa.dependencias},
+                'arquivos': {os.path.basename(a): self.hash_arquivo(a) for a in etapa.arquivos(etapa.parametros)},
+                'pandas': pd.__version__,
+            }, sort_keys=True, ensure_ascii=False, default=str)
+            self.chaves[nome] = hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+        return self.chaves[nome]
+
+    def caminho_cache(self, nome):
+        return os.path.join(self.dir_cache, f'{nome}-{self.chave(nome)[:16]}.parquet')
+
+    def descendentes(self, nomes):
+        resultado = set(nomes)
+        for etapa in self.etapas.values():  # etapas em ordem topológica
+            if resultado.intersection(etapa.dependencias):
+                resultado.add(etapa.nome)
+        return resultado
+
+    def definir_parametros(self, parametros):
+        # Sobrescreve parâmetros de qualquer etapa que os declare
+        for nome_param, valor in parametros.items():
+            donas = [e for e in self.etapas.values() if nome_param in e.parametros]
+            if not donas:
+                raise Exception(f'Parâmetro desconhecido: {nome_param}')
+            for etapa in donas:
+                etapa.parametros[nome_param] = valor
+        self.chaves = {}
+
+    def podar_cache(self, nome):
+        versoes = sorted(glob.glob(os.path.join(self.dir_cache, f'{nome}-*.parquet')), key=os.path.getmtime, reverse=True)
+        for caminho in versoes[MAX_VERSOES_CACHE:]:
+            os.remove(caminho)
+
+    def executar(self, alvo, forcar=()):
+        recalcular = self.descendentes(forcar)
+        resultados = {}
+
+        def obter(nome):
+            if nome in resultados:
+                return resultados[nome]
+            etapa = self.etapas[nome]
+            caminho = self.caminho_cache(nome)
+            if nome not in recalcular and os.path.exists(caminho):
+                print(f'[pipeline] {nome}: cache {os.path.basename(caminho)}')
+                with instrumentacao.medir_etapa(f'pipeline.{nome}.cache') as medicao:
+                    df = pd.read_parquet(caminho)
+                    medicao.linhas_saida = len(df)
+            else:
+                entradas = [obter(d) for d in etapa.dependencias]
+                print(f'[pipeline] {nome}: executando...')
+                linhas_entrada = sum(len(e) for e in entradas) if entradas else None
+                with instrumentacao.medir_etapa(f'pipeline.{nome}', linhas_entrada) as medicao:
+                    df = etapa.funcao(*entradas, **etapa.parametros).reset_index(drop=True)
+                    medicao.linhas_saida = len(df)
+                    with instrumentacao.medir_etapa('gravacao_cache', len(df)):
+                        self.salvar_cache(nome, df)
+            resultados[nome] = df
+            return df
+
+        try:
+            df = obter(alvo)
+            self.registrar_execucao()
+            return df
+        finally:
+            self.salvar_hashes()
+
+    def salvar_cache(self, nome, df):
+        caminho = self.caminho_cache(nome)
+        os.makedirs(self.dir_cache, exist_ok=True)
+        temporario = caminho + '.tmp'
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, caminho)
+        self.podar_cache(nome)
+
+    def carregar_cache(self, nome, colunas=None):
+        # Saída em cache da etapa, ou None se não houver
+        caminho = self.caminho_cache(nome)
+        if not os.path.exists(caminho):
+            return None
+        return pd.read_parquet(caminho, columns=colunas)
+
+    def registrar_execucao(self):
+        # Anos da última base completa gerada, ponto de partida do modo incremental
+        with open(os.path.join(self.dir_cache, ARQUIVO_ULTIMA_EXECUCAO), 'w', encoding='utf-8') as f:
+            json.dump({'anos': self.etapas['consolidacao'].parametros['anos']}, f)
+
+    def listar(self):
+        for nome in self.etapas:
+            situacao = 'em cache' if os.path.exists(self.caminho_cache(nome)) else 'pendente'
+            print(f'{nome:<22} {self.chave(nome)[:16]}  {situacao}')
+        self.salvar_hashes()
+
+
+def ler_parametro(texto):
+    nome, _, valor = texto.partition('=')
+    try:
+        return nome, json.loads(valor)
+    except ValueError:
+        return nome, valor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Executa o pipeline de acidentes com cache por etapa.')
+    parser.add_argument('--ate', default='analise_trechos', choices=[e.nome for e in ETAPAS], help='última etapa a executar')
+    parser.add_argument('--forcar', action='append', default=[], choices=[e.nome for e in ETAPAS], help='recalcula a etapa (e as seguintes) mesmo com cache')
+    parser.add_argument('--param', action='append', default=[], type=ler_parametro, help='nome=valor de um parâmetro de etapa')
+    parser.add_argument('--listar', action='store_true', help='mostra as etapas, suas chaves e se já estão em cache')
+    parser.add_argument('--incremental', action='store_true', help='processa só os anos de datatran novos desde a última execução')
+    parser.add_argument('--processos', type=int, default=analise_trechos.PROCESSOS, help='processos para o trabalho por BR da análise de trechos (não altera o resultado nem a chave de cache)')
+    parser.add_argument('--varrer', type=float, nargs='*', metavar='LIMIAR_KM',
+                        help='compara limiares de gap da segmentação sobre a base pré-processada, em vez de gerar o dataset final')
+    parser.add_argument('--perfil', help='grava o cProfile das etapas cujo nome começa com o texto dado (ex.: pipeline.analise_trechos)')
+    args = parser.parse_args()
+
+    analise_trechos.PROCESSOS = args.processos
+    if args.perfil:
+        instrumentacao.ETAPA_PERFILADA = args.perfil
+    pipeline = Pipeline(parametros=dict(args.param))
+    if args.listar:
+        pipeline.listar()
+        sys.exit(0)
+
+    if args.varrer is not None:
+        # Só até a base pré-processada (em cache); a segmentação de todos os limiares sai de uma passada
+        df = pipeline.executar('pre_processamento_ml', forcar=args.forcar)
+        tolerancia = pipeline.etapas['analise_trechos'].parametros['tolerancia_snap_radar_km']
+        analise_trechos.executar_varredura(df, analise_trechos.carregar_radares(), args.varrer or analise_trechos.LIMIARES_VARREDURA_KM, tolerancia)
+        instrumentacao.salvar_relatorio('pipeline')
+        sys.exit(0)
+
+    if args.incremental:
+        from incremental import executar_incremental
+        df = executar_incremental(pipeline, args.ate)
+    else:
+        df = pipeline.executar(args.ate, forcar=args.forcar)
+    if args.ate == 'analise_trechos':
+        with instrumentacao.medir_etapa('gravacao', len(df)):
+            df.to_csv(analise_trechos.ARQUIVO_SAIDA, index=False, encoding='utf-8')
+            matriz_ml.exportar_matriz(df)
+        analise_trechos.exibir_insights(df)
+        print(f"\nArquivo final salvo em: '{analise_trechos.ARQUIVO_SAIDA}' (matriz float32: '{matriz_ml.ARQUIVO_MATRIZ}')")
+    else:
+        print(f'{args.ate}: {len(df)} linhas, {df.shape[1]} colunas')
+    instrumentacao.salvar_relatorio('pipeline')
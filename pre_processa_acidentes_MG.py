@@ -1,78 +1,24 @@
 import pandas as pd
 import numpy as np
-import re
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
-import time
 from tqdm import tqdm
+from codificacao import codificar_multirrotulo
+from indice_km_coordenadas import IndiceKmCoordenadas
+import esquema
+import instrumentacao
+
+arquivo_entrada = 'acidentes_MG.csv'
+
+# Saída principal em Parquet (tipada); o CSV textual fica opcional para consumidores legados
+output_path = 'acidentes_MG_preprocessado.parquet'
+output_path_csv = 'acidentes_MG_preprocessado.csv'
+EXPORTAR_CSV = False
+
+# Índice offline km -> coordenada. A execução avulsa do script o persiste e atualiza a
+# cada novo ano de dados; o pipeline o constrói da própria entrada da etapa
+ARQUIVO_INDICE_COORDENADAS = 'indice_km_coordenadas.parquet'
+PREENCHER_COORDENADAS = True
+
 
-# =============================
-# 1. Carregar o CSV original
-# =============================
-df = pd.read_csv('acidentes_MG.csv', sep=',', encoding='utf-8')
-
-# =============================
-# 2. Limpeza e Padronização Inicial
-# =============================
-df_proc = df.copy()  # Evita SettingWithCopyWarning
-
-# Colunas de texto a padronizar
-txt_cols = [
-    'classificacao_acidente',
-    'causa_acidente',
-    'condicao_metereologica',
-    'tipo_acidente',
-    'tracado_via'
-]
-for col in txt_cols:
-    if col in df_proc.columns:
-        df_proc[col] = (
-            df_proc[col]
-            .astype(str)
-            .str.lower()
-            .str.strip()
-            .replace({'não informado': None, 'nan': None, 'none': None})
-        )
-        df_proc[col] = df_proc[col].replace({'^nan$': None, '^none$': None}, regex=True)
-
-# =============================
-# 3. Agrupamento de Categorias Sinônimas e Semânticas
-# =============================
-class_map = {
-    'sem vítima': 'sem_vitimas',
-    'sem vítimas': 'sem_vitimas',
-    'com vítimas': 'com_vitimas_feridas',
-    'com vítima': 'com_vitimas_feridas',
-    'com vítimas feridas': 'com_vitimas_feridas',
-    'com vítimas leves': 'com_vitimas_feridas',
-    'com vítimas graves': 'com_vitimas_feridas',
-    'com vítimas fatais': 'com_vitimas_fatais',
-    'outros': None
-}
-if 'classificacao_acidente' in df_proc.columns:
-    df_proc['classificacao_acidente'] = df_proc['classificacao_acidente'].replace(class_map)
-
-# =============================
-# 4. Tratamento Multi-Label: tracado_via
-# =============================
-if 'tracado_via' in df_proc.columns:
-    # Identifica categorias base únicas
-    tracado_unique = set()
-    df_proc['tracado_via'] = df_proc['tracado_via'].fillna('')
-    for val in df_proc['tracado_via']:
-        for item in val.split(';'):
-            item = item.strip()
-            if item:
-                tracado_unique.add(item)
-    tracado_unique = sorted(tracado_unique)
-    # Cria colunas binárias para cada característica
-    for cat in tracado_unique:
-        col_name = f"tracado_tem_{re.sub(r'[^a-z0-9]', '_', cat)}"
-        df_proc[col_name] = df_proc['tracado_via'].apply(lambda x: int(cat in [i.strip() for i in x.split(';')]))
-
-# =============================
-# 5. Engenharia de Causas: causa_acidente
-# =============================
 def map_causa(causa):
     if pd.isnull(causa):
         return None
@@ -90,77 +36,205 @@ def map_causa(causa):
     if 'velocidade' in causa:
         return 'velocidade_incompativel'
     return 'outras'
-if 'causa_acidente' in df_proc.columns:
-    df_proc['causa_acidente'] = df_proc['causa_acidente'].apply(map_causa)
-
-# =============================
-# 6. Binarização (One-Hot Encoding)
-# =============================
-dummies_cols = [
-    'classificacao_acidente',
-    'causa_acidente',
-    'condicao_metereologica',
-    'tipo_acidente',
-    'tipo_pista',
-    'sentido_via',
-    'fase_dia'
-]
-dummies_cols = [col for col in dummies_cols if col in df_proc.columns]
-df_dummies = pd.get_dummies(df_proc[dummies_cols], prefix=dummies_cols, dummy_na=False, drop_first=False)
-
-# =============================
-# 7. Variáveis Cíclicas: dia_semana
-# =============================
-if 'dia_semana' in df_proc.columns:
-    dia_map = {
-        'segunda-feira': 0, 'segunda': 0,
-        'terça-feira': 1, 'terca-feira': 1, 'terça': 1, 'terca': 1,
-        'quarta-feira': 2, 'quarta': 2,
-        'quinta-feira': 3, 'quinta': 3,
-        'sexta-feira': 4, 'sexta': 4,
-        'sábado': 5, 'sabado': 5,
-        'domingo': 6
+
+
+@instrumentacao.medir()
+def codificar_features(df):
+    # =============================
+    # 2. Limpeza e Padronização Inicial
+    # =============================
+    df_proc = df.copy()  # Evita SettingWithCopyWarning
+
+    # Colunas de texto a padronizar
+    txt_cols = [
+        'classificacao_acidente',
+        'causa_acidente',
+        'condicao_metereologica',
+        'tipo_acidente',
+        'tracado_via'
+    ]
+    for col in txt_cols:
+        if col in df_proc.columns:
+            df_proc[col] = (
+                df_proc[col]
+                .astype(str)
+                .str.lower()
+                .str.strip()
+                .replace({'não informado': None, 'nan': None, 'none': None})
+            )
+            df_proc[col] = df_proc[col].replace({'^nan$': None, '^none$': None}, regex=True)
+
+    # =============================
+    # 3. Agrupamento de Categorias Sinônimas e Semânticas
+    # =============================
+    class_map = {
+        'sem vítima': 'sem_vitimas',
+        'sem vítimas': 'sem_vitimas',
+        'com vítimas': 'com_vitimas_feridas',
+        'com vítima': 'com_vitimas_feridas',
+        'com vítimas feridas': 'com_vitimas_feridas',
+        'com vítimas leves': 'com_vitimas_feridas',
+        'com vítimas graves': 'com_vitimas_feridas',
+        'com vítimas fatais': 'com_vitimas_fatais',
+        'outros': None
     }
-    df_proc['dia_semana_num'] = df_proc['dia_semana'].str.lower().map(dia_map)
-    df_proc['dia_semana_sin'] = np.sin(2 * np.pi * df_proc['dia_semana_num'] / 7)
-    df_proc['dia_semana_cos'] = np.cos(2 * np.pi * df_proc['dia_semana_num'] / 7)
-
-# =============================
-# 8. Finalização
-# =============================
-# Concatena dummies
-if not df_dummies.empty:
-    df_proc = pd.concat([df_proc, df_dummies], axis=1)
-# Remove colunas categóricas originais
-cols_to_drop = [
-    'classificacao_acidente',  'condicao_metereologica',
-    'tipo_acidente', 'tipo_pista', 'tracado_via', 'sentido_via', 'fase_dia', 'dia_semana', 'dia_semana_num'
-]
-cols_to_drop = [col for col in cols_to_drop if col in df_proc.columns]
-df_proc = df_proc.drop(columns=cols_to_drop)
-
-# Salva o resultado em um novo CSV
-output_path = 'acidentes_MG_preprocessado.csv'
-
-# =============================
-# 9. Otimização de tipos: bool e int64 (0/1) para uint8
-# =============================
-for col in df_proc.columns:
-    # Se for booleano, converte para uint8
-    if df_proc[col].dtype == bool:
-        df_proc[col] = df_proc[col].astype('uint8')
-    # Se for int64 e só tiver 0 ou 1, converte para uint8
-    elif df_proc[col].dtype == 'int64':
-        uniques = df_proc[col].dropna().unique()
-        if set(uniques).issubset({0, 1}):
+    if 'classificacao_acidente' in df_proc.columns:
+        df_proc['classificacao_acidente'] = df_proc['classificacao_acidente'].replace(class_map)
+
+    # =============================
+    # 4. Tratamento Multi-Label: tracado_via
+    # =============================
+    if 'tracado_via' in df_proc.columns:
+        # Cria colunas binárias (uint8) para cada característica, tokenizando a coluna uma única vez
+        df_proc['tracado_via'] = df_proc['tracado_via'].fillna('')
+        df_tracado = codificar_multirrotulo(df_proc['tracado_via'], esquema.PREFIXO_MULTIRROTULO)
+        df_proc = pd.concat([df_proc, df_tracado], axis=1)
+
+    # =============================
+    # 5. Engenharia de Causas: causa_acidente
+    # =============================
+    if 'causa_acidente' in df_proc.columns:
+        df_proc['causa_acidente'] = df_proc['causa_acidente'].apply(map_causa)
+
+    # =============================
+    # 6. Binarização (One-Hot Encoding)
+    # =============================
+    dummies_cols = [col for col in esquema.COLUNAS_ONE_HOT if col in df_proc.columns]
+    # Categóricas do esquema trazem também os valores válidos ausentes da base: só os presentes viram colunas
+    df_dummies = pd.get_dummies(
+        df_proc[dummies_cols].apply(lambda s: s.cat.remove_unused_categories() if isinstance(s.dtype, pd.CategoricalDtype) else s),
+        prefix=dummies_cols, dummy_na=False, drop_first=False,
+    )
+
+    # =============================
+    # 7. Variáveis Cíclicas: dia_semana
+    # =============================
+    if 'dia_semana' in df_proc.columns:
+        dia_map = {
+            'segunda-feira': 0, 'segunda': 0,
+            'terça-feira': 1, 'terca-feira': 1, 'terça': 1, 'terca': 1,
+            'quarta-feira': 2, 'quarta': 2,
+            'quinta-feira': 3, 'quinta': 3,
+            'sexta-feira': 4, 'sexta': 4,
+            'sábado': 5, 'sabado': 5,
+            'domingo': 6
+        }
+        df_proc['dia_semana_num'] = df_proc['dia_semana'].str.lower().map(dia_map)
+        df_proc['dia_semana_sin'] = np.sin(2 * np.pi * df_proc['dia_semana_num'] / 7)
+        df_proc['dia_semana_cos'] = np.cos(2 * np.pi * df_proc['dia_semana_num'] / 7)
+
+    # =============================
+    # 8. Finalização
+    # =============================
+    # Concatena dummies
+    if not df_dummies.empty:
+        df_proc = pd.concat([df_proc, df_dummies], axis=1)
+    # Remove colunas categóricas originais
+    cols_to_drop = [
+        'classificacao_acidente',  'condicao_metereologica',
+        'tipo_acidente', 'tipo_pista', 'tracado_via', 'sentido_via', 'fase_dia', 'dia_semana', 'dia_semana_num'
+    ]
+    cols_to_drop = [col for col in cols_to_drop if col in df_proc.columns]
+    df_proc = df_proc.drop(columns=cols_to_drop)
+
+    # =============================
+    # 9. Otimização de tipos: bool e int64 (0/1) para uint8
+    # =============================
+    for col in df_proc.columns:
+        # Se for booleano, converte para uint8
+        if df_proc[col].dtype == bool:
             df_proc[col] = df_proc[col].astype('uint8')
+        # Se for int64 e só tiver 0 ou 1, converte para uint8
+        elif df_proc[col].dtype == 'int64':
+            uniques = df_proc[col].dropna().unique()
+            if set(uniques).issubset({0, 1}):
+                df_proc[col] = df_proc[col].astype('uint8')
+    return df_proc
+
+
+COLUNAS_INDICE_COORDENADAS = ['br', 'km', 'latitude', 'longitude']
+
+
+def construir_indice_coordenadas(df):
+    # Índice km -> coordenada só das linhas de df, em memória
+    coords = esquema.aplicar_esquema(df[COLUNAS_INDICE_COORDENADAS], colunas=['km', 'latitude', 'longitude'])
+    indice_coord = IndiceKmCoordenadas()
+    indice_coord.atualizar(coords['br'], coords['km'], coords['latitude'], coords['longitude'])
+    return indice_coord
+
+
+def atualizar_indice_salvo(df, caminho=ARQUIVO_INDICE_COORDENADAS):
+    # Índice persistido de vários anos (execução avulsa do script): incorpora os anos de df
+    # ainda não vistos e salva. Sem ANO_DADOS não há como evitar contagem dupla: devolve
+    # None e compactar_tipos usa só a própria entrada, sem tocar no índice salvo.
+    if 'ANO_DADOS' not in df.columns:
+        return None
+    coords = esquema.aplicar_esquema(df[COLUNAS_INDICE_COORDENADAS], colunas=['km', 'latitude', 'longitude'])
+    indice_coord = IndiceKmCoordenadas.carregar(caminho)
+    anos_dados = df['ANO_DADOS'].astype(str)
+    novos = ~anos_dados.isin(indice_coord.anos)
+    if novos.any():
+        indice_coord.atualizar(
+            coords.loc[novos, 'br'], coords.loc[novos, 'km'], coords.loc[novos, 'latitude'], coords.loc[novos, 'longitude'],
+            anos=anos_dados[novos].unique(),
+        )
+        indice_coord.salvar(caminho)
+    return indice_coord
+
+
+@instrumentacao.medir()
+def compactar_tipos(df_proc, indice_coord=None):
+    # =============================
+    # 10. Tipos compactos para armazenamento colunar
+    # =============================
+    # km (float64), coordenadas (float32) e data_inversa com os tipos do esquema
+    df_proc = esquema.aplicar_esquema(df_proc, colunas=['km', 'latitude', 'longitude', 'data_inversa'])
+    if PREENCHER_COORDENADAS and set(COLUNAS_INDICE_COORDENADAS).issubset(df_proc.columns):
+        if indice_coord is None:
+            # Sem índice informado, só as linhas desta entrada: a saída depende apenas dela
+            indice_coord = construir_indice_coordenadas(df_proc)
+        faltando = (df_proc['latitude'].isna() | df_proc['longitude'].isna()).to_numpy()
+        lat_interp, lon_interp = indice_coord.interpolar(df_proc.loc[faltando, 'br'], df_proc.loc[faltando, 'km'])
+        preenchido = ~np.isnan(lat_interp)
+        linhas = df_proc.index[faltando][preenchido]
+        df_proc.loc[linhas, 'latitude'] = lat_interp[preenchido].astype(df_proc['latitude'].dtype)
+        df_proc.loc[linhas, 'longitude'] = lon_interp[preenchido].astype(df_proc['longitude'].dtype)
+        print(f'Coordenadas interpoladas pelo km: {preenchido.sum()} de {faltando.sum()} linhas sem latitude/longitude.')
+    # Demais colunas de texto viram categóricas (dicionário + códigos no Parquet)
+    for col in df_proc.columns:
+        if df_proc[col].dtype == object or pd.api.types.is_string_dtype(df_proc[col]):
+            df_proc[col] = df_proc[col].astype('category')
+    return df_proc
+
+
+def pre_processar(df):
+    return compactar_tipos(codificar_features(df))
+
+
+if __name__ == '__main__':
+    # =============================
+    # 1. Carregar o CSV original
+    # =============================
+    with instrumentacao.medir_etapa('leitura') as medicao:
+        df = esquema.ler_tipado(arquivo_entrada)
+        medicao.linhas_saida = len(df)
+    df_proc = codificar_features(df)
 
+    # Exibe amostra e info do DataFrame final
+    print("\n=== AMOSTRA DO DATAFRAME FINAL ===")
+    print(df_proc.head())
+    print("\n=== INFORMAÇÕES DO DATAFRAME ===")
+    print(df_proc.info())
 
-# Exibe amostra e info do DataFrame final
-print("\n=== AMOSTRA DO DATAFRAME FINAL ===")
-print(df_proc.head())
-print("\n=== INFORMAÇÕES DO DATAFRAME ===")
-print(df_proc.info())
+    if EXPORTAR_CSV:
+        with instrumentacao.medir_etapa('gravacao_csv', len(df_proc)):
+            df_proc.to_csv(output_path_csv, index=False, encoding='utf-8')
+        print(f'\nArquivo CSV salvo em: {output_path_csv}')
 
-df_proc.to_csv(output_path, index=False, encoding='utf-8')
-print(f'\nArquivo salvo em: {output_path}') 
\ No newline at end of file
+    # Execução avulsa: o índice km -> coordenada salvo acumula os anos já processados
+    indice_coord = atualizar_indice_salvo(df_proc) if PREENCHER_COORDENADAS and set(COLUNAS_INDICE_COORDENADAS).issubset(df_proc.columns) else None
+    df_proc = compactar_tipos(df_proc, indice_coord)
+    with instrumentacao.medir_etapa('gravacao', len(df_proc)):
+        df_proc.to_parquet(output_path, index=False)
+    print(f'\nArquivo salvo em: {output_path}')
+    instrumentacao.salvar_relatorio('pre_processa_acidentes_MG')
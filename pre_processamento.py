@@ -1,5 +1,10 @@
 import os
+import re
+import shutil
 import pandas as pd
+import esquema
+import leitura
+import instrumentacao
 
 # Diretório base (ajuste se necessário)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -7,44 +12,154 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Anos disponíveis
 anos = list(range(2007, 2026))
 
-# Lista para armazenar DataFrames
-dfs = []
+# Colunas extras que não seguem para o arquivo consolidado
+colunas_remover = ['id', 'uso_solo', 'regional', 'delegacia', 'uop', 'ano']
 
-for ano in anos:
-    pasta = f"datatran{ano}"
-    caminho_pasta = os.path.join(BASE_DIR, pasta)
-    arquivo_csv = os.path.join(caminho_pasta, f"datatran{ano}.csv")
-    if os.path.exists(arquivo_csv):
-        print(f"Lendo: {arquivo_csv}")
+# ==============================================================================
+# PARÂMETROS DE CONFIGURAÇÃO
+# ==============================================================================
+# Modo streaming: lê cada ano em blocos de TAMANHO_CHUNK linhas e grava Parquet
+# particionado por ano/UF, sem manter o histórico inteiro em memória.
+MODO_STREAMING = False
+TAMANHO_CHUNK = 200_000
+DIR_SAIDA_PARTICIONADA = os.path.join(BASE_DIR, 'acidentes_2007_2025_particionado')
+COLUNAS_PARTICAO = ['ANO_DADOS', 'uf']
+# Nome da partição de UF nula, o mesmo do particionamento hive do pyarrow
+PARTICAO_NULA = '__HIVE_DEFAULT_PARTITION__'
+
+
+def caminho_ano(ano):
+    return os.path.join(BASE_DIR, f"datatran{ano}", f"datatran{ano}.csv")
+
+
+def anos_disponiveis():
+    # Anos configurados e quaisquer outros datatran{ano}/datatran{ano}.csv presentes, com arquivo
+    encontrados = {int(m.group(1)) for m in (re.match(r'datatran(\d{4})$', d) for d in os.listdir(BASE_DIR)) if m}
+    return sorted(ano for ano in set(anos) | encontrados if os.path.exists(caminho_ano(ano)))
+
+
+def esquema_unificado(arquivos):
+    # Lê apenas o cabeçalho de cada ano para montar a união das colunas,
+    # na mesma ordem que o pd.concat(..., sort=True) produziria
+    colunas = set()
+    for arquivo_csv in arquivos:
+        colunas.update(esquema.ler_datatran(arquivo_csv, nrows=0).columns)
+    colunas.add('ANO_DADOS')
+    return sorted(c for c in colunas if c not in colunas_remover)
+
+
+def ingestao_streaming():
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arquivos = {}
+    for ano in anos:
+        arquivo_csv = caminho_ano(ano)
+        if os.path.exists(arquivo_csv):
+            arquivos[ano] = arquivo_csv
+        else:
+            print(f"Arquivo não encontrado: {arquivo_csv}")
+    if not arquivos:
+        print("Nenhum arquivo CSV encontrado para processar.")
+        return
+
+    colunas = esquema_unificado(arquivos.values())
+    schema = pa.schema([(col, pa.string()) for col in colunas])
+    print(f'Esquema unificado com {len(colunas)} colunas.')
+
+    if os.path.exists(DIR_SAIDA_PARTICIONADA):
+        shutil.rmtree(DIR_SAIDA_PARTICIONADA)
+
+    # Um arquivo por partição ANO_DADOS=<ano>/uf=<uf>, com um ParquetWriter aberto por UF
+    # durante o ano inteiro: cada bloco vira um row group, não um arquivo pequeno
+    schema_arquivo = pa.schema([campo for campo in schema if campo.name not in COLUNAS_PARTICAO])
+    total_linhas = 0
+    for ano, arquivo_csv in arquivos.items():
+        print(f"Lendo (streaming): {arquivo_csv}")
+        escritores = {}
         try:
-            df = pd.read_csv(arquivo_csv, sep=';', encoding='utf-8', dtype=str)
-            # Preserva a coluna km como string, se existir
-            for col in df.columns:
-                if col.lower() == 'km':
-                    df[col] = df[col].astype(str)
-            df['ANO_DADOS'] = str(ano)  # Adiciona coluna do ano como string
-            dfs.append(df)
+            leitor = esquema.ler_datatran(arquivo_csv, chunksize=TAMANHO_CHUNK)
+            for chunk in leitor:
+                # Preserva a coluna km como string, se existir
+                for col in chunk.columns:
+                    if col.lower() == 'km':
+                        chunk[col] = chunk[col].astype(str)
+                chunk['ANO_DADOS'] = str(ano)
+                # Alinha o bloco ao esquema unificado (colunas ausentes viram nulas)
+                chunk = chunk.reindex(columns=colunas)
+                for uf, parte in chunk.groupby(chunk['uf'].fillna(PARTICAO_NULA), sort=False):
+                    if uf not in escritores:
+                        dir_particao = os.path.join(DIR_SAIDA_PARTICIONADA, f'ANO_DADOS={ano}', f'uf={uf}')
+                        os.makedirs(dir_particao, exist_ok=True)
+                        escritores[uf] = pq.ParquetWriter(os.path.join(dir_particao, f'parte-{ano}.parquet'), schema_arquivo)
+                    tabela = pa.Table.from_pandas(parte.drop(columns=COLUNAS_PARTICAO), schema=schema_arquivo, preserve_index=False)
+                    escritores[uf].write_table(tabela)
+                total_linhas += len(chunk)
+            for escritor in escritores.values():
+                escritor.close()
         except Exception as e:
             print(f"Erro ao ler {arquivo_csv}: {e}")
+            for escritor in escritores.values():
+                escritor.close()
+            # Descarta as partições parciais do ano que falhou
+            shutil.rmtree(os.path.join(DIR_SAIDA_PARTICIONADA, f'ANO_DADOS={ano}'), ignore_errors=True)
+
+    print(f'Colunas removidas (quando presentes): {colunas_remover}')
+    print(f"{total_linhas} linhas gravadas em: {DIR_SAIDA_PARTICIONADA}")
+
+
+@instrumentacao.medir()
+def consolidar_anos(anos_consolidar=anos):
+    # Consolida os anos em um único DataFrame de texto, alinhando as colunas
+    dfs = []
+
+    arquivos = {}
+    for ano in anos_consolidar:
+        arquivo_csv = caminho_ano(ano)
+        if os.path.exists(arquivo_csv):
+            print(f"Lendo: {arquivo_csv}")
+            arquivos[ano] = arquivo_csv
+        else:
+            print(f"Arquivo não encontrado: {arquivo_csv}")
+
+    # Os anos são lidos em paralelo e juntados na ordem dos anos
+    lidos = leitura.ler_varios(list(arquivos.values()), esquema.ler_datatran)
+    for ano, arquivo_csv in arquivos.items():
+        df = lidos[arquivo_csv]
+        if isinstance(df, Exception):
+            print(f"Erro ao ler {arquivo_csv}: {df}")
             with open(arquivo_csv, 'r', encoding='utf-8', errors='replace') as f:
                 for i in range(5):
                     print(f.readline().strip())
-    else:
-        print(f"Arquivo não encontrado: {arquivo_csv}")
+            continue
+        # Preserva a coluna km como string, se existir
+        for col in df.columns:
+            if col.lower() == 'km':
+                df[col] = df[col].astype(str)
+        df['ANO_DADOS'] = str(ano)  # Adiciona coluna do ano como string
+        dfs.append(df)
 
-# Une todos os DataFrames, alinhando colunas
-if dfs:
+    if not dfs:
+        print("Nenhum arquivo CSV encontrado para processar.")
+        return None
     df_total = pd.concat(dfs, ignore_index=True, sort=True)
 
     # Remover colunas extras, se existirem
-    cols_to_remove = ['id', 'uso_solo', 'regional', 'delegacia', 'uop', 'ano']
-    cols_to_remove = [col for col in cols_to_remove if col in df_total.columns]
+    cols_to_remove = [col for col in colunas_remover if col in df_total.columns]
     if cols_to_remove:
         df_total = df_total.drop(columns=cols_to_remove)
         print(f'Colunas removidas: {cols_to_remove}')
+    return df_total
 
-    output_path = os.path.join(BASE_DIR, "acidentes_2007_2025.csv")
-    df_total.to_csv(output_path, index=False, encoding='utf-8')
-    print(f"Arquivo final salvo em: {output_path}")
-else:
-    print("Nenhum arquivo CSV encontrado para processar.")
+
+if __name__ == '__main__':
+    if MODO_STREAMING:
+        ingestao_streaming()
+    else:
+        df_total = consolidar_anos()
+        if df_total is not None:
+            output_path = os.path.join(BASE_DIR, "acidentes_2007_2025.csv")
+            with instrumentacao.medir_etapa('gravacao', len(df_total)):
+                df_total.to_csv(output_path, index=False, encoding='utf-8')
+            print(f"Arquivo final salvo em: {output_path}")
+    instrumentacao.salvar_relatorio('pre_processamento')
@@ -1,41 +1,83 @@
-import pandas as pd
 import os
+import esquema
+import instrumentacao
 
 # Caminho do arquivo consolidado
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 arquivo_entrada = os.path.join(BASE_DIR, 'acidentes_2007_2025.csv')
 
-# Lê o arquivo consolidado como texto para todas as colunas
-print(f'Lendo {arquivo_entrada}...')
-df = pd.read_csv(arquivo_entrada, encoding='utf-8', dtype=str)
+# Blocos lidos por vez; a memória fica limitada ao tamanho do bloco
+TAMANHO_CHUNK = 200_000
 
-# Preserva a coluna km como string, se existir
-for col in df.columns:
-    if col.lower() == 'km':
-        df[col] = df[col].astype(str)
+# Colunas descartadas durante a leitura
+colunas_remover = ['uso_solo', 'id']
 
-# Verifica o nome exato da coluna UF (pode ser 'UF', 'Uf', etc.)
-colunas = [col.upper() for col in df.columns]
-if 'UF' in colunas:
-    nome_col_uf = df.columns[colunas.index('UF')]
-else:
-    raise Exception('Coluna UF não encontrada no arquivo!')
+# Linhas sem UF informada vão para um arquivo próprio
+UF_AUSENTE = 'SEM_UF'
 
-# Separa os dados
-mg = df[df[nome_col_uf] == 'MG']
-outros = df[df[nome_col_uf] != 'MG']
 
-# Remove as colunas indesejadas
-colunas_remover = ['uso_solo', 'id']
-mg = mg.drop(columns=[c for c in colunas_remover if c in mg.columns])
-outros = outros.drop(columns=[c for c in colunas_remover if c in outros.columns])
+def caminho_saida_uf(uf):
+    return os.path.join(BASE_DIR, f'acidentes_{uf}.csv')
+
+
+def coluna_uf(colunas):
+    # Nome exato da coluna UF (pode ser 'UF', 'Uf', etc.)
+    maiusculas = [col.upper() for col in colunas]
+    if 'UF' not in maiusculas:
+        raise Exception('Coluna UF não encontrada no arquivo!')
+    return colunas[maiusculas.index('UF')]
+
+
+@instrumentacao.medir()
+def filtrar_uf(df, uf='MG'):
+    # Versão em memória da separação: linhas de uma UF, sem as colunas removidas
+    nome_col_uf = coluna_uf(list(df.columns))
+    df = df.loc[df[nome_col_uf] == uf, [c for c in df.columns if c not in colunas_remover]].copy()
+    # Preserva a coluna km como string, se existir
+    for col in df.columns:
+        if col.lower() == 'km':
+            df[col] = df[col].astype(str)
+    return df
+
+
+@instrumentacao.medir()
+def separar_arquivo():
+    cabecalho = list(esquema.ler_texto(arquivo_entrada, nrows=0).columns)
+    nome_col_uf = coluna_uf(cabecalho)
+
+    # Remove as colunas indesejadas já na leitura
+    colunas_manter = [c for c in cabecalho if c not in colunas_remover]
+
+    # Lê o arquivo consolidado uma única vez, em blocos, e distribui as linhas
+    # entre os arquivos de cada UF, mantendo um arquivo aberto por estado
+    print(f'Lendo {arquivo_entrada} em blocos de {TAMANHO_CHUNK} linhas...')
+    arquivos_uf = {}
+    linhas_uf = {}
+    try:
+        leitor = esquema.ler_texto(arquivo_entrada, usecols=colunas_manter, chunksize=TAMANHO_CHUNK)
+        for chunk in leitor:
+            chunk = chunk[colunas_manter]
+            # Preserva a coluna km como string, se existir
+            for col in chunk.columns:
+                if col.lower() == 'km':
+                    chunk[col] = chunk[col].astype(str)
+            chaves_uf = chunk[nome_col_uf].fillna(UF_AUSENTE)
+            for uf, grupo in chunk.groupby(chaves_uf, sort=False):
+                if uf not in arquivos_uf:
+                    arquivos_uf[uf] = open(caminho_saida_uf(uf), 'w', encoding='utf-8', newline='')
+                    grupo.to_csv(arquivos_uf[uf], index=False, header=True)
+                    linhas_uf[uf] = 0
+                else:
+                    grupo.to_csv(arquivos_uf[uf], index=False, header=False)
+                linhas_uf[uf] += len(grupo)
+    finally:
+        for f in arquivos_uf.values():
+            f.close()
 
-# Salva os arquivos
-arquivo_mg = os.path.join(BASE_DIR, 'acidentes_MG.csv')
-arquivo_outros = os.path.join(BASE_DIR, 'acidentes_outros.csv')
+    for uf in sorted(linhas_uf):
+        print(f'{uf}: {linhas_uf[uf]} linhas salvas em: {caminho_saida_uf(uf)}')
 
-mg.to_csv(arquivo_mg, index=False, encoding='utf-8')
-outros.to_csv(arquivo_outros, index=False, encoding='utf-8')
 
-print(f'Arquivo com dados de MG salvo em: {arquivo_mg}')
-print(f'Arquivo com os demais dados salvo em: {arquivo_outros}') 
\ No newline at end of file
+if __name__ == '__main__':
+    separar_arquivo()
+    instrumentacao.salvar_relatorio('separar_uf_mg')
@@ -0,0 +1,216 @@
+import os
+import json
+import math
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from indices_rodovia import IndiceIntervalosBR
+
+# ==============================================================================
+# Consulta de risco por trecho sobre o dataset final
+# ==============================================================================
+# O dataset final (um trecho por linha) é convertido uma vez para um arquivo
+# Arrow IPC sem compressão, ordenado por (br, km inicial), e lido por memory
+# map: as colunas numéricas viram arrays numpy sobre o próprio arquivo, sem
+# cópia. Um índice de intervalos por BR sobre trecho_km_inicial/trecho_km_final
+# responde às consultas:
+#   ponto      trecho que contém (br, km)
+#   intervalo  trechos que cruzam [km_inicial, km_final] de uma BR
+#   top-k      trechos de maior trecho_risco_total (geral ou de uma BR)
+#   lote       milhares de pares (br, km) de uma vez
+#
+#   python servico_risco.py --porta 8050
+#   curl 'localhost:8050/trecho?br=381&km=487'
+#   curl 'localhost:8050/intervalo?br=381&km_inicial=480&km_final=500'
+#   curl 'localhost:8050/top?k=10&br=381'
+#   curl -d '{"br": ["381", "040"], "km": [487, 512.3]}' localhost:8050/lote
+
+ARQUIVO_DATASET = 'dataset_final_para_ml.csv'
+ARQUIVO_ARROW = 'dataset_final_para_ml.arrow'
+HOST = '127.0.0.1'
+PORTA = 8050
+# Colunas devolvidas por padrão na consulta em lote
+COLUNAS_LOTE = ['id_trecho', 'trecho_km_inicial', 'trecho_km_final', 'trecho_risco_total', 'trecho_densidade_acidentes', 'tem_radar']
+TOP_K_PADRAO = 10
+
+
+def normalizar_br(br):
+    # 'BR-381', 'br381', '381' e 381 viram '381'; '040' vira '40', como no dataset
+    br = str(br).strip().upper().replace('BR-', '').replace('BR', '').strip()
+    return str(int(br)) if br.isdigit() else br
+
+
+def converter_para_arrow(caminho_csv=ARQUIVO_DATASET, caminho_arrow=ARQUIVO_ARROW):
+    # Gera (ou atualiza, se o CSV for mais novo) o arquivo Arrow ordenado por (br, km inicial)
+    if os.path.exists(caminho_arrow) and os.path.getmtime(caminho_arrow) >= os.path.getmtime(caminho_csv):
+        return caminho_arrow
+    df = pd.read_csv(caminho_csv, dtype={'br': str, 'id_trecho': str}, encoding='utf-8')
+    df['br'] = df['br'].map(normalizar_br)
+    df = df.sort_values(['br', 'trecho_km_inicial'], kind='stable').reset_index(drop=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    temporario = caminho_arrow + '.tmp'
+    with pa.OSFile(temporario, 'wb') as destino, pa.ipc.new_file(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(temporario, caminho_arrow)
+    print(f'{len(df)} trechos convertidos para: {caminho_arrow}')
+    return caminho_arrow
+
+
+def valor_python(valor):
+    # Escalar numpy -> tipo nativo serializável em JSON (NaN vira None)
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+class ServicoRisco:
+    def __init__(self, caminho_arrow=ARQUIVO_ARROW):
+        self.tabela = pa.ipc.open_file(pa.memory_map(caminho_arrow, 'r')).read_all()
+        # Colunas numéricas sem nulos são visões do arquivo mapeado; texto vira array de objetos
+        self.colunas = {nome: self.tabela.column(nome).to_numpy() for nome in self.tabela.column_names}
+        br, inicio, fim = self.colunas['br'], self.colunas['trecho_km_inicial'], self.colunas['trecho_km_final']
+        self.indice = IndiceIntervalosBR(br, inicio, fim, np.arange(len(br)))
+        # Linhas de cada BR (contíguas, o arquivo está ordenado por BR)
+        self.blocos = {b: (p.min(), p.max() + 1) for b, p in pd.Series(br).groupby(br, sort=False).indices.items()}
+        # Ordens por risco decrescente, geral e dentro de cada BR
+        risco = self.colunas['trecho_risco_total']
+        self.ordem_risco = np.argsort(-risco, kind='stable')
+        self.ordem_risco_br = {b: a + np.argsort(-risco[a:c], kind='stable') for b, (a, c) in self.blocos.items()}
+
+    def __len__(self):
+        return len(self.colunas['br'])
+
+    def linha(self, i, colunas=None):
+        return {c: valor_python(self.colunas[c][i]) for c in (colunas or self.colunas)}
+
+    def linhas(self, posicoes, colunas=None):
+        return [self.linha(i, colunas) for i in posicoes]
+
+    def consultar(self, br, km, colunas=None):
+        # Trecho que contém o km da BR, ou None
+        grupo = self.indice.grupos.get(normalizar_br(br))
+        if grupo is None:
+            return None
+        inicio, fim, posicoes = grupo
+        i = np.searchsorted(inicio, km, side='right') - 1
+        if i < 0 or km > fim[i]:
+            return None
+        return self.linha(posicoes[i], colunas)
+
+    def consultar_intervalo(self, br, km_inicial, km_final, colunas=None):
+        # Trechos da BR que cruzam [km_inicial, km_final], em ordem de km
+        grupo = self.indice.grupos.get(normalizar_br(br))
+        if grupo is None:
+            return []
+        inicio, fim, posicoes = grupo
+        # Trechos sem sobreposição: o fim também é crescente
+        a = np.searchsorted(fim, km_inicial, side='left')
+        b = np.searchsorted(inicio, km_final, side='right')
+        return self.linhas(posicoes[a:b], colunas)
+
+    def top_k(self, k=TOP_K_PADRAO, br=None, colunas=None):
+        # Trechos de maior trecho_risco_total, geral ou de uma BR
+        ordem = self.ordem_risco if br is None else self.ordem_risco_br.get(normalizar_br(br), np.zeros(0, dtype=np.int64))
+        return self.linhas(ordem[:k], colunas)
+
+    def consultar_lote(self, brs, kms, colunas=COLUNAS_LOTE, tolerancia_km=0.0):
+        # Um trecho por par (br, km), com busca binária em lote por BR; colunas nulas sem trecho
+        brs = np.array([normalizar_br(b) for b in brs], dtype=object)
+        kms = np.asarray(kms, dtype=float)
+        posicoes, distancias = self.indice.localizar(brs, kms, tolerancia_km=tolerancia_km)
+        achou = np.array([p is not None for p in posicoes], dtype=bool)
+        pos = np.where(achou, posicoes, 0).astype(np.int64)
+        resultado = pd.DataFrame({'br': brs, 'km': kms})
+        for c in colunas:
+            valores = pd.Series(self.colunas[c][pos])
+            resultado[c] = valores.where(achou)
+        if tolerancia_km > 0:
+            resultado['distancia_km'] = distancias
+        return resultado
+
+
+# ==============================================================================
+# Servidor HTTP (JSON)
+# ==============================================================================
+def criar_servidor(servico, host=HOST, porta=PORTA):
+    class Manipulador(BaseHTTPRequestHandler):
+        def responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {c: v[-1] for c, v in parse_qs(url.query).items()}
+            colunas = q['colunas'].split(',') if 'colunas' in q else None
+            try:
+                if colunas and any(c not in servico.colunas for c in colunas):
+                    raise ValueError(f'coluna desconhecida em {colunas}')
+                if url.path == '/trecho':
+                    trecho = servico.consultar(q['br'], float(q['km']), colunas)
+                    self.responder(200 if trecho else 404, trecho or {'erro': f"nenhum trecho na BR {q['br']} km {q['km']}"})
+                elif url.path == '/intervalo':
+                    self.responder(200, servico.consultar_intervalo(q['br'], float(q['km_inicial']), float(q['km_final']), colunas))
+                elif url.path == '/top':
+                    k = int(q.get('k', TOP_K_PADRAO))
+                    if k <= 0:
+                        raise ValueError(f'k deve ser positivo: {k}')
+                    self.responder(200, servico.top_k(k, q.get('br'), colunas))
+                elif url.path == '/saude':
+                    self.responder(200, {'trechos': len(servico)})
+                else:
+                    self.responder(404, {'erro': f'caminho desconhecido: {url.path}'})
+            except (KeyError, ValueError) as e:
+                self.responder(400, {'erro': f'parâmetro ausente ou inválido: {e}'})
+
+        def do_POST(self):
+            # /lote: {"br": [...], "km": [...], "colunas": [...]?, "tolerancia_km": 0?}
+            if urlparse(self.path).path != '/lote':
+                self.responder(404, {'erro': f'caminho desconhecido: {self.path}'})
+                return
+            try:
+                corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if len(corpo['br']) != len(corpo['km']):
+                    raise ValueError('br e km com tamanhos diferentes')
+                colunas = corpo.get('colunas', COLUNAS_LOTE)
+                if any(c not in servico.colunas for c in colunas):
+                    raise ValueError(f'coluna desconhecida em {colunas}')
+                resultado = servico.consultar_lote(corpo['br'], corpo['km'], colunas, float(corpo.get('tolerancia_km', 0.0)))
+            except (KeyError, ValueError, TypeError) as e:
+                self.responder(400, {'erro': f'corpo inválido: {e}'})
+                return
+            self.responder(200, [{c: valor_python(v) for c, v in r.items()} for r in resultado.to_dict('records')])
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, porta), Manipulador)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consulta de risco por trecho (BR + km) sobre o dataset final.')
+    parser.add_argument('--dataset', default=ARQUIVO_DATASET, help='CSV do dataset final por trecho')
+    parser.add_argument('--arrow', default=ARQUIVO_ARROW, help='arquivo Arrow gerado a partir do CSV')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--porta', type=int, default=PORTA)
+    parser.add_argument('--consultar', nargs=2, metavar=('BR', 'KM'), help='responde uma consulta e sai, sem subir o servidor')
+    args = parser.parse_args()
+
+    servico = ServicoRisco(converter_para_arrow(args.dataset, args.arrow))
+    if args.consultar:
+        print(json.dumps(servico.consultar(args.consultar[0], float(args.consultar[1])), ensure_ascii=False, indent=1))
+    else:
+        servidor = criar_servidor(servico, args.host, args.porta)
+        print(f'{len(servico)} trechos carregados; servindo em http://{args.host}:{args.porta}')
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            servidor.server_close()
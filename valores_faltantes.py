@@ -2,71 +2,102 @@ import pandas as pd
 import os
 import re
 import numpy as np
+import esquema
+import instrumentacao
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 arquivo_entrada = os.path.join(BASE_DIR, 'acidentes_MG.csv')
 
-print(f'Lendo {arquivo_entrada}...')
-df = pd.read_csv(arquivo_entrada, encoding='utf-8', dtype=str)
+# Padrões compilados uma única vez
+padrao_coluna_numerica = re.compile(r'^-?\d+[\.,]?\d*$')
+padrao_milhar = re.compile(r'\.(?=\d{3}(,|$))')
+padrao_decimal_ponto = re.compile(r'^-?\d+\.\d+$')
 
-# Função para padronizar número para formato brasileiro
-def padronizar_numero(val):
-    if pd.isnull(val) or val == '':
-        return ''
-    val = str(val).strip()
-    # Remove pontos de milhar
-    val = re.sub(r'\.(?=\d{3}(,|$))', '', val)
-    # Se já tem vírgula decimal, mantém
-    if re.match(r'^-?\d+,\d+$', val):
-        return val
-    # Se tem ponto decimal, troca por vírgula
-    if re.match(r'^-?\d+\.\d+$', val):
-        return val.replace('.', ',')
-    # Se é inteiro
-    if re.match(r'^-?\d+$', val):
-        return val
-    return val  # Mantém qualquer outro caso
+# Os dois tratamentos abaixo trabalham sobre os valores distintos de cada coluna
+# (pd.factorize) e devolvem o resultado para todas as linhas com um único take,
+# em vez de chamar uma função Python por célula.
 
-# Padroniza todas as colunas numéricas
-for col in df.columns:
-    amostra = df[col].dropna().astype(str).head(100)
-    if any(re.match(r'^-?\d+[\.,]?\d*$', v) for v in amostra):
-        print(f'Padronizando coluna numérica: {col}')
-        df[col] = df[col].apply(padronizar_numero)
+# Padroniza uma coluna inteira para o formato numérico brasileiro
+def padronizar_numero_coluna(serie):
+    codigos, unicos = pd.factorize(serie)
+    v = pd.Series(unicos, dtype=object).astype(str).str.strip()
+    # Remove pontos de milhar
+    v = v.str.replace(padrao_milhar, '', regex=True)
+    # Se tem ponto decimal, troca por vírgula (vírgula decimal e inteiros são mantidos)
+    decimal_ponto = v.str.match(padrao_decimal_ponto)
+    v[decimal_ponto] = v[decimal_ponto].str.replace('.', ',', regex=False)
+    # Nulos viram string vazia
+    resultado = np.append(v.to_numpy(dtype=object), '')
+    return pd.Series(resultado[codigos], index=serie.index, dtype=object)
 
 # Análise e remoção de valores faltantes
 missing_values = ['', 'null', 'NULL', 'na', 'NA', 'n/a', 'N/A', 'None', 'none', '-', '--', '(null)']
 missing_values_lower = set([v.lower() for v in missing_values])
 
-def is_faltante(x):
-    if pd.isnull(x):
-        return True
-    s = str(x).strip()
-    if s == '':
-        return True
-    if s.lower() in missing_values_lower:
-        return True
-    return False
+# Máscara booleana de faltantes de uma coluna (nulo, vazio ou marcador de ausência)
+def mascara_faltantes(serie):
+    codigos, unicos = pd.factorize(serie)
+    faltante_unico = pd.Series(unicos, dtype=object).astype(str).str.strip().str.lower().isin(missing_values_lower)
+    return np.append(faltante_unico.to_numpy(dtype=bool), True)[codigos]
+
+# Colunas numéricas: algum dos 100 primeiros valores preenchidos tem formato de número
+def detectar_colunas_numericas(df):
+    colunas = []
+    for col in df.columns:
+        amostra = df[col].dropna().astype(str).head(100)
+        if any(padrao_coluna_numerica.match(v) for v in amostra):
+            colunas.append(col)
+    return colunas
+
+@instrumentacao.medir()
+def tratar_valores_faltantes(df, colunas_numericas=None):
+    # colunas_numericas permite usar a detecção feita sobre uma base maior
+    # (ex.: o histórico inteiro ao acrescentar um ano novo)
+    df = df.copy()
+    if colunas_numericas is None:
+        colunas_numericas = detectar_colunas_numericas(df)
+    # Padroniza todas as colunas numéricas
+    for col in df.columns:
+        if col in colunas_numericas:
+            print(f'Padronizando coluna numérica: {col}')
+            df[col] = padronizar_numero_coluna(df[col])
+
+    # Calcula a máscara de cada coluna uma única vez; ela serve tanto para a
+    # filtragem de linhas quanto para o relatório final
+    mascaras = {col: mascara_faltantes(df[col]) for col in df.columns}
+
+    # Ignorar latitude e longitude na filtragem de linhas
+    ignore_cols = {'latitude', 'longitude'}
+    cols_to_check = [col for col in df.columns if col.lower() not in ignore_cols]
 
-# Ignorar latitude e longitude na filtragem de linhas
-ignore_cols = {'latitude', 'longitude'}
-cols_to_check = [col for col in df.columns if col.lower() not in ignore_cols]
+    total_antes = len(df)
+    linhas_faltantes = np.zeros(total_antes, dtype=bool)
+    for col in cols_to_check:
+        linhas_faltantes |= mascaras[col]
+    df = df[~linhas_faltantes]
+    print(f'Removidas {total_antes - len(df)} linhas com valores faltantes.')
 
-total_antes = len(df)
-df = df[~df[cols_to_check].apply(lambda row: any(is_faltante(x) for x in row), axis=1)]
-print(f'Removidas {total_antes - len(df)} linhas com valores faltantes.')
+    # Exibe análise final de valores faltantes
+    print(f"\nAnálise de valores faltantes após limpeza:\n")
+    print(f"{'Coluna':<30} | {'Faltantes':>10} | {'Total':>10} | {'% Faltantes':>12}")
+    print('-'*70)
+    for col in df.columns:
+        total = len(df)
+        faltantes = int(mascaras[col][~linhas_faltantes].sum())
+        perc = 100 * faltantes / total if total > 0 else 0
+        print(f"{col:<30} | {faltantes:>10} | {total:>10} | {perc:>11.2f}%")
+    return df
 
-# Exibe análise final de valores faltantes
-print(f"\nAnálise de valores faltantes após limpeza:\n")
-print(f"{'Coluna':<30} | {'Faltantes':>10} | {'Total':>10} | {'% Faltantes':>12}")
-print('-'*70)
-for col in df.columns:
-    total = len(df)
-    faltantes = df[col].apply(is_faltante).sum()
-    perc = 100 * faltantes / total if total > 0 else 0
-    print(f"{col:<30} | {faltantes:>10} | {total:>10} | {perc:>11.2f}%")
+if __name__ == '__main__':
+    print(f'Lendo {arquivo_entrada}...')
+    with instrumentacao.medir_etapa('leitura') as medicao:
+        df = esquema.ler_texto(arquivo_entrada)
+        medicao.linhas_saida = len(df)
+    df = tratar_valores_faltantes(df)
 
-# Salva o resultado sobrescrevendo o arquivo original
-print(f'Arquivo final salvo em: {arquivo_entrada}')
-df.to_csv(arquivo_entrada, index=False, encoding='utf-8')
-print('Concluído!') 
\ No newline at end of file
+    # Salva o resultado sobrescrevendo o arquivo original
+    print(f'Arquivo final salvo em: {arquivo_entrada}')
+    with instrumentacao.medir_etapa('gravacao', len(df)):
+        df.to_csv(arquivo_entrada, index=False, encoding='utf-8')
+    instrumentacao.salvar_relatorio('valores_faltantes')
+    print('Concluído!')